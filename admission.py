@@ -0,0 +1,248 @@
+"""
+Admission control for database queries.
+
+Every query that misses the result cache takes a ticket:
+
+  - at most `max_running` queries run at once across the process, and at
+    most `per_session` per dashboard session; the rest wait in a queue
+    (first come, first served among those allowed to run) whose position
+    is reported while they wait
+  - a full queue, or a wait longer than `queue_timeout`, rejects the query
+  - once running, a SQLite progress handler (a watchdog thread calling
+    interrupt() for DuckDB) stops the statement when its time budget runs
+    out or when the ticket's `cancelled()` says so (the dashboard cancels
+    the queries of a run that was superseded by a rerun or a closed tab)
+
+Rejected, cancelled and timed-out queries are counted in stats().
+
+Usage:
+    python admission.py nasa_neo.db --budget 0.5 --clients 12   # time budget + queueing demo
+"""
+import argparse
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import config
+from db_pool import connect_reader
+
+PROGRESS_STEPS = 10000  # SQLite VM instructions between budget checks
+
+
+class AdmissionError(Exception):
+    pass
+
+
+class QueryRejected(AdmissionError):
+    pass
+
+
+class QueryCancelled(AdmissionError):
+    pass
+
+
+class QueryTimeout(AdmissionError):
+    pass
+
+
+class Ticket:
+    def __init__(self, session=None, label="", budget=None, cancelled=None):
+        self.session = session
+        self.label = label
+        self.budget = config.QUERY_BUDGET if budget is None else budget
+        self.cancelled = cancelled or (lambda: False)
+        self.deadline = None
+        self.reason = None  # "timeout" or "cancelled" once stopped
+
+    def should_stop(self):
+        """SQLite progress handler: non-zero interrupts the running statement."""
+        if self.cancelled():
+            self.reason = "cancelled"
+        elif self.deadline is not None and time.monotonic() > self.deadline:
+            self.reason = "timeout"
+        return 1 if self.reason else 0
+
+
+class AdmissionController:
+    def __init__(self, max_running=None, per_session=None, max_queue=None, queue_timeout=None):
+        self.max_running = max_running or config.MAX_RUNNING_QUERIES
+        self.per_session = per_session or config.SESSION_QUERIES
+        self.max_queue = config.QUERY_QUEUE if max_queue is None else max_queue
+        self.queue_timeout = config.POOL_TIMEOUT if queue_timeout is None else queue_timeout
+        self.cond = threading.Condition()
+        self.waiting = []  # queued tickets, oldest first
+        self.running = Counter()  # session -> running queries
+        self.total_running = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.timed_out = 0
+        self.wait_seconds = 0.0
+        self.peak_waiting = 0
+
+    def _may_run(self, ticket):
+        return self.total_running < self.max_running and self.running[ticket.session] < self.per_session
+
+    def _take(self, ticket):
+        # Called under self.cond by the same check that found a free slot
+        self.running[ticket.session] += 1
+        self.total_running += 1
+        self.admitted += 1
+
+    def _next(self):
+        return next((t for t in self.waiting if self._may_run(t)), None)
+
+    def position(self, ticket):
+        """1-based place in the queue, or 0 when not queued."""
+        with self.cond:
+            return self.waiting.index(ticket) + 1 if ticket in self.waiting else 0
+
+    def _wait_turn(self, ticket, on_wait):
+        started = time.monotonic()
+        with self.cond:
+            if not self.waiting and self._may_run(ticket):
+                self._take(ticket)
+                return
+            if len(self.waiting) >= self.max_queue:
+                self.rejected += 1
+                raise QueryRejected(f"Too many queries waiting ({len(self.waiting)}); try again shortly")
+            self.waiting.append(ticket)
+            self.queued += 1
+            self.peak_waiting = max(self.peak_waiting, len(self.waiting))
+        reported = None
+        try:
+            while True:
+                with self.cond:
+                    if self._next() is ticket:
+                        self._take(ticket)
+                        return
+                    if ticket.cancelled():
+                        self.cancelled += 1
+                        raise QueryCancelled("Query cancelled while queued")
+                    if time.monotonic() - started > self.queue_timeout:
+                        self.rejected += 1
+                        raise QueryRejected(f"Query still queued after {self.queue_timeout:.0f}s; try again shortly")
+                    position = self.waiting.index(ticket) + 1
+                if on_wait and position != reported:
+                    on_wait(position, len(self.waiting))
+                    reported = position
+                with self.cond:
+                    self.cond.wait(0.1)
+        finally:
+            with self.cond:
+                self.waiting.remove(ticket)
+                self.wait_seconds += time.monotonic() - started
+                self.cond.notify_all()
+
+    @contextmanager
+    def admit(self, ticket, on_wait=None):
+        """Hold a running slot for `ticket`, queueing first if needed. `on_wait(position, queued)` is
+        called whenever the ticket's place in the queue changes."""
+        self._wait_turn(ticket, on_wait)  # returns holding the slot
+        ticket.deadline = time.monotonic() + ticket.budget if ticket.budget else None
+        try:
+            yield ticket
+        finally:
+            with self.cond:
+                self.running[ticket.session] -= 1
+                if not self.running[ticket.session]:
+                    del self.running[ticket.session]
+                self.total_running -= 1
+                if ticket.reason == "timeout":
+                    self.timed_out += 1
+                elif ticket.reason == "cancelled":
+                    self.cancelled += 1
+                self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            return {"running": self.total_running, "waiting": len(self.waiting), "max_running": self.max_running,
+                    "per_session": self.per_session, "admitted": self.admitted, "queued": self.queued,
+                    "rejected": self.rejected, "cancelled": self.cancelled, "timed_out": self.timed_out,
+                    "peak_waiting": self.peak_waiting,
+                    "avg_queue_wait_ms": round(self.wait_seconds / self.queued * 1000, 1) if self.queued else 0.0}
+
+
+def _stopped(ticket, error):
+    if ticket.reason == "timeout":
+        return QueryTimeout(f"Query stopped after its {ticket.budget:g}s time budget")
+    if ticket.reason == "cancelled":
+        return QueryCancelled("Query cancelled")
+    return error
+
+
+@contextmanager
+def guard(conn, ticket):
+    """Enforce `ticket`'s budget and cancellation on a SQLite connection while the block runs."""
+    conn.set_progress_handler(ticket.should_stop, PROGRESS_STEPS)
+    try:
+        yield conn
+    except Exception as e:
+        # sqlite3 reports "interrupted"; pandas wraps it in its own DatabaseError
+        raise _stopped(ticket, e) from e
+    finally:
+        conn.set_progress_handler(None, 0)
+
+
+@contextmanager
+def watchdog(ticket, interrupt, interval=0.05):
+    """The same for engines without a progress handler: call `interrupt()` once the ticket should stop."""
+    done = threading.Event()
+
+    def watch():
+        while not done.wait(interval):
+            if ticket.should_stop():
+                interrupt()
+                return
+
+    thread = threading.Thread(target=watch, name="query-watchdog", daemon=True)
+    thread.start()
+    try:
+        yield
+    except Exception as e:
+        raise _stopped(ticket, e) from e
+    finally:
+        done.set()
+        thread.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Demonstrate query time budgets and queueing")
+    parser.add_argument("db", nargs="?", default=config.DB_PATH)
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds per query")
+    parser.add_argument("--clients", type=int, default=12, help="concurrent sessions, one slow query each")
+    parser.add_argument("--max-running", type=int, default=4)
+    parser.add_argument("--max-queue", type=int, default=6)
+    args = parser.parse_args(argv)
+
+    # Deliberately unbounded: every approach against every asteroid
+    slow = "SELECT COUNT(*) FROM close_approach c, asteroids a WHERE c.relative_velocity_kmph > a.id"
+    controller = AdmissionController(args.max_running, 1, args.max_queue, queue_timeout=args.budget * args.clients)
+
+    def client(number):
+        ticket = Ticket(session=number, label="slow", budget=args.budget)
+        started = time.perf_counter()
+        conn = connect_reader(args.db)
+        try:
+            with controller.admit(ticket), guard(conn, ticket):
+                conn.execute(slow).fetchall()
+            outcome = "finished"
+        except AdmissionError as e:
+            outcome = f"{type(e).__name__}: {e}"
+        finally:
+            conn.close()
+        return f"client {number:>2}: {outcome} after {time.perf_counter() - started:.2f}s"
+
+    with ThreadPoolExecutor(args.clients) as pool:
+        for line in pool.map(client, range(args.clients)):
+            print(line)
+    print(controller.stats())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+Summary tables for the per-asteroid and per-month/year queries.
+
+asteroid_stats, monthly_approach_stats and yearly_approach_stats are kept up
+to date by triggers on close_approach, so the dashboard reads O(result) rows
+instead of re-aggregating the whole approach table on every rerun.
+
+Usage:
+    python aggregates.py nasa_neo.db            # check summary tables against close_approach
+    python aggregates.py nasa_neo.db --rebuild  # rebuild them from scratch
+"""
+import argparse
+import math
+import sqlite3
+import sys
+
+import config
+
+ASTEROID_STATS_SELECT = """
+SELECT
+    neo_reference_id,
+    COUNT(*),
+    COUNT(relative_velocity_kmph),
+    TOTAL(relative_velocity_kmph),
+    MAX(relative_velocity_kmph),
+    MIN(miss_distance_km),
+    (SELECT c2.close_approach_date FROM close_approach c2
+     WHERE c2.neo_reference_id = c.neo_reference_id
+     ORDER BY c2.miss_distance_km IS NULL, c2.miss_distance_km, c2.id
+     LIMIT 1)
+FROM close_approach c
+{where}
+GROUP BY neo_reference_id
+"""
+
+MONTHLY_STATS_SELECT = """
+SELECT approach_month, COUNT(*), COUNT(miss_distance_lunar), TOTAL(miss_distance_lunar)
+FROM close_approach
+GROUP BY approach_month
+"""
+
+YEARLY_STATS_SELECT = """
+SELECT approach_year, COUNT(*)
+FROM close_approach
+GROUP BY approach_year
+"""
+
+ASTEROID_STATS_COLUMNS = """(
+    neo_reference_id, approach_count, velocity_count, velocity_sum,
+    max_velocity, min_miss_distance_km, closest_approach_date
+)"""
+
+# Trigger bodies that recompute one asteroid's row from its (indexed) approaches;
+# used when a row leaves an asteroid, since MIN/MAX cannot be decremented.
+_RECOMPUTE_ASTEROID = """
+    DELETE FROM asteroid_stats WHERE neo_reference_id = {ref}.neo_reference_id;
+    INSERT INTO asteroid_stats {columns}
+    """ + ASTEROID_STATS_SELECT.format(where="WHERE neo_reference_id = {ref}.neo_reference_id") + ";"
+
+_ADD_TO_BUCKETS = """
+    INSERT INTO monthly_approach_stats (approach_month, approach_count, lunar_count, lunar_sum)
+    VALUES (new.approach_month, 1, new.miss_distance_lunar IS NOT NULL, COALESCE(new.miss_distance_lunar, 0))
+    ON CONFLICT (approach_month) DO UPDATE SET
+        approach_count = approach_count + 1,
+        lunar_count = lunar_count + excluded.lunar_count,
+        lunar_sum = lunar_sum + excluded.lunar_sum;
+    INSERT INTO yearly_approach_stats (approach_year, approach_count)
+    VALUES (new.approach_year, 1)
+    ON CONFLICT (approach_year) DO UPDATE SET approach_count = approach_count + 1;
+"""
+
+_REMOVE_FROM_BUCKETS = """
+    UPDATE monthly_approach_stats SET
+        approach_count = approach_count - 1,
+        lunar_count = lunar_count - (old.miss_distance_lunar IS NOT NULL),
+        lunar_sum = lunar_sum - COALESCE(old.miss_distance_lunar, 0)
+    WHERE approach_month = old.approach_month;
+    DELETE FROM monthly_approach_stats WHERE approach_month = old.approach_month AND approach_count <= 0;
+    UPDATE yearly_approach_stats SET approach_count = approach_count - 1
+    WHERE approach_year = old.approach_year;
+    DELETE FROM yearly_approach_stats WHERE approach_year = old.approach_year AND approach_count <= 0;
+"""
+
+MIGRATION = [
+    """
+    CREATE TABLE asteroid_stats (
+        neo_reference_id INTEGER PRIMARY KEY,
+        approach_count INTEGER NOT NULL,
+        velocity_count INTEGER NOT NULL,
+        velocity_sum REAL NOT NULL,
+        max_velocity REAL,
+        min_miss_distance_km REAL,
+        closest_approach_date TEXT,
+        avg_velocity REAL GENERATED ALWAYS AS (velocity_sum / NULLIF(velocity_count, 0)) VIRTUAL
+    )
+    """,
+    "CREATE INDEX ix_asteroid_stats_count ON asteroid_stats (approach_count)",
+    "CREATE INDEX ix_asteroid_stats_avg_velocity ON asteroid_stats (avg_velocity)",
+    "CREATE INDEX ix_asteroid_stats_max_velocity ON asteroid_stats (max_velocity)",
+    "CREATE INDEX ix_asteroid_stats_min_distance ON asteroid_stats (min_miss_distance_km)",
+    """
+    CREATE TABLE monthly_approach_stats (
+        approach_month TEXT PRIMARY KEY,
+        approach_count INTEGER NOT NULL,
+        lunar_count INTEGER NOT NULL,
+        lunar_sum REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE yearly_approach_stats (
+        approach_year TEXT PRIMARY KEY,
+        approach_count INTEGER NOT NULL
+    )
+    """,
+    f"""
+    CREATE TRIGGER trg_close_approach_stats_insert AFTER INSERT ON close_approach
+    BEGIN
+        INSERT INTO asteroid_stats {ASTEROID_STATS_COLUMNS}
+        VALUES (new.neo_reference_id, 1, new.relative_velocity_kmph IS NOT NULL,
+                COALESCE(new.relative_velocity_kmph, 0), new.relative_velocity_kmph,
+                new.miss_distance_km, new.close_approach_date)
+        ON CONFLICT (neo_reference_id) DO UPDATE SET
+            approach_count = approach_count + 1,
+            velocity_count = velocity_count + excluded.velocity_count,
+            velocity_sum = velocity_sum + excluded.velocity_sum,
+            max_velocity = CASE WHEN max_velocity IS NULL OR excluded.max_velocity > max_velocity
+                                THEN excluded.max_velocity ELSE max_velocity END,
+            min_miss_distance_km = CASE WHEN min_miss_distance_km IS NULL
+                                             OR excluded.min_miss_distance_km < min_miss_distance_km
+                                        THEN excluded.min_miss_distance_km ELSE min_miss_distance_km END,
+            closest_approach_date = CASE WHEN min_miss_distance_km IS NULL
+                                              OR excluded.min_miss_distance_km < min_miss_distance_km
+                                         THEN excluded.closest_approach_date ELSE closest_approach_date END;
+        {_ADD_TO_BUCKETS}
+    END
+    """,
+    f"""
+    CREATE TRIGGER trg_close_approach_stats_delete AFTER DELETE ON close_approach
+    BEGIN
+        {_RECOMPUTE_ASTEROID.format(ref="old", columns=ASTEROID_STATS_COLUMNS)}
+        {_REMOVE_FROM_BUCKETS}
+    END
+    """,
+    f"""
+    CREATE TRIGGER trg_close_approach_stats_update
+    AFTER UPDATE OF neo_reference_id, close_approach_date, relative_velocity_kmph,
+                    miss_distance_km, miss_distance_lunar ON close_approach
+    BEGIN
+        {_RECOMPUTE_ASTEROID.format(ref="old", columns=ASTEROID_STATS_COLUMNS)}
+        {_RECOMPUTE_ASTEROID.format(ref="new", columns=ASTEROID_STATS_COLUMNS)}
+        {_REMOVE_FROM_BUCKETS}
+        {_ADD_TO_BUCKETS}
+    END
+    """,
+    # Initial backfill
+    f"INSERT INTO asteroid_stats {ASTEROID_STATS_COLUMNS} " + ASTEROID_STATS_SELECT.format(where=""),
+    "INSERT INTO monthly_approach_stats " + MONTHLY_STATS_SELECT,
+    "INSERT INTO yearly_approach_stats " + YEARLY_STATS_SELECT,
+]
+
+# (table, key column, SELECT producing the expected rows in table column order)
+SUMMARY_TABLES = [
+    ("asteroid_stats", "neo_reference_id", ASTEROID_STATS_SELECT.format(where="")),
+    ("monthly_approach_stats", "approach_month", MONTHLY_STATS_SELECT),
+    ("yearly_approach_stats", "approach_year", YEARLY_STATS_SELECT),
+]
+
+
+def _same(a, b, rel_tol):
+    if isinstance(a, float) or isinstance(b, float):
+        if a is None or b is None:
+            return a is b
+        return math.isclose(a, b, rel_tol=rel_tol, abs_tol=1e-9)
+    return a == b
+
+
+def check_aggregates(conn, rel_tol=1e-9):
+    """Compare every summary table with a fresh aggregation. Returns a list of problems (empty = consistent)."""
+    problems = []
+    for table, key, select in SUMMARY_TABLES:
+        expected = {row[0]: row for row in conn.execute(select)}
+        width = len(next(iter(expected.values()), ())) or None
+        actual = {row[0]: row for row in conn.execute(f"SELECT * FROM {table}")}
+        for k in expected.keys() - actual.keys():
+            problems.append(f"{table}: missing {key}={k}")
+        for k in actual.keys() - expected.keys():
+            problems.append(f"{table}: unexpected {key}={k}")
+        for k in expected.keys() & actual.keys():
+            want, have = expected[k], actual[k][:width]
+            if not all(_same(x, y, rel_tol) for x, y in zip(want, have)):
+                problems.append(f"{table}: {key}={k} has {have}, expected {want}")
+    return problems
+
+
+def rebuild_aggregates(conn):
+    """Recompute every summary table from close_approach in one transaction."""
+    with conn:
+        for table, _, select in SUMMARY_TABLES:
+            conn.execute(f"DELETE FROM {table}")
+            columns = ASTEROID_STATS_COLUMNS if table == "asteroid_stats" else ""
+            conn.execute(f"INSERT INTO {table} {columns} {select}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check or rebuild the summary tables")
+    parser.add_argument("db", nargs="?", default=config.DB_PATH)
+    parser.add_argument("--rebuild", action="store_true", help="rebuild from scratch instead of only checking")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    if args.rebuild:
+        rebuild_aggregates(conn)
+        print("Summary tables rebuilt")
+    problems = check_aggregates(conn)
+    for problem in problems[:50]:
+        print(problem)
+    if len(problems) > 50:
+        print(f"... and {len(problems) - 50} more")
+    print("Summary tables are consistent" if not problems else f"{len(problems)} inconsistencies found")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""
+Query backends behind the dashboard's run_query.
+
+    sqlite   the live database through the read-only pool (default)
+    parquet  the latest Parquet snapshot (parquet_snapshot.py), queried with
+             DuckDB's in-process columnar engine; the heavy GROUP BY scans
+             read only the columns they need
+
+Both run the same SQL text from project_sql_queries. A snapshot is as fresh
+as its last export; its data version is reported so callers can tell.
+
+The parity check runs every query on both backends and compares the results:
+    python backends.py [nasa_neo.db] [--snapshot DIR]
+"""
+import argparse
+import math
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+import pandas as pd
+
+import config
+from admission import guard, watchdog
+from parquet_snapshot import export_snapshot, latest_snapshot
+from partitions import routed
+from project_sql_queries import strip_limit
+from result_types import apply_types, read_frame
+
+BACKENDS = ["sqlite", "parquet"]
+CHUNK_ROWS = 50000
+
+
+def _chunks(cursor, chunk_rows):
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            return
+        yield rows
+
+
+class SQLiteBackend:
+    name = "sqlite"
+
+    def __init__(self, db):
+        self.db = db
+
+    def data_version(self):
+        return self.db.data_version()
+
+    def read(self, sql, params=(), ticket=None, types=None, dates=None):
+        """Run `sql` into a DataFrame; with an admission.Ticket, within its time budget. With `types`
+        (column name -> type, see result_types.py) the rows are read in chunks into compact columns.
+        `dates` = (since, until) for a query bounded to those dates: close_approach is then read from
+        frozen year partitions where there are any (see partitions.py)."""
+        with self.db.reader() as conn, (routed(conn, *dates) if dates else nullcontext()), \
+                (guard(conn, ticket) if ticket else nullcontext()):
+            if types is not None:
+                return read_frame(conn.execute(sql, params), types)
+            return pd.read_sql(sql, conn, params=params)
+
+    def explain(self, sql, params=()):
+        with self.db.reader() as conn:
+            return [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+    @contextmanager
+    def stream(self, sql, params=(), chunk_rows=CHUNK_ROWS):
+        """(column names, iterator over lists of up to `chunk_rows` rows) for results too big for a DataFrame."""
+        with self.db.reader() as conn:
+            cursor = conn.execute(sql, params)
+            try:
+                yield [d[0] for d in cursor.description], _chunks(cursor, chunk_rows)
+            finally:
+                cursor.close()
+
+
+class ParquetBackend:
+    """DuckDB views over a snapshot; switches to a newer snapshot when LATEST moves."""
+
+    name = "parquet"
+
+    def __init__(self, snapshot_dir=None):
+        import duckdb  # optional dependency, only needed for this backend
+        self.duckdb = duckdb
+        self.snapshot_dir = snapshot_dir or config.SNAPSHOT_DIR
+        self.lock = threading.Lock()
+        self.path = None
+        self.manifest = None
+        self.conn = None
+        self.readers = Counter()  # connection -> cursors open on it
+        self.refresh()
+
+    def refresh(self):
+        path, manifest = latest_snapshot(self.snapshot_dir)
+        if path is None:
+            raise FileNotFoundError(f"No Parquet snapshot in {self.snapshot_dir}; run parquet_snapshot.py first")
+        with self.lock:
+            if path == self.path:
+                return
+            conn = self.duckdb.connect(":memory:")
+            # SQLite date functions the shared SQL uses (julian() counts from noon, SQLite from midnight)
+            conn.execute("CREATE MACRO julianday(d) AS julian(CAST(d AS DATE)) - 0.5")
+            for table, info in manifest["tables"].items():
+                files = ", ".join("'" + os.path.join(path, f).replace("'", "''") + "'" for f in info["files"])
+                # The partition column is stored in the files too (as TEXT), so don't re-derive it from the paths
+                conn.execute(f"CREATE VIEW {table} AS SELECT * FROM read_parquet([{files}], hive_partitioning = false)")
+            old, self.conn, self.path, self.manifest = self.conn, conn, path, manifest
+            # Readers may still hold cursors on the old connection: the last one to finish closes it
+            idle = old is not None and not self.readers[old]
+        if idle:
+            old.close()
+
+    def data_version(self):
+        self.refresh()
+        return self.manifest["data_version"]
+
+    @contextmanager
+    def _cursor(self):
+        # A cursor is a separate DuckDB connection to the same database, safe to use from this thread
+        with self.lock:
+            conn = self.conn
+            cursor = conn.cursor()
+            self.readers[conn] += 1
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            with self.lock:
+                self.readers[conn] -= 1
+                if not self.readers[conn]:
+                    del self.readers[conn]
+                retired = conn is not self.conn and conn not in self.readers
+            if retired:
+                conn.close()
+
+    def read(self, sql, params=(), ticket=None, types=None, dates=None):
+        # `dates` is only a routing hint; the snapshot's files are already one set per year
+        with self._cursor() as cursor:
+            with watchdog(ticket, cursor.interrupt) if ticket else nullcontext():
+                df = cursor.execute(sql, list(params)).df()
+            return df if types is None else apply_types(df, types)
+
+    def explain(self, sql, params=()):
+        with self._cursor() as cursor:
+            return [row[-1] for row in cursor.execute("EXPLAIN " + sql, list(params)).fetchall()]
+
+    @contextmanager
+    def stream(self, sql, params=(), chunk_rows=CHUNK_ROWS):
+        with self._cursor() as cursor:
+            cursor.execute(sql, list(params))
+            yield [d[0] for d in cursor.description], _chunks(cursor, chunk_rows)
+
+
+def make_backend(name, db=None, snapshot_dir=None):
+    if name == "sqlite":
+        return SQLiteBackend(db)
+    if name == "parquet":
+        return ParquetBackend(snapshot_dir)
+    raise ValueError(f"Unknown backend: {name} (expected one of {', '.join(BACKENDS)})")
+
+
+def _rows(df, digits):
+    def value(v):
+        if v is None or (isinstance(v, float) and math.isnan(v)):
+            return None
+        if isinstance(v, float):
+            return float(f"{v:.{digits}g}")  # significant digits, so large and small values compare alike
+        if hasattr(v, "item"):
+            return value(v.item())
+        return v
+    return [tuple(value(v) for v in row) for row in df.itertuples(index=False)]
+
+
+def compare_frames(left, right, digits=10):
+    """'same', 'same rows, different order', or None when the results differ."""
+    if list(left.columns) != list(right.columns) or len(left) != len(right):
+        return None
+    a, b = _rows(left, digits), _rows(right, digits)
+    if a == b:
+        return "same"
+    key = lambda row: tuple((v is None, str(type(v)), v) for v in row)
+    if sorted(a, key=key) == sorted(b, key=key):
+        return "same rows, different order"
+    return None
+
+
+def parity(left, right, queries, digits=10):
+    """Run each query on both backends -> [(name, status, detail)]; status is 'ok' or 'FAIL'."""
+    results = []
+    for name, sql in queries.items():
+        try:
+            a, b = left.read(sql), right.read(sql)
+        except Exception as e:
+            results.append((name, "FAIL", f"error: {e}"))
+            continue
+        verdict = compare_frames(a, b, digits)
+        unlimited = strip_limit(sql)
+        if verdict is None and unlimited != sql:
+            # Rows tied on the sort key may be cut differently at the LIMIT; the full results must agree
+            if compare_frames(left.read(unlimited), right.read(unlimited), digits):
+                verdict = "same full result, ties cut differently at LIMIT"
+        if verdict is None:
+            results.append((name, "FAIL", f"{len(a)} vs {len(b)} rows, first difference:\n"
+                                          f"{a.head(3).to_string()}\n---\n{b.head(3).to_string()}"))
+        else:
+            results.append((name, "ok", verdict))
+    return results
+
+
+def main(argv=None):
+    from db_pool import Database
+    from project_sql_queries import DASHBOARD_QUERIES, QUERIES, RAW_QUERIES
+
+    parser = argparse.ArgumentParser(description="Compare every query on the SQLite and Parquet backends")
+    parser.add_argument("db", nargs="?", default=config.DB_PATH)
+    parser.add_argument("--snapshot", help="snapshot directory to use (default: export a fresh one)")
+    parser.add_argument("--digits", type=int, default=10, help="significant digits compared for floats")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_dir = args.snapshot or tmp
+        db = Database(args.db)  # upgrades the schema before the snapshot is taken
+        if args.snapshot is None:
+            export_snapshot(args.db, snapshot_dir)
+        sqlite_backend, parquet_backend = SQLiteBackend(db), ParquetBackend(snapshot_dir)
+        try:
+            if sqlite_backend.data_version() != parquet_backend.data_version():
+                print(f"Warning: snapshot is at data version {parquet_backend.data_version()}, "
+                      f"database at {sqlite_backend.data_version()}")
+            queries = dict(QUERIES)
+            queries.update(DASHBOARD_QUERIES)
+            queries.update({f"raw: {name}": sql for name, sql in RAW_QUERIES.items()})
+            results = parity(sqlite_backend, parquet_backend, queries, args.digits)
+        finally:
+            parquet_backend.conn.close()
+            db.close()
+
+    failures = 0
+    for name, status, detail in results:
+        print(f"  [{status}] {name}: {detail}")
+        failures += status != "ok"
+    print(f"{len(results) - failures}/{len(results)} queries agree")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
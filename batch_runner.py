@@ -0,0 +1,185 @@
+"""
+Headless batch runner for the query catalog (no Streamlit needed).
+
+Runs every entry of project_sql_queries.QUERIES, or those matching --only,
+in a pool of worker processes, each with its own read-only connection, so a
+large database keeps every core busy. Each result is streamed to a file in
+--out (see result_export.py) and manifest.json records the timings, row
+counts and files of the run. Queries are started longest-first using the
+timings of the previous manifest in the same directory, when there is one.
+
+--since YYYY-MM-DD restricts the approach-based queries to approaches on or
+after that date: each worker shadows close_approach with a TEMP view of the
+recent rows (read from frozen per-year partitions where there are any, see
+partitions.py), and queries that read the all-time summary tables run their
+RAW_QUERIES form instead. Queries that don't read approaches are run
+unchanged and marked as such in the manifest.
+
+Usage:
+    python batch_runner.py nasa_neo.db --out reports/nightly --format parquet
+    python batch_runner.py nasa_neo.db --since 2025-01-01 --only Velocity --all
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timezone
+from urllib.parse import quote
+
+import config
+from data_version import read_data_version
+from db_pool import connect_reader
+from partitions import route
+from project_sql_queries import EXPORT_QUERIES, QUERIES, RAW_QUERIES, strip_limit
+from result_export import FORMATS, export_rows
+from schema_migrations import SUMMARY_TABLES
+
+CHUNK_ROWS = 50000
+MANIFEST = "manifest.json"
+
+_conn = None  # the worker process's read-only connection
+
+
+def _init_worker(db_path, since):
+    global _conn
+    _conn = connect_reader(db_path)
+    if since:
+        route(_conn, since)
+
+
+def _run_query(sql, path, fmt):
+    started = time.perf_counter()
+    cursor = _conn.execute(sql)
+    try:
+        chunks = iter(lambda: cursor.fetchmany(CHUNK_ROWS), [])
+        rows = export_rows([d[0] for d in cursor.description], chunks, path, fmt)
+    finally:
+        cursor.close()
+    return {"rows": rows, "seconds": round(time.perf_counter() - started, 3), "bytes": os.path.getsize(path)}
+
+
+def _reads(sql, table):
+    return re.search(rf"\b{table}\b", sql) is not None
+
+
+def plan_queries(names, unbounded=False, since=None):
+    """{name: (sql, note)} for a run; note says how --since applies, or why a query can't run (sql None)."""
+    planned = {}
+    for name in names:
+        sql = EXPORT_QUERIES[name] if unbounded else QUERIES[name]
+        note = None
+        if since:
+            if any(_reads(sql, table) for table in SUMMARY_TABLES):
+                if name not in RAW_QUERIES:
+                    planned[name] = (None, "reads all-time summary tables and has no raw form")
+                    continue
+                sql = strip_limit(RAW_QUERIES[name]) if unbounded else RAW_QUERIES[name]
+            note = f"approaches since {since}" if _reads(sql, "close_approach") else "not date-restricted"
+        planned[name] = (sql, note)
+    return planned
+
+
+def _file_name(name, fmt):
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-") + FORMATS[fmt][0]
+
+
+def _previous_seconds(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST)) as f:
+            return {name: q.get("seconds", 0) for name, q in json.load(f)["queries"].items()}
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def run_batch(db_path, out_dir, names=None, fmt="parquet", unbounded=False, since=None, workers=None,
+              verbose=False):
+    """Run the queries and write their results plus the manifest to `out_dir`. Returns the manifest."""
+    names = list(names or QUERIES)
+    if since:
+        since = date.fromisoformat(str(since)).isoformat()  # it ends up inside SQL text
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(out_dir, exist_ok=True)
+    previous = _previous_seconds(out_dir)
+    planned = plan_queries(names, unbounded, since)
+
+    conn = sqlite3.connect(f"file:{quote(db_path)}?mode=ro", uri=True)
+    try:
+        version = read_data_version(conn)
+    finally:
+        conn.close()
+
+    results = {name: {"error": note, "note": None} for name, (sql, note) in planned.items() if sql is None}
+    started = time.perf_counter()
+    order = sorted((name for name, (sql, _) in planned.items() if sql is not None),
+                   key=lambda name: previous.get(name, 0), reverse=True)
+    with ProcessPoolExecutor(max_workers=min(workers, max(len(order), 1)),
+                             initializer=_init_worker, initargs=(db_path, since)) as pool:
+        futures = {}
+        for name in order:
+            sql, note = planned[name]
+            path = os.path.join(out_dir, _file_name(name, fmt))
+            futures[pool.submit(_run_query, sql, path, fmt)] = (name, note, path)
+        for future in as_completed(futures):
+            name, note, path = futures[future]
+            try:
+                result = {"file": os.path.basename(path), **future.result()}
+            except Exception as e:
+                result = {"error": f"{type(e).__name__}: {e}"}
+            result["note"] = note
+            results[name] = result
+            if verbose:
+                if "error" in result:
+                    print(f"  {name[:45]:<45} ERROR: {result['error']}")
+                else:
+                    print(f"  {name[:45]:<45} {result['seconds']:>8.2f}s {result['rows']:>10,} rows")
+
+    manifest = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "db": os.path.abspath(db_path),
+        "data_version": version,
+        "format": fmt,
+        "all_rows": unbounded,
+        "since": since,
+        "workers": workers,
+        "seconds": round(time.perf_counter() - started, 3),
+        "queries": {name: results[name] for name in names},
+    }
+    tmp = os.path.join(out_dir, MANIFEST + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the query catalog headlessly and save the results")
+    parser.add_argument("db", nargs="?", default=config.DB_PATH)
+    parser.add_argument("--out", help="output directory (default: reports/<UTC date>)")
+    parser.add_argument("--format", choices=list(FORMATS), default="parquet")
+    parser.add_argument("--only", action="append", default=[],
+                        help="run only queries whose name contains this text (repeatable)")
+    parser.add_argument("--all", action="store_true", help="every row, without the display LIMIT")
+    parser.add_argument("--since", type=date.fromisoformat, help="only approaches on or after YYYY-MM-DD")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    args = parser.parse_args(argv)
+
+    names = [name for name in QUERIES
+             if not args.only or any(text.lower() in name.lower() for text in args.only)]
+    if not names:
+        print("No queries match --only")
+        return 1
+    out_dir = args.out or os.path.join(config.BASE_DIR, "reports", datetime.now(timezone.utc).strftime("%Y-%m-%d"))
+    print(f"Running {len(names)} queries on {args.db} -> {out_dir}")
+    manifest = run_batch(args.db, out_dir, names, args.format, args.all, args.since, args.workers, verbose=True)
+    failed = [name for name, result in manifest["queries"].items() if "error" in result]
+    print(f"Done in {manifest['seconds']:.1f}s with {manifest['workers']} workers; "
+          f"{len(names) - len(failed)}/{len(names)} succeeded")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
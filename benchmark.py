@@ -0,0 +1,268 @@
+"""
+Query benchmark suite.
+
+Times every statement in project_sql_queries.QUERIES plus the dashboard's
+inline queries against synthetic databases of increasing size (see
+synthetic_data.py) or an existing database file:
+
+  - cold: fresh read-only connection, with the database file evicted from the
+    OS page cache where the platform allows it
+  - warm: the same statement repeated on that connection (median / min / max)
+  - rows and result bytes of the DataFrame, peak Python memory while reading
+  - EXPLAIN QUERY PLAN and a short digest of it, so plan changes stand out
+
+Results are written as JSON. Each warm timing carries a regression threshold;
+pass an earlier results file as --baseline to fail (exit 1) when a query gets
+slower than its threshold.
+
+Usage:
+    python benchmark.py --scales 10k,1M --out bench.json
+    python benchmark.py --scales 10k,1M --baseline bench.json --out bench_new.json
+    python benchmark.py --db nasa_neo.db --repeat 10
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import config
+from db_pool import connect_reader
+from project_sql_queries import DASHBOARD_QUERIES, QUERIES
+from query_cache import frame_bytes
+from query_metrics import plan_digest
+from schema_migrations import explain_plans, migrate
+from synthetic_data import generate, parse_count
+
+DEFAULT_SCALES = "10k,1M"
+DATA_DIR = os.path.join(config.BASE_DIR, "bench_data")
+
+
+def benchmark_queries():
+    queries = dict(QUERIES)
+    queries.update(DASHBOARD_QUERIES)
+    return queries
+
+
+def synthetic_db(rows, seed, data_dir):
+    """Path of the synthetic database for `rows`, generating it on first use.
+
+    A database kept from an earlier run is upgraded to the current schema first.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"synthetic_{rows}_{seed}.db")
+    if not os.path.exists(path):
+        print(f"Generating {path} ...")
+        generate(path, rows, seed, verbose=True)
+    else:
+        conn = sqlite3.connect(path)
+        try:
+            migrate(conn, verbose=True)
+        finally:
+            conn.close()
+    return path
+
+
+def evict_os_cache(path):
+    """Drop the file's pages from the OS page cache (Linux); returns False if unsupported."""
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    for name in (path, path + "-wal"):
+        if os.path.exists(name):
+            fd = os.open(name, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+    return True
+
+
+def timed_read(conn, sql, timeout):
+    """(DataFrame, seconds); aborts with sqlite3.OperationalError after `timeout` seconds."""
+    started = time.perf_counter()
+    if timeout:
+        deadline = started + timeout
+        conn.set_progress_handler(lambda: time.perf_counter() > deadline, 10000)
+    try:
+        df = pd.read_sql(sql, conn)
+    finally:
+        conn.set_progress_handler(None, 0)
+    return df, time.perf_counter() - started
+
+
+def run_query(path, sql, repeat, timeout):
+    evicted = evict_os_cache(path)
+    conn = connect_reader(path)
+    try:
+        df, cold = timed_read(conn, sql, timeout)
+        warm = sorted(timed_read(conn, sql, timeout)[1] for _ in range(repeat))
+        tracemalloc.start()
+        try:
+            timed_read(conn, sql, timeout)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    finally:
+        conn.close()
+    return {
+        "cold_ms": round(cold * 1000, 3),
+        "cold_os_cache_evicted": evicted,
+        "warm_ms": round(warm[len(warm) // 2] * 1000, 3),
+        "warm_min_ms": round(warm[0] * 1000, 3),
+        "warm_max_ms": round(warm[-1] * 1000, 3),
+        "rows": len(df),
+        "result_bytes": frame_bytes(df),
+        "peak_python_bytes": peak,
+    }
+
+
+def threshold_ms(warm_ms, tolerance, slack_ms):
+    """Slowest acceptable warm time: relative tolerance, with absolute slack for tiny queries."""
+    return round(max(warm_ms * tolerance, warm_ms + slack_ms), 3)
+
+
+def run_target(label, path, queries, repeat, timeout, tolerance, slack_ms):
+    conn = sqlite3.connect(f"file:{quote(path)}?mode=ro", uri=True)
+    try:
+        asteroids = conn.execute("SELECT COUNT(*) FROM asteroids").fetchone()[0]
+        approaches = conn.execute("SELECT COUNT(*) FROM close_approach").fetchone()[0]
+        plans = explain_plans(conn, queries)
+    finally:
+        conn.close()
+    print(f"\n{label}: {asteroids:,} asteroids, {approaches:,} approaches ({path})")
+    print(f"  {'query':<40} {'cold ms':>10} {'warm ms':>10} {'rows':>6} {'peak MB':>8}  plan")
+    results = {}
+    for name, sql in queries.items():
+        try:
+            result = run_query(path, sql, repeat, timeout)
+            result["threshold_ms"] = threshold_ms(result["warm_ms"], tolerance, slack_ms)
+        except (sqlite3.Error, pd.errors.DatabaseError) as e:
+            result = {"error": str(e)}
+        result["plan"] = plans[name]
+        result["plan_digest"] = plan_digest(plans[name])
+        results[name] = result
+        if "error" in result:
+            print(f"  {name[:40]:<40} ERROR: {result['error']}")
+        else:
+            print(f"  {name[:40]:<40} {result['cold_ms']:>10.1f} {result['warm_ms']:>10.1f} "
+                  f"{result['rows']:>6} {result['peak_python_bytes'] / 2 ** 20:>8.1f}  {result['plan_digest']}")
+    return {
+        "target": label,
+        "db": path,
+        "db_bytes": os.path.getsize(path),
+        "asteroids": asteroids,
+        "approaches": approaches,
+        "queries": results,
+    }
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=config.BASE_DIR,
+                             capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(baseline, current):
+    """Regressions and plan changes of `current` against `baseline`'s thresholds."""
+    previous = {run["target"]: run for run in baseline.get("runs", [])}
+    regressions, plan_changes = [], []
+    for run in current["runs"]:
+        before = previous.get(run["target"])
+        if before is None:
+            continue
+        for name, result in run["queries"].items():
+            old = before["queries"].get(name)
+            if not old or "threshold_ms" not in old:
+                continue
+            if "error" in result:
+                regressions.append((run["target"], name, old["warm_ms"], None, old["threshold_ms"]))
+            elif result["warm_ms"] > old["threshold_ms"]:
+                regressions.append((run["target"], name, old["warm_ms"], result["warm_ms"], old["threshold_ms"]))
+            if result["plan_digest"] != old.get("plan_digest"):
+                plan_changes.append((run["target"], name))
+    return regressions, plan_changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard queries")
+    parser.add_argument("--scales", default=DEFAULT_SCALES,
+                        help="comma-separated synthetic sizes in approaches, e.g. 10k,1M,50M ('' for none)")
+    parser.add_argument("--db", action="append", default=[], help="also benchmark this database (repeatable)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", default=DATA_DIR, help="where synthetic databases are kept")
+    parser.add_argument("--repeat", type=int, default=5, help="warm runs per query")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds before a query is abandoned")
+    parser.add_argument("--only", help="run only queries whose name contains this text")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="warm-time regression ratio")
+    parser.add_argument("--slack-ms", type=float, default=5.0, help="absolute slack added to small thresholds")
+    parser.add_argument("--out", help="write JSON results here")
+    parser.add_argument("--baseline", help="earlier results JSON to check for regressions")
+    args = parser.parse_args(argv)
+
+    queries = benchmark_queries()
+    if args.only:
+        queries = {name: sql for name, sql in queries.items() if args.only.lower() in name.lower()}
+    targets = [(f"synthetic-{scale.strip()}", synthetic_db(parse_count(scale), args.seed, args.data_dir))
+               for scale in args.scales.split(",") if scale.strip()]
+    targets += [(os.path.basename(path), path) for path in args.db]
+
+    results = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "tolerance": args.tolerance,
+            "slack_ms": args.slack_ms,
+        },
+        "runs": [run_target(label, path, queries, args.repeat, args.timeout, args.tolerance, args.slack_ms)
+                 for label, path in targets],
+    }
+    if resource is not None:
+        # Linux reports KB, macOS bytes
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        results["meta"]["peak_rss_bytes"] = peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions, plan_changes = compare(baseline, results)
+        print(f"\nCompared with {args.baseline} (commit {baseline.get('meta', {}).get('commit')}):")
+        for target, name in plan_changes:
+            print(f"  plan changed: {target} / {name}")
+        for target, name, old, new, limit in regressions:
+            now = "error" if new is None else f"{new:.1f}ms"
+            print(f"  REGRESSION: {target} / {name}: {old:.1f}ms -> {now} (threshold {limit:.1f}ms)")
+        if regressions:
+            return 1
+        print("  no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
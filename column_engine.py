@@ -0,0 +1,299 @@
+"""
+Optional in-memory columnar engine for the Advanced Filters page.
+
+The joined approach data is loaded once per data version into NumPy arrays:
+categorical-coded names/dates, float32 measurements and, per sort key, a
+pre-sorted permutation plus its inverse rank. Filters become vectorized
+masks and top-N pages either walk the permutation (selective sorts) or use
+argpartition on the ranks.
+
+Ranks are computed from the float64 values with the same tie-breakers as
+filter_query.SORT_KEYS, so the row order matches the SQL path exactly. A
+float32 value that rounds to the same float32 as a threshold cannot be
+classified locally; those (rare) rows are re-checked through `resolve`.
+
+Usage:
+    python column_engine.py nasa_neo.db   # load, time and compare against SQL
+"""
+import argparse
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import config
+from filter_query import HAZARD_OPTIONS, ApproachFilter
+
+LOAD_QUERY = """
+SELECT
+    c.id, c.neo_reference_id, a.name, c.close_approach_date, c.orbiting_body,
+    c.relative_velocity_kmph, c.miss_distance_lunar, a.estimated_diameter_max_km,
+    a.is_potentially_hazardous_asteroid
+FROM asteroids a
+JOIN close_approach c ON a.id = c.neo_reference_id
+"""
+
+# Sort option -> measurement array holding the leading sort key
+SORT_COLUMNS = {"Velocity": "velocity", "Distance": "lunar", "Diameter": "diameter"}
+
+# Walk at most this many permutation entries before switching to a full scan
+WALK_LIMIT = 1 << 18
+
+
+def _codes(values):
+    """Order-preserving categorical codes (sorted categories) in the smallest int dtype."""
+    codes, categories = pd.factorize(values, sort=True)
+    dtype = np.int16 if len(categories) < 2 ** 15 else np.int32
+    return codes.astype(dtype), np.asarray(categories, dtype=object)
+
+
+class ApproachColumns:
+    def __init__(self, ids, neo_ids, name_codes, names, date_codes, dates, velocity, lunar,
+                 diameter, hazardous, perms, data_version=None):
+        self.ids = ids
+        self.neo_ids = neo_ids
+        self.name_codes = name_codes
+        self.names = names
+        self.date_codes = date_codes
+        self.dates = dates
+        self.velocity = velocity
+        self.lunar = lunar
+        self.diameter = diameter
+        self.hazardous = hazardous
+        self.perms = perms
+        self.ranks = {}
+        self.sorted_values = {}  # ascending, for binary-searching a threshold into a perm range
+        for key, perm in perms.items():
+            rank = np.empty(len(perm), dtype=np.int32)
+            rank[perm] = np.arange(len(perm), dtype=np.int32)
+            self.ranks[key] = rank
+            self.sorted_values[key] = np.ascontiguousarray(getattr(self, SORT_COLUMNS[key])[perm[::-1]])
+        self.hazard_share = float(hazardous.mean()) if len(hazardous) else 0.0
+        self.data_version = data_version
+
+    @classmethod
+    def from_connection(cls, conn, data_version=None, chunk_rows=200_000):
+        cursor = conn.execute(LOAD_QUERY)
+        chunks = []
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            chunks.append(pd.DataFrame.from_records(rows))
+        columns = ["id", "neo_id", "name", "date", "body", "velocity", "lunar", "diameter", "hazardous"]
+        df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=range(len(columns)))
+        df.columns = columns
+
+        ids = df["id"].to_numpy(dtype=np.int64)
+        neo_ids = df["neo_id"].to_numpy(dtype=np.int64)
+        date_codes, dates = _codes(df["date"].to_numpy(dtype=object))
+        body_codes, _ = _codes(df["body"].to_numpy(dtype=object))
+        v64 = df["velocity"].to_numpy(dtype=np.float64)
+        l64 = df["lunar"].to_numpy(dtype=np.float64)
+        d64 = df["diameter"].to_numpy(dtype=np.float64)
+
+        # Descending SQL order == reversed ascending lexsort (last key is primary)
+        perms = {
+            "Velocity": np.lexsort((ids, date_codes, neo_ids, v64))[::-1],
+            "Distance": np.lexsort((ids, date_codes, neo_ids, l64))[::-1],
+            "Diameter": np.lexsort((body_codes, date_codes, neo_ids, d64))[::-1],
+        }
+        perms = {k: np.ascontiguousarray(p, dtype=np.int32) for k, p in perms.items()}
+
+        name_codes, names = pd.factorize(df["name"].to_numpy(dtype=object))
+        id_dtype = np.int32 if len(ids) == 0 or ids.max() < 2 ** 31 else np.int64
+        return cls(
+            ids=ids.astype(id_dtype),
+            neo_ids=neo_ids.astype(id_dtype),
+            name_codes=name_codes.astype(np.int32),
+            names=np.asarray(names, dtype=object),
+            date_codes=date_codes,
+            dates=dates,
+            velocity=v64.astype(np.float32),
+            lunar=l64.astype(np.float32),
+            diameter=d64.astype(np.float32),
+            hazardous=df["hazardous"].to_numpy(dtype=np.int8),
+            perms=perms,
+            data_version=data_version,
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nbytes(self):
+        arrays = [self.ids, self.neo_ids, self.name_codes, self.date_codes, self.velocity,
+                  self.lunar, self.diameter, self.hazardous]
+        arrays += list(self.perms.values()) + list(self.ranks.values()) + list(self.sorted_values.values())
+        return sum(a.nbytes for a in arrays)
+
+    def _masks(self, flt, idx=None):
+        """(definite, ambiguous) boolean masks for rows `idx` (all rows when None)."""
+        def take(a):
+            return a if idx is None else a[idx]
+
+        v, l, d = take(self.velocity), take(self.lunar), take(self.diameter)
+        v_min, d_min, l_max = np.float32(flt.velocity_min), np.float32(flt.diameter_min), np.float32(flt.lunar_max)
+        definite = (v > v_min) & (d > d_min) & (l < l_max)
+        possible = (v >= v_min) & (d >= d_min) & (l <= l_max)
+        hazard = HAZARD_OPTIONS[flt.hazardous]
+        if hazard is not None:
+            h = take(self.hazardous) == hazard
+            definite &= h
+            possible &= h
+        return definite, possible & ~definite
+
+    def _matches(self, flt, idx, resolve):
+        definite, ambiguous = self._masks(flt, idx)
+        if ambiguous.any():
+            rows = np.flatnonzero(ambiguous) if idx is None else idx[ambiguous]
+            if resolve is None:
+                definite |= ambiguous
+            else:
+                confirmed = resolve(flt, self.ids[rows].tolist())
+                keep = np.isin(self.ids[rows], np.fromiter(confirmed, dtype=np.int64, count=len(confirmed)))
+                positions = np.flatnonzero(ambiguous)[keep]
+                definite[positions] = True
+        return definite
+
+    def _ranges(self, flt):
+        """Per sort key, the perm positions [lo, hi) holding every row that can pass its threshold."""
+        n = len(self)
+        velocity = np.searchsorted(self.sorted_values["Velocity"], np.float32(flt.velocity_min), "left")
+        diameter = np.searchsorted(self.sorted_values["Diameter"], np.float32(flt.diameter_min), "left")
+        lunar = np.searchsorted(self.sorted_values["Distance"], np.float32(flt.lunar_max), "right")
+        return {
+            "Velocity": (0, n - int(velocity)),
+            "Diameter": (0, n - int(diameter)),
+            "Distance": (n - int(lunar), n),
+        }
+
+    def page(self, flt, page_size=100, after=None, resolve=None):
+        """One page in SQL order -> (frame, cursor). `after`/cursor is the last row's rank."""
+        perm, rank = self.perms[flt.sort_by], self.ranks[flt.sort_by]
+        ranges = self._ranges(flt)
+        lo, hi = ranges[flt.sort_by]
+        start = max(lo, 0 if after is None else after + 1)
+        narrowest = min(ranges, key=lambda key: ranges[key][1] - ranges[key][0])
+        n_lo, n_hi = ranges[narrowest]
+
+        # Rows the walk is expected to visit, assuming independent predicates
+        n = max(len(self), 1)
+        selectivity = 1.0
+        for key_lo, key_hi in ranges.values():
+            selectivity *= (key_hi - key_lo) / n
+        hazard = HAZARD_OPTIONS[flt.hazardous]
+        if hazard is not None:
+            selectivity *= self.hazard_share if hazard == 1 else 1 - self.hazard_share
+        expected_walk = page_size / selectivity if selectivity else float("inf")
+
+        rows = []
+        found = 0
+        position = start
+        if n_hi - n_lo > WALK_LIMIT and expected_walk <= WALK_LIMIT:
+            # Many rows can match: walk the pre-sorted permutation until the page is full
+            chunk = max(4096, page_size * 16)
+            while position < hi and position - start < WALK_LIMIT and found < page_size:
+                idx = perm[position:min(position + chunk, hi)]
+                hit = idx[self._matches(flt, idx, resolve)]
+                rows.append(hit[:page_size - found])
+                found += min(len(hit), page_size - found)
+                position += chunk
+        if found < page_size and position < hi:
+            # Selective filter: test only the narrowest threshold range, then argpartition on rank
+            candidates = self.perms[narrowest][n_lo:n_hi]
+            candidates = candidates[rank[candidates] >= position]
+            candidates = candidates[self._matches(flt, candidates, resolve)]
+            need = page_size - found
+            if len(candidates) > need:
+                candidates = candidates[np.argpartition(rank[candidates], need - 1)[:need]]
+            rows.append(candidates[np.argsort(rank[candidates])])
+        selected = np.concatenate(rows) if rows else np.empty(0, dtype=np.int32)
+        cursor = int(rank[selected[-1]]) if len(selected) == page_size else None
+        return self.frame(selected), cursor
+
+    def frame(self, rows):
+        """Rows -> DataFrame with the same columns as the SQL Advanced Filters page."""
+        return pd.DataFrame({
+            "name": self.names[self.name_codes[rows]],
+            "date": self.dates[self.date_codes[rows]],
+            "velocity": self.velocity[rows],
+            "distance_LD": self.lunar[rows],
+            "diameter": self.diameter[rows],
+            "hazardous": np.where(self.hazardous[rows] == 1, "Yes", "No"),
+            "approach_id": self.ids[rows],
+        })
+
+
+def sql_resolver(conn):
+    """`resolve` callback that re-checks ambiguous rows against SQLite's float64 values."""
+    def resolve(flt, approach_ids):
+        clauses, params = flt.where()
+        placeholders = ", ".join("?" * len(approach_ids))
+        sql = f"""
+            SELECT c.id FROM asteroids a
+            JOIN close_approach c ON a.id = c.neo_reference_id
+            WHERE {" AND ".join(clauses)} AND c.id IN ({placeholders})
+        """
+        return {row[0] for row in conn.execute(sql, params + list(approach_ids))}
+    return resolve
+
+
+def compare_with_sql(conn, engine, filters, page_size=100, pages=3):
+    """Page through each filter on both paths; returns a list of mismatches (empty = parity)."""
+    problems = []
+    resolve = sql_resolver(conn)
+    for flt in filters:
+        sql_after, engine_after = None, None
+        for page_no in range(pages):
+            sql, params = flt.page_query(page_size, sql_after)
+            expected = pd.read_sql(sql, conn, params=params)
+            got, engine_after = engine.page(flt, page_size, engine_after, resolve)
+            want_ids = expected["_k3"].tolist() if flt.sort_by != "Diameter" else None
+            if want_ids is not None and want_ids != got["approach_id"].tolist():
+                problems.append(f"{vars(flt)} page {page_no + 1}: approach ids differ")
+            elif expected["name"].tolist() != got["name"].tolist():
+                problems.append(f"{vars(flt)} page {page_no + 1}: rows differ")
+            sql_after = flt.next_cursor(expected, page_size)
+            if sql_after is None or engine_after is None:
+                if (sql_after is None) != (engine_after is None):
+                    problems.append(f"{vars(flt)} page {page_no + 1}: page counts differ")
+                break
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load the columnar engine and compare it with SQL")
+    parser.add_argument("db", nargs="?", default=config.DB_PATH)
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    started = time.perf_counter()
+    engine = ApproachColumns.from_connection(conn)
+    print(f"Loaded {len(engine):,} approaches in {time.perf_counter() - started:.2f}s "
+          f"({engine.nbytes() / 1e6:.1f} MB)")
+
+    filters = [
+        ApproachFilter(v, d, l, h, s)
+        for v in (0, 20000, 60000)
+        for d, l in ((0.0, 50.0), (0.1, 10.0))
+        for h in HAZARD_OPTIONS
+        for s in SORT_COLUMNS
+    ]
+    timings = []
+    for flt in filters:
+        started = time.perf_counter()
+        engine.page(flt, 100)
+        timings.append(time.perf_counter() - started)
+    print(f"Filter + top-100: median {np.median(timings) * 1000:.2f} ms, max {max(timings) * 1000:.2f} ms")
+
+    problems = compare_with_sql(conn, engine, filters)
+    for problem in problems:
+        print(problem)
+    print("Engine matches SQL" if not problems else f"{len(problems)} mismatches")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
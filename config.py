@@ -0,0 +1,63 @@
+"""
+Runtime configuration, read from environment variables so the same code runs
+on any machine (no hard-coded paths).
+
+    NEO_DB_PATH          path to the SQLite database (default: nasa_neo.db next to this file)
+    NEO_READ_POOL_SIZE   number of read-only connections in the pool
+    NEO_POOL_TIMEOUT     seconds to wait for a free read connection
+    NEO_QUERY_BUDGET     seconds a dashboard query may run before it is stopped (0: no limit)
+    NEO_MAX_RUNNING      queries running at once across all sessions (default: the pool size)
+    NEO_SESSION_QUERIES  queries running at once per session
+    NEO_QUERY_QUEUE      queries allowed to wait for a slot before new ones are rejected
+    NEO_MMAP_MB          SQLite mmap_size per connection, in MB
+    NEO_PAGE_CACHE_MB    SQLite page cache per connection, in MB
+    NEO_QUERY_CACHE_MB   size of the shared query result cache, in MB
+    NEO_ADMIN_PANEL      show the performance panel in the sidebar (1/0)
+    NEO_BACKEND          default query backend: sqlite or parquet (see backends.py)
+    NEO_SNAPSHOT_DIR     where Parquet snapshots are kept (default: snapshots/ next to this file)
+    NEO_EXPORT_DIR       where the SQL Explorer writes exports (default: exports/ next to this file)
+    NEO_EXPORT_DOWNLOAD_MB  largest export offered as a browser download, in MB
+    NEO_PARTITION_DIR    where per-year approach partitions go (default: partitions/ next to the database)
+    NEO_REFRESH_INTERVAL seconds between background feed refreshes inside the dashboard (0: off)
+    NEO_REFRESH_FIXTURES refresh from this directory of recorded feed files instead of NeoWs
+    NEO_REFRESH_URL      feed endpoint for refreshes (point at a stand-in server for tests)
+    NEO_REFRESH_DAYS     days before and after today re-read from the feed on every refresh
+    NEO_REFRESH_TIMEOUT  seconds a refresh run may take before it is abandoned and rolled back
+    NEO_SHARED_FRAMES    serve the Overview's results from memory-mapped Arrow files shared by all sessions (1/0)
+    NEO_SHARED_FRAMES_DIR  where those files go (default: /dev/shm/neo_frames)
+"""
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DB_PATH = os.environ.get("NEO_DB_PATH", os.path.join(BASE_DIR, "nasa_neo.db"))
+
+READ_POOL_SIZE = int(os.environ.get("NEO_READ_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.environ.get("NEO_POOL_TIMEOUT", "30"))
+QUERY_BUDGET = float(os.environ.get("NEO_QUERY_BUDGET", "30"))
+MAX_RUNNING_QUERIES = int(os.environ.get("NEO_MAX_RUNNING", str(READ_POOL_SIZE)))
+SESSION_QUERIES = int(os.environ.get("NEO_SESSION_QUERIES", "4"))
+QUERY_QUEUE = int(os.environ.get("NEO_QUERY_QUEUE", "32"))
+MMAP_SIZE = int(os.environ.get("NEO_MMAP_MB", "256")) * 1024 * 1024
+PAGE_CACHE_KB = int(os.environ.get("NEO_PAGE_CACHE_MB", "64")) * 1024
+
+QUERY_CACHE_BYTES = int(os.environ.get("NEO_QUERY_CACHE_MB", "256")) * 1024 * 1024
+
+BACKEND = os.environ.get("NEO_BACKEND", "sqlite")
+SNAPSHOT_DIR = os.environ.get("NEO_SNAPSHOT_DIR", os.path.join(BASE_DIR, "snapshots"))
+
+EXPORT_DIR = os.environ.get("NEO_EXPORT_DIR", os.path.join(BASE_DIR, "exports"))
+EXPORT_DOWNLOAD_BYTES = int(os.environ.get("NEO_EXPORT_DOWNLOAD_MB", "200")) * 1024 * 1024
+
+PARTITION_DIR = os.environ.get("NEO_PARTITION_DIR")
+
+REFRESH_INTERVAL = float(os.environ.get("NEO_REFRESH_INTERVAL", "0"))
+REFRESH_FIXTURES = os.environ.get("NEO_REFRESH_FIXTURES")
+REFRESH_URL = os.environ.get("NEO_REFRESH_URL")
+REFRESH_DAYS = int(os.environ.get("NEO_REFRESH_DAYS", "7"))
+REFRESH_TIMEOUT = float(os.environ.get("NEO_REFRESH_TIMEOUT", "600"))
+
+SHARED_FRAMES = os.environ.get("NEO_SHARED_FRAMES", "0") not in ("0", "false", "no")
+SHARED_FRAMES_DIR = os.environ.get("NEO_SHARED_FRAMES_DIR")
+
+ADMIN_PANEL = os.environ.get("NEO_ADMIN_PANEL", "1") not in ("0", "false", "no")
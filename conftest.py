@@ -0,0 +1,22 @@
+"""
+pytest setup: tests run against scratch copies of nasa_neo.db, never the tracked file.
+"""
+import os
+import shutil
+
+import pytest
+
+import config
+
+# test_dashboard.py is the Streamlit app; importing it would open (and migrate) the real database
+collect_ignore = ["test_dashboard.py"]
+
+
+@pytest.fixture
+def neo_db(tmp_path, monkeypatch):
+    """Path of a copy of nasa_neo.db, also set as NEO_DB_PATH for code that reads the default."""
+    path = str(tmp_path / "nasa_neo.db")
+    shutil.copyfile(os.path.join(config.BASE_DIR, "nasa_neo.db"), path)
+    monkeypatch.setenv("NEO_DB_PATH", path)
+    monkeypatch.setattr(config, "DB_PATH", path)
+    return path
@@ -0,0 +1,313 @@
+"""
+Concurrent multi-session load test of the dashboard.
+
+Drives the real test_dashboard.py headlessly with Streamlit's AppTest: one
+simulated analyst per thread, all in this process, so -- as on a Streamlit
+server -- every session shares the connection pool, the result caches and
+the admission controller. Each session opens the app, then until the time
+is up picks an interaction at random, with think time in between:
+
+  - switch to another of the five pages
+  - on SQL Queries: pick a random catalog query and execute it
+  - on Advanced Filters: move the sliders, hazard and sort options and apply,
+    or go to the next page of results
+
+Every interaction is a full script rerun and is timed end to end. The report
+gives latency percentiles per interaction, exceptions and on-page errors
+(e.g. queries turned away by admission control), the process RSS sampled
+during the run, and the connection pool and admission counters read from the
+Performance panel afterwards: pool waits show connection contention.
+
+Usage:
+    python dashboard_load.py nasa_neo.db --sessions 100 --duration 60
+    python dashboard_load.py nasa_neo.db --sessions 20 --think 0.5 --out load.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from unittest.mock import MagicMock
+
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.scriptrunner import ScriptRunnerEvent
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+import config
+from filter_query import HAZARD_OPTIONS, SORT_KEYS
+from project_sql_queries import QUERIES
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_dashboard.py")
+PAGES = ["📊 Overview", "🔍 SQL Queries", "🎛️ Advanced Filters", "📈 Analytics", "🏆 Top Threats"]
+
+
+@contextmanager
+def concurrent_apptest():
+    """Make AppTest behave like one server with many sessions:
+
+      - it installs a mock Runtime for each run and clears it when the run ends, under the feet of
+        the other sessions' runs: pin one for the whole test
+      - it reads the runner's final SHUTDOWN event as soon as the script has stopped, which under
+        load can be before that event is recorded: wait for SHUTDOWN itself
+      - every runner compiles the script afresh, and concurrent compiles can fail in CPython 3.11's
+        AST builder: share one compiled script, as a server does
+      - every runner has the same session id: give each session its own, for per-session limits
+    """
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    script_cache = ScriptCache()
+    init = LocalScriptRunner.__init__
+
+    def shared_init(runner, script_path, session_state):
+        init(runner, script_path, session_state)
+        runner._script_cache = script_cache
+        runner._session_id = f"load-test-{id(session_state)}"
+
+    saved = (Runtime.__dict__["instance"], Runtime.__dict__["exists"], LocalScriptRunner.script_stopped, init)
+    Runtime.instance = classmethod(lambda cls: runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+    LocalScriptRunner.script_stopped = lambda runner: ScriptRunnerEvent.SHUTDOWN in runner.events
+    LocalScriptRunner.__init__ = shared_init
+    try:
+        yield runtime
+    finally:
+        Runtime.instance, Runtime.exists, LocalScriptRunner.script_stopped, LocalScriptRunner.__init__ = saved
+
+
+def rss_bytes():
+    """Resident set size of this process (Linux), or None."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+class RSSSampler:
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.samples = []
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while True:
+            rss = rss_bytes()
+            if rss is not None:
+                self.samples.append(rss)
+            if self.done.wait(self.interval):
+                return
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.done.set()
+        self.thread.join()
+
+    def summary(self):
+        if not self.samples:
+            return {}
+        mb = [s / 2 ** 20 for s in self.samples]
+        return {"start_mb": round(mb[0], 1), "peak_mb": round(max(mb), 1), "end_mb": round(mb[-1], 1),
+                "mean_mb": round(sum(mb) / len(mb), 1)}
+
+
+def _widget(widgets, label):
+    return next((w for w in widgets if w.label == label), None)
+
+
+class Session:
+    """One simulated analyst."""
+
+    def __init__(self, number, timeout, record):
+        self.rng = random.Random(number)
+        self.app = AppTest.from_file(SCRIPT, default_timeout=timeout)
+        self.record = record
+        self.page = PAGES[0]
+
+    def interact(self, action, change=None):
+        started = time.perf_counter()
+        try:
+            if change is not None:
+                change(self.app)
+            self.app.run()
+            exceptions = [e.value for e in self.app.exception]
+        except Exception as e:  # a widget missing after a failed run, or a rerun past the timeout
+            exceptions = [f"{type(e).__name__}: {e}"]
+        errors = [] if exceptions else [e.value for e in self.app.error]
+        self.record(action, time.perf_counter() - started, exceptions, errors)
+
+    def switch_page(self):
+        self.page = self.rng.choice([p for p in PAGES if p != self.page])
+        self.interact(f"page: {self.page}", lambda app: _widget(app.sidebar.radio, "Select Page").set_value(self.page))
+
+    def execute_query(self):
+        def change(app):
+            _widget(app.selectbox, "Select Query").set_value(self.rng.choice(list(QUERIES)))
+            _widget(app.button, "▶️ Execute Query").click()
+        self.interact("sql: execute", change)
+
+    def apply_filters(self):
+        rng = self.rng
+
+        def change(app):
+            _widget(app.slider, "Min Velocity (km/h)").set_value(rng.randrange(0, 100001, 1000))
+            _widget(app.slider, "Min Diameter (km)").set_value(rng.choice([0.0, 0.0, 0.1, 0.5, 1.0]))
+            _widget(app.slider, "Max Lunar Distance (LD)").set_value(rng.choice([1.0, 5.0, 10.0, 25.0, 50.0]))
+            _widget(app.selectbox, "Hazard Status").set_value(rng.choice(list(HAZARD_OPTIONS)))
+            _widget(app.selectbox, "Sort By").set_value(rng.choice(list(SORT_KEYS)))
+            _widget(app.button, "🔍 Apply Filters").click()
+        self.interact("filters: apply", change)
+
+    def next_page(self):
+        button = _widget(self.app.button, "Next Page ➡️")
+        if button is None or button.disabled:
+            return self.apply_filters()
+        self.interact("filters: next page", lambda app: button.click())
+
+    def step(self):
+        roll = self.rng.random()
+        if self.page == "🔍 SQL Queries" and roll < 0.6:
+            self.execute_query()
+        elif self.page == "🎛️ Advanced Filters" and roll < 0.5:
+            self.apply_filters()
+        elif self.page == "🎛️ Advanced Filters" and roll < 0.7:
+            self.next_page()
+        else:
+            self.switch_page()
+
+    def run(self, deadline, think):
+        self.interact("open")
+        while time.monotonic() < deadline:
+            if think:
+                time.sleep(min(self.rng.expovariate(1 / think), max(0.0, deadline - time.monotonic())))
+            if time.monotonic() < deadline:
+                self.step()
+
+
+def panel_stats(timeout):
+    """Admission, pool and result-cache counters from a fresh session's Performance panel."""
+    config.ADMIN_PANEL = True
+    app = AppTest.from_file(SCRIPT, default_timeout=timeout).run()
+    found = {}
+    for element in app.json:
+        stats = json.loads(element.value)
+        for name, key in (("pool", "checkouts"), ("admission", "admitted"), ("result_cache", "hit_rate")):
+            if key in stats:
+                found[name] = stats
+    return found
+
+
+def load_test(sessions=10, duration=30.0, think=1.0, ramp=5.0, timeout=120.0):
+    """Run `sessions` simulated analysts for `duration` seconds. Returns a summary dict."""
+    latencies = defaultdict(list)
+    exceptions = defaultdict(list)
+    errors = defaultdict(list)
+    lock = threading.Lock()
+
+    def record(action, seconds, action_exceptions, action_errors):
+        with lock:
+            latencies[action].append(seconds)
+            exceptions[action].extend(action_exceptions)
+            errors[action].extend(action_errors)
+
+    deadline = time.monotonic() + ramp + duration
+    threads = []
+    with concurrent_apptest(), RSSSampler() as rss:
+        started = time.perf_counter()
+        for number in range(sessions):
+            session = Session(number, timeout, record)
+            thread = threading.Thread(target=session.run, args=(deadline, think), name=f"session-{number}")
+            thread.start()
+            threads.append(thread)
+            time.sleep(ramp / sessions)  # analysts arrive over the ramp-up, not all at once
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        panel = panel_stats(timeout)
+
+    def pct(values, p):
+        return round(values[min(len(values) - 1, int(p * len(values)))] * 1000, 1)
+
+    actions = {}
+    for action in sorted(latencies, key=lambda a: (a.split(":")[0], a)):
+        values = sorted(latencies[action])
+        actions[action] = {"count": len(values), "p50_ms": pct(values, 0.5), "p95_ms": pct(values, 0.95),
+                           "p99_ms": pct(values, 0.99), "max_ms": round(values[-1] * 1000, 1),
+                           "exceptions": len(exceptions[action]), "errors": len(errors[action])}
+    every = sorted(v for values in latencies.values() for v in values)
+    return {"sessions": sessions, "seconds": round(elapsed, 1), "interactions": len(every),
+            "interactions_per_second": round(len(every) / elapsed, 2),
+            "p50_ms": pct(every, 0.5) if every else None, "p95_ms": pct(every, 0.95) if every else None,
+            "p99_ms": pct(every, 0.99) if every else None,
+            "actions": actions, "rss": rss.summary(), **panel,
+            "sample_exceptions": sorted({e[:200] for values in exceptions.values() for e in values})[:5],
+            "sample_errors": sorted({e[:200] for values in errors.values() for e in values})[:5]}
+
+
+def print_report(result):
+    print(f"{result['sessions']} sessions, {result['interactions']:,} interactions in {result['seconds']}s "
+          f"({result['interactions_per_second']}/s); p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, "
+          f"p99 {result['p99_ms']} ms")
+    print(f"\n{'interaction':<34} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} "
+          f"{'exc':>4} {'err':>4}")
+    for action, row in result["actions"].items():
+        print(f"{action:<34} {row['count']:>6} {row['p50_ms']:>9,.1f} {row['p95_ms']:>9,.1f} {row['p99_ms']:>9,.1f} "
+              f"{row['max_ms']:>9,.1f} {row['exceptions']:>4} {row['errors']:>4}")
+    if result["rss"]:
+        rss = result["rss"]
+        print(f"\nRSS: {rss['start_mb']} MB at start, {rss['peak_mb']} MB peak, {rss['end_mb']} MB at the end")
+    if "pool" in result:
+        pool = result["pool"]
+        print(f"Pool: {pool['peak_in_use']}/{pool['size']} connections at peak, {pool['waits']} waits "
+              f"(avg {pool['avg_wait_ms']:.1f} ms, max {pool['max_wait_ms']:.1f} ms), {pool['timeouts']} timeouts")
+    if "admission" in result:
+        admission = result["admission"]
+        print(f"Admission: {admission['admitted']} admitted, {admission['queued']} queued "
+              f"(avg {admission['avg_queue_wait_ms']} ms), {admission['rejected']} rejected, "
+              f"{admission['cancelled']} cancelled, {admission['timed_out']} timed out")
+    if "result_cache" in result:
+        print(f"Result cache: hit rate {result['result_cache']['hit_rate']:.0%}")
+    for line in result["sample_exceptions"]:
+        print(f"  exception: {line}")
+    for line in result["sample_errors"]:
+        print(f"  on-page error: {line}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the dashboard with concurrent headless sessions")
+    parser.add_argument("db", nargs="?", default=config.DB_PATH)
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load after the ramp-up")
+    parser.add_argument("--think", type=float, default=1.0, help="mean seconds between a session's interactions")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which the sessions arrive")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds before a rerun counts as failed")
+    parser.add_argument("--out", help="write the summary as JSON here")
+    args = parser.parse_args(argv)
+
+    # The page scripts run in this process and read the same config module
+    config.DB_PATH = os.path.abspath(args.db)
+    config.REFRESH_INTERVAL = 0
+    result = load_test(args.sessions, args.duration, args.think, args.ramp, args.timeout)
+    print_report(result)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nSummary written to {args.out}")
+    return 1 if any(row["exceptions"] for row in result["actions"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
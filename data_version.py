@@ -0,0 +1,29 @@
+"""
+Database data-version stamp.
+
+A single counter row that every writer bumps inside the same transaction as
+its data change. Readers (result caches, HTTP ETags, ...) key on it, so they
+are invalidated exactly when the data changes and never on a timer.
+"""
+
+MIGRATION = [
+    """
+    CREATE TABLE data_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL,
+        updated_at TEXT NOT NULL
+    )
+    """,
+    "INSERT INTO data_version (id, version, updated_at) VALUES (1, 1, datetime('now'))",
+]
+
+
+def read_data_version(conn):
+    row = conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()
+    return row[0] if row else 0
+
+
+def bump_data_version(conn):
+    """Increment the stamp; call inside the writer's transaction. Returns the new version."""
+    conn.execute("UPDATE data_version SET version = version + 1, updated_at = datetime('now') WHERE id = 1")
+    return read_data_version(conn)
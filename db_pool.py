@@ -0,0 +1,181 @@
+"""
+SQLite connection management.
+
+Readers borrow from a bounded pool of read-only (mode=ro) URI connections, so
+concurrent Streamlit sessions never share a cursor and never block on a
+single connection. All writes (migrations, ingestion) go through one writer
+connection in WAL mode, which lets readers keep reading while it commits.
+Pool wait times and utilisation are tracked for the admin panel.
+"""
+import math
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import quote
+
+import config
+from data_version import read_data_version
+from schema_migrations import migrate
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def connect_writer(path=None):
+    """Read-write connection: WAL journal, relaxed fsync, schema upgraded."""
+    conn = sqlite3.connect(path or config.DB_PATH, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    migrate(conn)
+    return conn
+
+
+def connect_reader(path=None, mmap_size=None, page_cache_kb=None):
+    uri = f"file:{quote(path or config.DB_PATH)}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False, timeout=30, cached_statements=256)
+    conn.execute(f"PRAGMA mmap_size = {int(mmap_size if mmap_size is not None else config.MMAP_SIZE)}")
+    conn.execute(f"PRAGMA cache_size = -{int(page_cache_kb if page_cache_kb is not None else config.PAGE_CACHE_KB)}")
+    conn.execute("PRAGMA query_only = 1")
+    _add_math_functions(conn)
+    return conn
+
+
+def _add_math_functions(conn):
+    """floor / log10 on SQLite builds compiled without math functions (used by plot_data's binning)."""
+    try:
+        conn.execute("SELECT floor(1.5), log10(10)")
+    except sqlite3.OperationalError:
+        conn.create_function("floor", 1, lambda v: None if v is None else math.floor(v), deterministic=True)
+        conn.create_function("log10", 1, lambda v: math.log10(v) if v is not None and v > 0 else None,
+                             deterministic=True)
+
+
+class ReadPool:
+    def __init__(self, path=None, size=None, timeout=None, mmap_size=None, page_cache_kb=None):
+        self.path = path or config.DB_PATH
+        self.size = size or config.READ_POOL_SIZE
+        self.timeout = config.POOL_TIMEOUT if timeout is None else timeout
+        self.mmap_size = mmap_size
+        self.page_cache_kb = page_cache_kb
+        self.idle = queue.LifoQueue()  # most recently used first: warmest page cache
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+        self.busy_seconds = 0.0
+        self.started = time.monotonic()
+
+    def _acquire(self):
+        try:
+            return self.idle.get_nowait(), 0.0
+        except queue.Empty:
+            pass
+        with self.lock:
+            if self.opened < self.size:
+                self.opened += 1
+                new = True
+            else:
+                new = False
+        if new:
+            try:
+                return connect_reader(self.path, self.mmap_size, self.page_cache_kb), 0.0
+            except Exception:
+                with self.lock:
+                    self.opened -= 1
+                raise
+        started = time.monotonic()
+        try:
+            conn = self.idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self.lock:
+                self.timeouts += 1
+            raise PoolTimeout(f"no read connection free after {self.timeout:.0f}s")
+        return conn, time.monotonic() - started
+
+    @contextmanager
+    def connection(self):
+        conn, waited = self._acquire()
+        with self.lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            if waited:
+                self.waits += 1
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        borrowed = time.monotonic()
+        try:
+            yield conn
+        finally:
+            with self.lock:
+                self.in_use -= 1
+                self.busy_seconds += time.monotonic() - borrowed
+            self.idle.put(conn)
+
+    def metrics(self):
+        with self.lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            return {
+                "size": self.size,
+                "open": self.opened,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "avg_wait_ms": 1000 * self.wait_seconds / self.waits if self.waits else 0.0,
+                "max_wait_ms": 1000 * self.max_wait_seconds,
+                "timeouts": self.timeouts,
+                "utilisation": self.busy_seconds / (elapsed * self.size),
+            }
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class Writer:
+    """The single write connection; callers serialize on its lock."""
+
+    def __init__(self, path=None):
+        self.conn = connect_writer(path)
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            with self.conn:
+                yield self.conn
+
+    def close(self):
+        self.conn.close()
+
+
+class Database:
+    """Writer (created first: WAL + migrations) plus the read-only pool."""
+
+    def __init__(self, path=None, pool_size=None):
+        self.path = path or config.DB_PATH
+        self.writer = Writer(self.path)
+        self.pool = ReadPool(self.path, size=pool_size)
+
+    def reader(self):
+        return self.pool.connection()
+
+    def data_version(self):
+        with self.reader() as conn:
+            return read_data_version(conn)
+
+    def close(self):
+        self.pool.close()
+        self.writer.close()
@@ -0,0 +1,104 @@
+"""
+Bound-parameter query builder for the Advanced Filters page.
+
+Statements only vary in shape (sort key, hazard filter, first/next page), so
+SQLite's statement cache and the result cache both see a handful of stable
+SQL texts; slider values travel as parameters. Pages are fetched with keyset
+(seek) pagination: each page continues strictly after the last row of the
+previous one, following the column order of an existing index, so page N
+costs the same as page 1.
+"""
+from plot_data import velocity_distance_query
+
+# Keyset columns per sort option, in the order of the index that serves them
+# (ix_close_approach_velocity / ix_close_approach_lunar / ix_asteroids_diameter
+# + the close_approach natural key). The last columns make the key unique.
+SORT_KEYS = {
+    "Velocity": ["c.relative_velocity_kmph", "c.neo_reference_id", "c.close_approach_date", "c.id"],
+    "Distance": ["c.miss_distance_lunar", "c.neo_reference_id", "c.close_approach_date", "c.id"],
+    "Diameter": ["a.estimated_diameter_max_km", "a.id", "c.close_approach_date", "c.orbiting_body"],
+}
+
+HAZARD_OPTIONS = {
+    "All": None,
+    "Hazardous Only": 1,
+    "Non-Hazardous Only": 0,
+}
+
+# Result columns holding the keyset values (dropped before display)
+KEY_COLUMNS = ["_k0", "_k1", "_k2", "_k3"]
+
+SELECT_COLUMNS = """
+    a.name,
+    c.close_approach_date as date,
+    c.relative_velocity_kmph as velocity,
+    c.miss_distance_lunar as distance_LD,
+    a.estimated_diameter_max_km as diameter,
+    CASE WHEN a.is_potentially_hazardous_asteroid = 1 THEN 'Yes' ELSE 'No' END as hazardous"""
+
+
+class ApproachFilter:
+    def __init__(self, velocity_min=0, diameter_min=0.0, lunar_max=50.0, hazardous="All", sort_by="Velocity"):
+        if sort_by not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {sort_by}")
+        if hazardous not in HAZARD_OPTIONS:
+            raise ValueError(f"Unknown hazard option: {hazardous}")
+        self.velocity_min = float(velocity_min)
+        self.diameter_min = float(diameter_min)
+        self.lunar_max = float(lunar_max)
+        self.hazardous = hazardous
+        self.sort_by = sort_by
+
+    def where(self, after=None):
+        """WHERE clauses + parameters; `after` is the keyset cursor of the previous page."""
+        lunar_max = self.lunar_max
+        if after is not None and self.sort_by == "Distance":
+            # Tighten the scalar bound too, so the index seek starts at the cursor
+            lunar_max = min(lunar_max, after[0])
+        clauses = [
+            "c.relative_velocity_kmph >= ?",
+            "a.estimated_diameter_max_km >= ?",
+            "c.miss_distance_lunar <= ?",
+        ]
+        params = [self.velocity_min, self.diameter_min, lunar_max]
+        hazard = HAZARD_OPTIONS[self.hazardous]
+        if hazard is not None:
+            clauses.append("a.is_potentially_hazardous_asteroid = ?")
+            params.append(hazard)
+        if after is not None:
+            keys = SORT_KEYS[self.sort_by]
+            clauses.append(f"({', '.join(keys)}) < ({', '.join('?' * len(keys))})")
+            params.extend(after)
+        return clauses, params
+
+    def page_query(self, page_size=100, after=None):
+        """(sql, params) for one page sorted descending by the chosen key."""
+        keys = SORT_KEYS[self.sort_by]
+        clauses, params = self.where(after)
+        key_select = ",\n    ".join(f"{k} as {name}" for k, name in zip(keys, KEY_COLUMNS))
+        sql = f"""
+SELECT {SELECT_COLUMNS},
+    {key_select}
+FROM asteroids a
+JOIN close_approach c ON a.id = c.neo_reference_id
+WHERE {" AND ".join(clauses)}
+ORDER BY {", ".join(k + " DESC" for k in keys)}
+LIMIT ?
+"""
+        return sql, params + [int(page_size)]
+
+    def density_query(self):
+        """(sql, params) binning every match, not just one page, for the results chart."""
+        clauses, params = self.where()
+        return velocity_distance_query(clauses), params
+
+    def next_cursor(self, df, page_size):
+        """Keyset cursor after the last row of `df`, or None when this was the last page."""
+        if df is None or len(df) < page_size:
+            return None
+        # numpy scalars -> Python values so sqlite3 binds them as numbers, not blobs
+        return tuple(v.item() if hasattr(v, "item") else v for v in df[KEY_COLUMNS].iloc[-1])
+
+
+def display_frame(df):
+    return df.drop(columns=[c for c in KEY_COLUMNS if c in df.columns])
@@ -0,0 +1,237 @@
+"""
+As-you-type asteroid name search.
+
+Names such as "415949 (2001 XY10)", "(2003 SR84)" or "433 Eros (A898 PA)"
+are parsed into their number, proper name and provisional designation, and
+each part is normalised to lowercase letters and digits ("2001xy10"). The
+in-memory NameIndex keeps:
+
+  - a sorted fixed-width byte array of those keys, for prefix lookups by
+    binary search (typing "2001 xy1" finds 2001 XY10, XY11, ...)
+  - a trigram inverted index (CSR: one offset per trigram code, int32
+    postings), for fuzzy matches when the prefix finds too little; the
+    rarest trigrams pick the candidates, ranked by how much of the query
+    they contain
+
+Everything is NumPy arrays built with vectorized operations, about 75 bytes
+per asteroid. Optionally, asteroid_names_fts (SQLite FTS5, trigram
+tokenizer, kept in sync by triggers) offers the same substring search to
+plain SQL clients.
+
+Usage:
+    python name_search.py nasa_neo.db "2001 xy10"    # time a search
+    python name_search.py nasa_neo.db --fts          # create the FTS5 table
+"""
+import argparse
+import re
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+import config
+
+_NAME = re.compile(r"^\s*(?:(\d+)\s+)?([^()]*?)\s*(?:\(([^)]*)\))?\s*$")
+_NOT_ALNUM = re.compile(r"[^0-9a-z]+")
+
+# Trigram codes: 0 pads, 1-10 digits, 11-36 letters
+_ALPHABET = 37
+_CODES = np.zeros(256, dtype=np.int64)
+_CODES[np.frombuffer(b"0123456789", dtype=np.uint8)] = np.arange(1, 11)
+_CODES[np.frombuffer(b"abcdefghijklmnopqrstuvwxyz", dtype=np.uint8)] = np.arange(11, 37)
+
+# Candidate postings read before switching to membership tests for the remaining trigrams
+CANDIDATE_POSTINGS = 50000
+MIN_SHARE = 0.5
+
+
+def parse_name(name):
+    """(number, proper name, provisional designation) of an asteroid name; missing parts are None."""
+    match = _NAME.match(name or "")
+    if not match:
+        return None, name or None, None
+    number, proper, designation = match.groups()
+    return (int(number) if number else None), (proper or None), (designation or None)
+
+
+def normalize(text):
+    return _NOT_ALNUM.sub("", (text or "").lower())
+
+
+def _trigram_codes(keys):
+    """(row, code) pairs of every trigram in a fixed-width byte array of keys."""
+    width = keys.dtype.itemsize
+    if width < 3 or len(keys) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    chars = _CODES[keys.view(np.uint8).reshape(len(keys), width)]
+    codes = (chars[:, :-2] * _ALPHABET + chars[:, 1:-1]) * _ALPHABET + chars[:, 2:]
+    valid = (chars[:, :-2] > 0) & (chars[:, 1:-1] > 0) & (chars[:, 2:] > 0)
+    rows = np.nonzero(valid)[0]
+    return rows, codes[valid]
+
+
+class NameIndex:
+    def __init__(self, ids, names):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.names = np.array([n.encode("utf-8") for n in names], dtype=bytes)
+
+        # Prefix keys: number, proper name and designation of every asteroid
+        keys, owners = [], []
+        for position, name in enumerate(names):
+            number, proper, designation = parse_name(name)
+            for part in {str(number) if number is not None else "", normalize(proper), normalize(designation)}:
+                if part:
+                    keys.append(part.encode())
+                    owners.append(position)
+        keys = np.array(keys, dtype=bytes)
+        owners = np.array(owners, dtype=np.int32)
+        order = np.argsort(keys, kind="stable")
+        self.keys, self.owners = keys[order], owners[order]
+
+        # Trigram postings: unique (code, asteroid) pairs grouped by code, asteroids ascending
+        rows, codes = _trigram_codes(keys)
+        pairs = np.unique(codes * len(self.ids) + owners[rows])
+        codes, self.postings = pairs // len(self.ids), (pairs % len(self.ids)).astype(np.int32)
+        self.offsets = np.searchsorted(codes, np.arange(_ALPHABET ** 3 + 1))
+        self.trigram_counts = np.bincount(self.postings, minlength=len(self.ids)).astype(np.uint16)
+
+    @classmethod
+    def from_connection(cls, conn):
+        rows = conn.execute("SELECT id, name FROM asteroids WHERE name IS NOT NULL ORDER BY id").fetchall()
+        return cls([r[0] for r in rows], [r[1] for r in rows])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.ids, self.names, self.keys, self.owners, self.postings,
+                                      self.offsets, self.trigram_counts))
+
+    def name(self, position):
+        return self.names[position].decode("utf-8")
+
+    def prefix(self, text, limit=10):
+        """Positions of asteroids with a number, name or designation starting with `text`."""
+        query = normalize(text).encode()
+        if not query:
+            return []
+        lo = np.searchsorted(self.keys, query, side="left")
+        hi = np.searchsorted(self.keys, query + b"\xff", side="left")
+        # Keys sort shortest-first among shared prefixes, so exact matches come first
+        found = []
+        for position in self.owners[lo:min(hi, lo + limit * 4)]:
+            if position not in found:
+                found.append(int(position))
+                if len(found) == limit:
+                    break
+        return found
+
+    def fuzzy(self, text, limit=10, min_share=MIN_SHARE):
+        """[(position, share of the query's trigrams found)] of the asteroids closest to `text`."""
+        query = np.array([normalize(text).encode()], dtype=bytes)
+        codes = np.unique(_trigram_codes(query)[1])
+        if len(codes) == 0:
+            return []
+        lengths = self.offsets[codes + 1] - self.offsets[codes]
+        codes = codes[np.argsort(lengths, kind="stable")]
+        lengths = np.sort(lengths)
+        # Candidates come from the rarest trigrams; the common ones are only tested for membership
+        take = max(1, int(np.searchsorted(np.cumsum(lengths), CANDIDATE_POSTINGS, side="right")))
+        gathered = [self.postings[self.offsets[c]:self.offsets[c + 1]] for c in codes[:take]]
+        candidates, shared = np.unique(np.concatenate(gathered), return_counts=True)
+        for c in codes[take:]:
+            postings = self.postings[self.offsets[c]:self.offsets[c + 1]]
+            at = np.searchsorted(postings, candidates).clip(max=len(postings) - 1)
+            shared += postings[at] == candidates
+        # Ranked by the share of the query found, then by Jaccard similarity (favouring shorter names)
+        found = shared / len(codes)
+        similarity = shared / (len(codes) + self.trigram_counts[candidates] - shared)
+        best = np.lexsort((-similarity, -found))[:limit]
+        return [(int(candidates[i]), float(found[i])) for i in best if found[i] >= min_share]
+
+    def search(self, text, limit=10):
+        """[(asteroid id, name)] for `text`: prefix matches first, topped up with fuzzy ones."""
+        positions = self.prefix(text, limit)
+        if len(positions) < limit:
+            for position, _ in self.fuzzy(text, limit):
+                if position not in positions:
+                    positions.append(position)
+        return [(int(self.ids[p]), self.name(p)) for p in positions[:limit]]
+
+
+FTS_TABLE = "asteroid_names_fts"
+
+FTS_SCHEMA = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(name, content='asteroids', content_rowid='id', "
+    "tokenize='trigram')",
+    f"""
+    CREATE TRIGGER trg_asteroids_fts_insert AFTER INSERT ON asteroids BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, name) VALUES (new.id, new.name);
+    END
+    """,
+    f"""
+    CREATE TRIGGER trg_asteroids_fts_delete AFTER DELETE ON asteroids BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name);
+    END
+    """,
+    f"""
+    CREATE TRIGGER trg_asteroids_fts_update AFTER UPDATE OF name ON asteroids BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO {FTS_TABLE} (rowid, name) VALUES (new.id, new.name);
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+def create_fts(conn):
+    """Create and fill asteroid_names_fts (needs SQLite built with FTS5). Returns False if it exists."""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (FTS_TABLE,)).fetchone():
+        return False
+    with conn:
+        for statement in FTS_SCHEMA:
+            conn.execute(statement)
+    return True
+
+
+def search_fts(conn, text, limit=10):
+    """[(asteroid id, name)] whose name contains `text` (3+ characters), via asteroid_names_fts."""
+    phrase = '"' + text.replace('"', '""') + '"'
+    return conn.execute(f"SELECT rowid, name FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ? ORDER BY rank LIMIT ?",
+                        (phrase, limit)).fetchall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the name index and time a search")
+    parser.add_argument("db", nargs="?", default=config.DB_PATH)
+    parser.add_argument("query", nargs="*", help="names to look up")
+    parser.add_argument("--fts", action="store_true", help="create the optional FTS5 table first")
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    if args.fts:
+        print("asteroid_names_fts created" if create_fts(conn) else "asteroid_names_fts already exists")
+    started = time.perf_counter()
+    index = NameIndex.from_connection(conn)
+    print(f"Indexed {len(index):,} names in {time.perf_counter() - started:.2f}s, "
+          f"{index.nbytes() / 2 ** 20:.1f} MB")
+    has_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (FTS_TABLE,)).fetchone()
+    for text in args.query:
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            results = index.search(text)
+        elapsed = (time.perf_counter() - started) / args.repeat
+        print(f"\n{text!r}: {elapsed * 1000:.3f} ms")
+        for asteroid_id, name in results:
+            print(f"  {asteroid_id:>10}  {name}")
+        if has_fts and len(text) >= 3:
+            started = time.perf_counter()
+            rows = search_fts(conn, text)
+            print(f"  FTS5: {len(rows)} matches in {(time.perf_counter() - started) * 1000:.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
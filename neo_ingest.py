@@ -0,0 +1,352 @@
+"""
+NeoWs feed ingester for nasa_neo.db.
+
+Feed windows (7 days each) are fetched concurrently with asyncio, parsed as a
+stream and bulk-loaded with executemany inside large WAL transactions.
+Rows are upserted on their natural keys, so re-running over the same dates
+never creates duplicates.
+
+Usage:
+    python neo_ingest.py --start 2024-01-01 --end 2025-04-16 --api-key KEY
+    python neo_ingest.py --start 2024-01-01 --end 2024-03-31 --fixtures feeds/   # replay recorded files
+    python neo_ingest.py --start 2024-01-01 --end 2024-03-31 --record feeds/     # save raw responses
+"""
+import argparse
+import asyncio
+import io
+import os
+import re
+import sys
+import time
+from datetime import date, timedelta
+
+import aiohttp
+import ijson
+
+import config
+from data_version import bump_data_version
+from db_pool import connect_writer
+from overview_snapshot import refresh_overview
+from sketches import refresh_sketches
+from trends import refresh_trends
+
+FEED_URL = "https://api.nasa.gov/neo/rest/v1/feed"
+WINDOW_DAYS = 7  # NeoWs rejects feed ranges longer than 7 days
+
+UPSERT_ASTEROID = """
+INSERT INTO asteroids (
+    id, name, absolute_magnitude_h, estimated_diameter_min_km,
+    estimated_diameter_max_km, is_potentially_hazardous_asteroid
+) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    name = excluded.name,
+    absolute_magnitude_h = excluded.absolute_magnitude_h,
+    estimated_diameter_min_km = excluded.estimated_diameter_min_km,
+    estimated_diameter_max_km = excluded.estimated_diameter_max_km,
+    is_potentially_hazardous_asteroid = excluded.is_potentially_hazardous_asteroid
+WHERE name IS NOT excluded.name
+   OR absolute_magnitude_h IS NOT excluded.absolute_magnitude_h
+   OR estimated_diameter_min_km IS NOT excluded.estimated_diameter_min_km
+   OR estimated_diameter_max_km IS NOT excluded.estimated_diameter_max_km
+   OR is_potentially_hazardous_asteroid IS NOT excluded.is_potentially_hazardous_asteroid
+"""
+
+UPSERT_APPROACH = """
+INSERT INTO close_approach (
+    neo_reference_id, close_approach_date, relative_velocity_kmph,
+    astronomical, miss_distance_km, miss_distance_lunar, orbiting_body
+) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (neo_reference_id, close_approach_date, orbiting_body) DO UPDATE SET
+    relative_velocity_kmph = excluded.relative_velocity_kmph,
+    astronomical = excluded.astronomical,
+    miss_distance_km = excluded.miss_distance_km,
+    miss_distance_lunar = excluded.miss_distance_lunar
+WHERE relative_velocity_kmph IS NOT excluded.relative_velocity_kmph
+   OR astronomical IS NOT excluded.astronomical
+   OR miss_distance_km IS NOT excluded.miss_distance_km
+   OR miss_distance_lunar IS NOT excluded.miss_distance_lunar
+"""
+
+
+def feed_windows(start, end, days=WINDOW_DAYS):
+    """Split [start, end] (inclusive) into consecutive windows of at most `days` days."""
+    current = start
+    while current <= end:
+        window_end = min(current + timedelta(days=days - 1), end)
+        yield current, window_end
+        current = window_end + timedelta(days=1)
+
+
+def _float(value):
+    return None if value is None else float(value)
+
+
+def neo_rows(neo):
+    """One feed object -> (asteroid row, [approach rows])."""
+    neo_id = int(neo.get("neo_reference_id") or neo["id"])
+    diameter = neo.get("estimated_diameter", {}).get("kilometers", {})
+    asteroid = (
+        neo_id,
+        neo["name"],
+        _float(neo.get("absolute_magnitude_h")),
+        _float(diameter.get("estimated_diameter_min")),
+        _float(diameter.get("estimated_diameter_max")),
+        int(bool(neo.get("is_potentially_hazardous_asteroid"))),
+    )
+    approaches = []
+    for cad in neo.get("close_approach_data", []):
+        miss = cad.get("miss_distance", {})
+        approaches.append((
+            neo_id,
+            cad["close_approach_date"],
+            _float(cad.get("relative_velocity", {}).get("kilometers_per_hour")),
+            _float(miss.get("astronomical")),
+            _float(miss.get("kilometers")),
+            _float(miss.get("lunar")),
+            cad.get("orbiting_body") or "Earth",
+        ))
+    return asteroid, approaches
+
+
+def parse_feed(fileobj):
+    """Stream-parse a feed document, one date at a time -> (asteroid rows, approach rows)."""
+    asteroids, approaches = [], []
+    for _, neos in ijson.kvitems(fileobj, "near_earth_objects", use_float=True):
+        for neo in neos:
+            asteroid, rows = neo_rows(neo)
+            asteroids.append(asteroid)
+            approaches.extend(rows)
+    return asteroids, approaches
+
+
+async def parse_feed_async(stream):
+    """Same as parse_feed, reading from an aiohttp response stream as it arrives."""
+    asteroids, approaches = [], []
+    async for _, neos in ijson.kvitems_async(stream, "near_earth_objects", use_float=True):
+        for neo in neos:
+            asteroid, rows = neo_rows(neo)
+            asteroids.append(asteroid)
+            approaches.extend(rows)
+    return asteroids, approaches
+
+
+def fixture_name(start, end):
+    return f"feed_{start.isoformat()}_{end.isoformat()}.json"
+
+
+_FIXTURE = re.compile(r"feed_(\d{4}-\d{2}-\d{2})_(\d{4}-\d{2}-\d{2})\.json")
+
+
+class RateLimiter:
+    """Token bucket: `rate` requests per `per` seconds, bursting up to `burst`."""
+
+    def __init__(self, rate, per=3600.0, burst=None):
+        self.rate = rate / per
+        self.capacity = burst or rate
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def sync_remaining(self, remaining):
+        # The server's X-RateLimit-Remaining is authoritative when it is lower
+        self.tokens = min(self.tokens, float(remaining))
+
+
+class HttpFeedSource:
+    """Fetches feed windows from NeoWs (or any stand-in server at `base_url`)."""
+
+    def __init__(self, session, api_key="DEMO_KEY", base_url=FEED_URL, limiter=None,
+                 record_dir=None, retries=5):
+        self.session = session
+        self.api_key = api_key
+        self.base_url = base_url
+        self.limiter = limiter
+        self.record_dir = record_dir
+        self.retries = retries
+
+    async def fetch(self, start, end):
+        params = {"start_date": start.isoformat(), "end_date": end.isoformat(), "api_key": self.api_key}
+        for attempt in range(self.retries + 1):
+            if self.limiter:
+                await self.limiter.acquire()
+            async with self.session.get(self.base_url, params=params) as resp:
+                remaining = resp.headers.get("X-RateLimit-Remaining")
+                if self.limiter and remaining is not None and remaining.isdigit():
+                    self.limiter.sync_remaining(int(remaining))
+                if resp.status == 429 or resp.status >= 500:
+                    if attempt == self.retries:
+                        resp.raise_for_status()
+                    retry_after = resp.headers.get("Retry-After", "")
+                    delay = float(retry_after) if retry_after.isdigit() else min(2 ** attempt, 60)
+                    await asyncio.sleep(delay)
+                    continue
+                resp.raise_for_status()
+                if self.record_dir:
+                    body = await resp.read()
+                    with open(os.path.join(self.record_dir, fixture_name(start, end)), "wb") as f:
+                        f.write(body)
+                    return parse_feed(io.BytesIO(body))
+                return await parse_feed_async(resp.content)
+
+
+class FixtureFeedSource:
+    """Replays feed files recorded with --record (feed_<start>_<end>.json)."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def recorded(self):
+        """{(start, end): (size, mtime) of its file} for every window in the directory."""
+        found = {}
+        for name in os.listdir(self.directory):
+            match = _FIXTURE.fullmatch(name)
+            if match:
+                info = os.stat(os.path.join(self.directory, name))
+                found[tuple(date.fromisoformat(d) for d in match.groups())] = (info.st_size, info.st_mtime_ns)
+        return found
+
+    async def fetch(self, start, end):
+        path = os.path.join(self.directory, fixture_name(start, end))
+        if not os.path.exists(path):
+            return [], []
+
+        def read():
+            with open(path, "rb") as f:
+                return parse_feed(f)
+
+        return await asyncio.to_thread(read)
+
+
+class BulkLoader:
+    """Buffers parsed rows and writes them in large upsert transactions."""
+
+    def __init__(self, conn, batch_rows=50000):
+        self.conn = conn
+        self.batch_rows = batch_rows
+        self.asteroids = {}
+        self.approaches = []
+        self.written_asteroids = 0
+        self.written_approaches = 0
+
+    def add(self, asteroids, approaches):
+        for row in asteroids:
+            self.asteroids[row[0]] = row
+        self.approaches.extend(approaches)
+        if len(self.approaches) + len(self.asteroids) >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.asteroids and not self.approaches:
+            return
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(UPSERT_ASTEROID, self.asteroids.values())
+            self.conn.executemany(UPSERT_APPROACH, self.approaches)
+            refresh_trends(self.conn)
+            refresh_sketches(self.conn)
+            if self.conn.total_changes != before:
+                bump_data_version(self.conn)
+                refresh_overview(self.conn)
+        self.written_asteroids += len(self.asteroids)
+        self.written_approaches += len(self.approaches)
+        self.asteroids = {}
+        self.approaches = []
+
+
+async def ingest(start, end, source, loader, concurrency=8):
+    """Fetch every window in [start, end] with `concurrency` workers and load the results."""
+    return await ingest_windows(feed_windows(start, end), source, loader, concurrency)
+
+
+async def ingest_windows(windows_to_fetch, source, loader, concurrency=8):
+    """Fetch the given (start, end) windows with `concurrency` workers and load the results."""
+    windows = asyncio.Queue()
+    for window in windows_to_fetch:
+        windows.put_nowait(window)
+    total = windows.qsize()
+    results = asyncio.Queue(maxsize=concurrency * 2)  # backpressure if the loader falls behind
+
+    async def worker():
+        while True:
+            try:
+                window = windows.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                result = await source.fetch(*window)
+            except Exception as e:
+                result = e  # handed to the consumer, which would otherwise wait for this window forever
+            await results.put(result)
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        for _ in range(total):
+            result = await results.get()
+            if isinstance(result, Exception):
+                raise result
+            asteroids, approaches = result
+            await asyncio.to_thread(loader.add, asteroids, approaches)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+    await asyncio.to_thread(loader.flush)
+    return total
+
+
+async def run(args):
+    conn = connect_writer(args.db)
+    loader = BulkLoader(conn, batch_rows=args.batch_rows)
+    started = time.perf_counter()
+    if args.fixtures:
+        windows = await ingest(args.start, args.end, FixtureFeedSource(args.fixtures), loader,
+                               concurrency=args.concurrency)
+    else:
+        rate, _, per = args.rate.partition("/")
+        limiter = RateLimiter(int(rate), float(per or 3600))
+        if args.record:
+            os.makedirs(args.record, exist_ok=True)
+        timeout = aiohttp.ClientTimeout(total=120)
+        connector = aiohttp.TCPConnector(limit=args.concurrency)
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            source = HttpFeedSource(session, api_key=args.api_key, base_url=args.base_url,
+                                    limiter=limiter, record_dir=args.record)
+            windows = await ingest(args.start, args.end, source, loader, concurrency=args.concurrency)
+    conn.close()
+    elapsed = time.perf_counter() - started
+    print(f"{windows} windows, {loader.written_asteroids:,} asteroid rows, "
+          f"{loader.written_approaches:,} approach rows upserted in {elapsed:.1f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load NeoWs feed windows into nasa_neo.db")
+    parser.add_argument("--db", default=config.DB_PATH)
+    parser.add_argument("--start", type=date.fromisoformat, required=True)
+    parser.add_argument("--end", type=date.fromisoformat, required=True)
+    parser.add_argument("--api-key", default=os.environ.get("NASA_API_KEY", "DEMO_KEY"))
+    parser.add_argument("--base-url", default=FEED_URL, help="feed endpoint (point at a stand-in server for tests)")
+    parser.add_argument("--fixtures", help="read feed_<start>_<end>.json files from this directory instead of HTTP")
+    parser.add_argument("--record", help="save every raw feed response into this directory")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", default="1000/3600", help="request budget as COUNT/SECONDS")
+    parser.add_argument("--batch-rows", type=int, default=50000, help="rows per write transaction")
+    args = parser.parse_args(argv)
+    if args.end < args.start:
+        parser.error("--end is before --start")
+    asyncio.run(run(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Precomputed headline numbers for the dashboard's first paint.
+
+overview_snapshot holds one row -- total asteroids, total approaches,
+hazardous asteroids and the largest hazardous asteroid -- stamped with the
+data version it was computed at. neo_ingest.BulkLoader rewrites it on every
+flush that changes data, so the header cards are one primary-key read. When
+some other writer has moved the data version on, CURRENT_SNAPSHOT returns no
+row and the dashboard computes the numbers live.
+
+Usage:
+    python overview_snapshot.py nasa_neo.db   # recompute it now
+"""
+import argparse
+import sqlite3
+import sys
+
+import config
+
+SNAPSHOT_SELECT = """
+SELECT
+    1,
+    (SELECT version FROM data_version WHERE id = 1),
+    (SELECT COUNT(*) FROM asteroids),
+    (SELECT COALESCE(SUM(approach_count), 0) FROM yearly_approach_stats),
+    (SELECT COUNT(*) FROM asteroids WHERE is_potentially_hazardous_asteroid = 1),
+    largest.name,
+    largest.estimated_diameter_max_km,
+    datetime('now')
+FROM (SELECT 1)
+LEFT JOIN (
+    SELECT name, estimated_diameter_max_km
+    FROM asteroids
+    WHERE is_potentially_hazardous_asteroid = 1
+    ORDER BY estimated_diameter_max_km DESC
+    LIMIT 1
+) largest
+"""
+
+MIGRATION = [
+    """
+    CREATE TABLE overview_snapshot (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        data_version INTEGER NOT NULL,
+        total_asteroids INTEGER NOT NULL,
+        total_approaches INTEGER NOT NULL,
+        hazardous INTEGER NOT NULL,
+        largest_hazardous_name TEXT,
+        largest_hazardous_km REAL,
+        updated_at TEXT NOT NULL
+    )
+    """,
+    "INSERT INTO overview_snapshot " + SNAPSHOT_SELECT,
+]
+
+# The snapshot if it matches the current data version, else no row
+CURRENT_SNAPSHOT = """
+SELECT total_asteroids, total_approaches, hazardous, largest_hazardous_name, largest_hazardous_km
+FROM overview_snapshot
+WHERE id = 1 AND data_version = (SELECT version FROM data_version WHERE id = 1)
+"""
+
+
+def refresh_overview(conn):
+    """Recompute the snapshot; call inside the writer's transaction, after bump_data_version."""
+    conn.execute("INSERT OR REPLACE INTO overview_snapshot " + SNAPSHOT_SELECT)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute the dashboard's overview snapshot")
+    parser.add_argument("db", nargs="?", default=config.DB_PATH)
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    with conn:
+        refresh_overview(conn)
+    total_asteroids, total_approaches, hazardous, name, km = conn.execute(CURRENT_SNAPSHOT).fetchone()
+    print(f"{total_asteroids:,} asteroids, {total_approaches:,} approaches, {hazardous:,} hazardous; "
+          f"largest hazardous: {name} ({km} km)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""
+Parquet snapshots of nasa_neo.db for the columnar backend (see backends.py).
+
+Every table is exported from one consistent read transaction into
+zstd-compressed Parquet: close_approach is split into one directory per
+approach_year, the other tables are single files. Each snapshot lives in its
+own directory named after the data version it was taken at, and the LATEST
+file is switched to it only once it is complete, so readers never see a
+half-written snapshot.
+
+Usage:
+    python parquet_snapshot.py [nasa_neo.db] [--out snapshots]
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+import config
+from data_version import read_data_version
+from schema_migrations import current_version
+
+PARTITIONED = {"close_approach": "approach_year"}
+SKIP_TABLES = {"schema_version", "data_version", "asteroid_trends_dirty", "approach_partitions",
+               "overview_snapshot", "approach_sketches", "approach_sketches_dirty"}
+CHUNK_ROWS = 131072  # rows per Parquet row group
+LATEST = "LATEST"
+
+
+def _arrow_type(declared):
+    """Arrow type for an SQLite declared column type (affinity rules); None lets Arrow infer."""
+    import pyarrow as pa
+    declared = (declared or "").upper()
+    if "INT" in declared:
+        return pa.int64()
+    if any(word in declared for word in ("CHAR", "CLOB", "TEXT")):
+        return pa.string()
+    if any(word in declared for word in ("REAL", "FLOA", "DOUB")):
+        return pa.float64()
+    return None
+
+
+def snapshot_tables(conn):
+    """{table: [(column, declared type), ...]} of the ordinary tables worth exporting."""
+    rows = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table' ORDER BY name").fetchall()
+    virtual = [name for name, sql in rows if sql and sql.upper().startswith("CREATE VIRTUAL")]
+    tables = {}
+    for name, sql in rows:
+        if (name.startswith("sqlite_") or name in SKIP_TABLES or name in virtual
+                or any(name.startswith(v + "_") for v in virtual)):
+            continue
+        # table_xinfo also lists generated columns (hidden = 2 / 3)
+        tables[name] = [(row[1], row[2]) for row in conn.execute(f"PRAGMA table_xinfo({name})")
+                        if row[6] != 1]
+    return tables
+
+
+def _write_query(cursor, sql, columns, path_for_row):
+    """Stream `sql` into Parquet files; `path_for_row(row)` picks the file. Returns {path: rows}."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = [_arrow_type(declared) for _, declared in columns]
+    names = [name for name, _ in columns]
+    writers, counts = {}, {}
+
+    def write(path, rows):
+        arrays = [pa.array(values, type=t) for values, t in zip(zip(*rows), types)]
+        table = pa.Table.from_arrays(arrays, names=names)
+        if path not in writers:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            writers[path] = pq.ParquetWriter(path, table.schema, compression="zstd")
+        writers[path].write_table(table)
+        counts[path] = counts.get(path, 0) + len(rows)
+
+    try:
+        cursor.execute(sql)
+        while True:
+            rows = cursor.fetchmany(CHUNK_ROWS)
+            if not rows:
+                break
+            # Rows arrive grouped by partition, so each run goes to one file
+            start = 0
+            for i in range(1, len(rows) + 1):
+                if i == len(rows) or path_for_row(rows[i]) != path_for_row(rows[start]):
+                    write(path_for_row(rows[start]), rows[start:i])
+                    start = i
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return counts
+
+
+def export_snapshot(db_path=None, out_dir=None, verbose=False):
+    """Write a new snapshot under `out_dir` and point LATEST at it. Returns its manifest."""
+    db_path = db_path or config.DB_PATH
+    out_dir = out_dir or config.SNAPSHOT_DIR
+    started = time.perf_counter()
+    conn = sqlite3.connect(f"file:{quote(db_path)}?mode=ro", uri=True, isolation_level=None)
+    try:
+        conn.execute("BEGIN")  # one read transaction: every table from the same data version
+        version = read_data_version(conn)
+        snapshot_name = f"v{version}-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}"
+        staging = os.path.join(out_dir, f".{snapshot_name}.tmp")
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        manifest = {
+            "data_version": version,
+            "schema_version": current_version(conn),
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "source": os.path.abspath(db_path),
+            "tables": {},
+        }
+        cursor = conn.cursor()
+        for table, columns in snapshot_tables(conn).items():
+            column_list = ", ".join(name for name, _ in columns)
+            key = PARTITIONED.get(table)
+            if key:
+                position = [name for name, _ in columns].index(key)
+                sql = f"SELECT {column_list} FROM {table} ORDER BY {key}"
+                counts = _write_query(cursor, sql, columns, lambda row: os.path.join(
+                    staging, table, f"{key}={row[position]}", "part-0.parquet"))
+            else:
+                path = os.path.join(staging, f"{table}.parquet")
+                counts = _write_query(cursor, f"SELECT {column_list} FROM {table}", columns, lambda row: path)
+                if not counts:
+                    # Empty table: still write the schema so queries see the columns
+                    _write_empty(path, columns)
+                    counts = {path: 0}
+            manifest["tables"][table] = {
+                "files": sorted(os.path.relpath(p, staging) for p in counts),
+                "rows": sum(counts.values()),
+                "partitioned_by": key,
+            }
+            if verbose:
+                print(f"  {table}: {sum(counts.values()):,} rows in {len(counts)} file(s)")
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+    with open(os.path.join(staging, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    final = os.path.join(out_dir, snapshot_name)
+    os.replace(staging, final)
+    pointer = os.path.join(out_dir, LATEST + ".tmp")
+    with open(pointer, "w") as f:
+        f.write(snapshot_name)
+    os.replace(pointer, os.path.join(out_dir, LATEST))
+    manifest["path"] = final
+    if verbose:
+        print(f"Snapshot {final} (data version {version}) written in {time.perf_counter() - started:.1f}s")
+    return manifest
+
+
+def _write_empty(path, columns):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema([(name, _arrow_type(declared) or pa.null()) for name, declared in columns])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pq.write_table(schema.empty_table(), path, compression="zstd")
+
+
+def latest_snapshot(out_dir=None):
+    """(path, manifest) of the newest complete snapshot, or (None, None)."""
+    out_dir = out_dir or config.SNAPSHOT_DIR
+    try:
+        with open(os.path.join(out_dir, LATEST)) as f:
+            path = os.path.join(out_dir, f.read().strip())
+        with open(os.path.join(path, "manifest.json")) as f:
+            return path, json.load(f)
+    except OSError:
+        return None, None
+
+
+def prune_snapshots(out_dir=None, keep=2):
+    """Delete all but the `keep` newest snapshots (never the LATEST one)."""
+    out_dir = out_dir or config.SNAPSHOT_DIR
+    latest, _ = latest_snapshot(out_dir)
+    names = sorted((n for n in os.listdir(out_dir) if n.startswith("v")),
+                   key=lambda n: os.path.getmtime(os.path.join(out_dir, n)), reverse=True)
+    for name in names[keep:]:
+        path = os.path.join(out_dir, name)
+        if path != latest:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export nasa_neo.db to a Parquet snapshot")
+    parser.add_argument("db", nargs="?", default=config.DB_PATH)
+    parser.add_argument("--out", default=config.SNAPSHOT_DIR, help="snapshot directory")
+    parser.add_argument("--keep", type=int, default=2, help="snapshots to keep")
+    args = parser.parse_args(argv)
+    export_snapshot(args.db, args.out, verbose=True)
+    prune_snapshots(args.out, args.keep)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
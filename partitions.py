@@ -0,0 +1,319 @@
+"""
+Per-year partitions of close_approach for date-bounded reads.
+
+freeze_year copies one year of approaches into its own SQLite file (same
+table and indexes, no triggers), ANALYZEs and VACUUMs it, and makes it
+read-only. Readers attach partition files with immutable=1, so they take no
+locks and never touch the pages ingestion writes. approach_partitions
+records which years are frozen.
+
+Partitions are a read-side copy: close_approach in the main database keeps
+every row, because the summary, risk and trend triggers recompute from it
+and ingestion upserts on its keys. So what moves off the live table is the
+reads of frozen years; ingestion and reads of unfrozen (recent) years still
+share it and its indexes. A trigger marks a year's partition stale as soon
+as one of its approaches changes; stale partitions are ignored until they
+are frozen again.
+
+route(conn, since, until) shadows close_approach on a read connection with a
+TEMP view over just the years in the range: frozen years from their files,
+the others from the main table through its approach_year index, UNION ALL-ed
+so cross-year queries and aggregates run unchanged. batch_runner.py --since
+and the dashboard's date-bounded reads (backends.SQLiteBackend.read with
+`dates`) go through it.
+
+Partition files live in NEO_PARTITION_DIR, by default partitions/ next to the
+database.
+
+Usage:
+    python partitions.py nasa_neo.db                       # list partitions
+    python partitions.py nasa_neo.db --freeze-before 2025  # freeze every year before 2025
+    python partitions.py nasa_neo.db --freeze 2023         # (re)freeze one year
+    python partitions.py nasa_neo.db --refreeze            # rebuild stale partitions
+    python partitions.py nasa_neo.db --check               # compare partitions with close_approach
+"""
+import argparse
+import os
+import sqlite3
+import stat
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date
+from urllib.parse import quote
+
+import config
+
+# Leaves room under SQLite's default limit of 10 attached databases
+MAX_ATTACHED = 8
+
+_MARK_STALE = "UPDATE approach_partitions SET stale = 1 WHERE approach_year = {ref}.approach_year AND stale = 0;"
+
+MIGRATION = [
+    """
+    CREATE TABLE approach_partitions (
+        approach_year TEXT PRIMARY KEY,
+        file TEXT NOT NULL,
+        approach_count INTEGER NOT NULL,
+        frozen_at TEXT NOT NULL,
+        stale INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    f"""
+    CREATE TRIGGER trg_close_approach_partition_insert AFTER INSERT ON close_approach
+    BEGIN
+        {_MARK_STALE.format(ref="new")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER trg_close_approach_partition_delete AFTER DELETE ON close_approach
+    BEGIN
+        {_MARK_STALE.format(ref="old")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER trg_close_approach_partition_update AFTER UPDATE ON close_approach
+    BEGIN
+        {_MARK_STALE.format(ref="old")}
+        {_MARK_STALE.format(ref="new")}
+    END
+    """,
+]
+
+
+def _db_path(conn):
+    return next(row[2] for row in conn.execute("PRAGMA database_list") if row[1] == "main")
+
+
+def partition_dir(db_path):
+    return config.PARTITION_DIR or os.path.join(os.path.dirname(os.path.abspath(db_path)), "partitions")
+
+
+def _resolve(db_path, file):
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), file)
+
+
+def _build(db_path, path, year):
+    """Write `year`'s approaches from `db_path` to a new database at `path`. Returns the row count."""
+    part = sqlite3.connect(f"file:{quote(path)}", uri=True, isolation_level=None)
+    try:
+        part.execute("PRAGMA journal_mode = OFF")  # a failed build is simply deleted
+        part.execute("ATTACH DATABASE ? AS src", (f"file:{quote(db_path)}?mode=ro",))
+        schema = part.execute("SELECT type, sql FROM src.sqlite_master WHERE tbl_name = 'close_approach' "
+                              "AND type IN ('table', 'index') AND sql IS NOT NULL").fetchall()
+        # table_xinfo hidden = 2 / 3: generated columns, recomputed on insert
+        columns = ", ".join(row[1] for row in part.execute("PRAGMA src.table_xinfo(close_approach)")
+                            if row[6] not in (2, 3))
+        part.execute(next(sql for kind, sql in schema if kind == "table"))
+        part.execute("BEGIN")
+        part.execute(f"INSERT INTO main.close_approach ({columns}) SELECT {columns} FROM src.close_approach "
+                     "WHERE approach_year = ? ORDER BY id", (year,))
+        part.execute("COMMIT")
+        for kind, sql in schema:
+            if kind == "index":
+                part.execute(sql)
+        count = part.execute("SELECT COUNT(*) FROM main.close_approach").fetchone()[0]
+        part.execute("DETACH DATABASE src")
+        part.execute("ANALYZE")
+        part.execute("VACUUM")
+    finally:
+        part.close()
+    return count
+
+
+def freeze_year(conn, year, directory=None):
+    """Copy `year`'s approaches into a read-only partition file and record it. Returns the row count.
+
+    `conn` is the writer; approach writes wait until the partition is recorded.
+    """
+    year = f"{int(year):04d}"  # also names the attached database
+    db_path = _db_path(conn)
+    directory = directory or partition_dir(db_path)
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    path = os.path.join(directory, f"{stem}_approaches_{year}.db")
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        count = _build(db_path, tmp, year)
+        os.chmod(tmp, stat.S_IREAD | stat.S_IRGRP | stat.S_IROTH)
+        if os.path.exists(path):
+            os.chmod(path, stat.S_IREAD | stat.S_IWRITE)  # Windows won't replace a read-only file
+        os.replace(tmp, path)
+        conn.execute("INSERT OR REPLACE INTO approach_partitions (approach_year, file, approach_count, frozen_at, "
+                     "stale) VALUES (?, ?, ?, datetime('now'), 0)",
+                     (year, os.path.relpath(path, os.path.dirname(os.path.abspath(db_path))), count))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return count
+
+
+def drop_partition(conn, year):
+    """Forget `year`'s partition and delete its file; readers fall back to close_approach."""
+    row = conn.execute("SELECT file FROM approach_partitions WHERE approach_year = ?", (str(year),)).fetchone()
+    if row is None:
+        return False
+    with conn:
+        conn.execute("DELETE FROM approach_partitions WHERE approach_year = ?", (str(year),))
+    path = _resolve(_db_path(conn), row[0])
+    if os.path.exists(path):
+        os.chmod(path, stat.S_IREAD | stat.S_IWRITE)
+        os.remove(path)
+    return True
+
+
+def frozen_partitions(conn):
+    """{year: file path} of the partitions readers may use (recorded, not stale, file present)."""
+    try:
+        rows = conn.execute("SELECT approach_year, file FROM approach_partitions WHERE stale = 0").fetchall()
+    except sqlite3.OperationalError:
+        return {}  # database not migrated yet
+    db_path = _db_path(conn)
+    return {year: _resolve(db_path, file) for year, file in rows if os.path.exists(_resolve(db_path, file))}
+
+
+def _day(value):
+    return date.fromisoformat(str(value)).isoformat() if value else None  # it ends up inside SQL text
+
+
+def unroute(conn):
+    """Drop the view made by route() and detach its partitions."""
+    query_only = conn.execute("PRAGMA query_only").fetchone()[0]
+    conn.execute("PRAGMA query_only = 0")
+    try:
+        conn.execute("DROP VIEW IF EXISTS temp.close_approach")
+        for row in conn.execute("PRAGMA database_list").fetchall():
+            if row[1].startswith("part_"):
+                conn.execute(f"DETACH DATABASE {row[1]}")
+    finally:
+        conn.execute(f"PRAGMA query_only = {query_only}")
+
+
+def route(conn, since=None, until=None):
+    """Shadow close_approach on `conn` with the approaches from `since` to `until` (dates, inclusive).
+
+    Returns {year: "partition" or "main"} for the usable partitions in the
+    range; past MAX_ATTACHED of them the oldest years are read from the main
+    table. Without either bound nothing is shadowed.
+    """
+    since, until = _day(since), _day(until)
+    unroute(conn)
+    if not since and not until:
+        return {}  # nothing to prune: the main table answers best on its own
+    frozen = frozen_partitions(conn)
+    years = sorted(y for y in frozen if (not since or y >= since[:4]) and (not until or y <= until[:4]))
+    attach = years[-MAX_ATTACHED:]  # the rest, if any, come from the main table
+
+    def bounded(year=None):
+        conditions = []
+        if since and (year is None or since > f"{year}-01-01"):
+            conditions.append(f"close_approach_date >= '{since}'")
+        if until and (year is None or until < f"{year}-12-31"):
+            conditions.append(f"close_approach_date <= '{until}'")
+        return conditions
+
+    branches = [f"SELECT * FROM part_{year}.close_approach"
+                + "".join(f" {'WHERE' if i == 0 else 'AND'} {c}" for i, c in enumerate(bounded(year)))
+                for year in attach]
+    # The main table covers the years not read from a partition, found through its approach_year index
+    if since and until:
+        remaining = [f"'{y}'" for y in range(int(since[:4]), int(until[:4]) + 1) if str(y) not in attach]
+        rest = [f"approach_year IN ({', '.join(remaining)})"] if remaining else None
+    else:
+        rest = [f"approach_year >= '{since[:4]}'"] if since else []
+        rest += [f"approach_year <= '{until[:4]}'"] if until else []
+        if attach:
+            rest.append("approach_year NOT IN ({})".format(", ".join(f"'{y}'" for y in attach)))
+    if rest is not None or not branches:
+        conditions = (rest or []) + bounded()
+        branches.append("SELECT * FROM main.close_approach"
+                        + "".join(f" {'WHERE' if i == 0 else 'AND'} {c}" for i, c in enumerate(conditions)))
+
+    query_only = conn.execute("PRAGMA query_only").fetchone()[0]
+    conn.execute("PRAGMA query_only = 0")  # TEMP objects count as writes
+    try:
+        for year in attach:
+            conn.execute(f"ATTACH DATABASE ? AS part_{year}", (f"file:{quote(frozen[year])}?mode=ro&immutable=1",))
+        conn.execute("CREATE TEMP VIEW close_approach AS " + "\nUNION ALL\n".join(branches))
+    finally:
+        conn.execute(f"PRAGMA query_only = {query_only}")
+    return {year: "partition" if year in attach else "main" for year in years}
+
+
+@contextmanager
+def routed(conn, since=None, until=None):
+    """route() for the duration of a with block; for pooled connections."""
+    try:
+        yield route(conn, since, until)
+    finally:
+        unroute(conn)
+
+
+def check_partitions(conn):
+    """Compare every usable partition with its year in close_approach. Returns a list of problems."""
+    problems = []
+    digest = "SELECT COUNT(*), TOTAL(id), TOTAL(miss_distance_km), TOTAL(relative_velocity_kmph) FROM {}"
+    for year, path in sorted(frozen_partitions(conn).items()):
+        if os.stat(path).st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH):
+            problems.append(f"{year}: {path} is writable")
+        want = conn.execute(digest.format("main.close_approach WHERE approach_year = ?"), (year,)).fetchone()
+        part = sqlite3.connect(f"file:{quote(path)}?mode=ro&immutable=1", uri=True)
+        try:
+            have = part.execute(digest.format("close_approach")).fetchone()
+        finally:
+            part.close()
+        if want != have:
+            problems.append(f"{year}: partition has {have}, close_approach has {want}")
+    return problems
+
+
+def main(argv=None):
+    from db_pool import connect_writer
+
+    parser = argparse.ArgumentParser(description="Freeze, check and list per-year approach partitions")
+    parser.add_argument("db", nargs="?", default=config.DB_PATH)
+    parser.add_argument("--freeze", type=int, action="append", default=[], help="freeze this year (repeatable)")
+    parser.add_argument("--freeze-before", type=int, metavar="YEAR", help="freeze every year before YEAR")
+    parser.add_argument("--refreeze", action="store_true", help="rebuild stale partitions")
+    parser.add_argument("--drop", type=int, action="append", default=[], help="remove this year's partition")
+    parser.add_argument("--check", action="store_true", help="compare partitions with close_approach")
+    args = parser.parse_args(argv)
+
+    conn = connect_writer(args.db)
+    years = [str(y) for y in args.freeze]
+    if args.freeze_before:
+        years += [row[0] for row in conn.execute("SELECT DISTINCT approach_year FROM close_approach "
+                                                 "WHERE approach_year < ?", (str(args.freeze_before),))]
+    if args.refreeze:
+        years += [row[0] for row in conn.execute("SELECT approach_year FROM approach_partitions WHERE stale = 1")]
+    for year in sorted(set(years)):
+        started = time.perf_counter()
+        count = freeze_year(conn, year)
+        print(f"{year}: {count:,} approaches frozen in {time.perf_counter() - started:.2f}s")
+    for year in args.drop:
+        print(f"{year}: partition dropped" if drop_partition(conn, year) else f"{year}: no partition")
+
+    db_path = _db_path(conn)
+    for year, file, count, frozen_at, stale in conn.execute("SELECT * FROM approach_partitions "
+                                                            "ORDER BY approach_year"):
+        path = _resolve(db_path, file)
+        size = f"{os.path.getsize(path) / 2 ** 20:.1f} MB" if os.path.exists(path) else "missing"
+        print(f"  {year}  {count:>10,} approaches  {size:>10}  frozen {frozen_at}{'  STALE' if stale else ''}")
+    if args.check:
+        problems = check_partitions(conn)
+        for problem in problems:
+            print(problem)
+        print("Partitions are consistent" if not problems else f"{len(problems)} inconsistencies found")
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+Bounded-size data for the dashboard's scatter plots.
+
+density_query bins two columns into an x_bins x y_bins grid in SQL (optionally
+on log axes) and returns one row per non-empty cell: the mean x / y of its
+points (to 6 decimals, so both backends agree), how many there are, plus any
+extra aggregates. A chart drawn from it
+covers every approach with at most x_bins * y_bins markers, however large the
+table. The SQL runs unchanged on SQLite and DuckDB (see backends.py).
+
+lttb thins an x-ordered series to a fixed number of points with
+Largest-Triangle-Three-Buckets, which keeps the peaks and dips that a uniform
+sample would drop.
+"""
+import numpy as np
+import pandas as pd
+
+DENSITY_BINS = (60, 40)
+MAX_POINTS = 1000
+
+
+def _cell(value, low, high, bins):
+    # floor() rather than CAST alone: DuckDB rounds on CAST, SQLite truncates
+    return (f"CASE WHEN {value} >= {high} THEN {bins - 1} "
+            f"ELSE CAST(floor(({value} - {low}) * {bins} / ({high} - {low})) AS INTEGER) END")
+
+
+def _bound(function, column, source, log):
+    if not log:
+        return f"(SELECT {function}({column}) FROM {source})"
+    return f"log10((SELECT {function}({column}) FROM {source} WHERE {column} > 0))"
+
+
+def density_query(x, y, source, where=(), x_name="x", y_name="y", bins=DENSITY_BINS,
+                  log_x=False, log_y=False, values=None, bounds_source=None):
+    """SQL binning `x` by `y` over `source` (a FROM clause) into `bins` cells.
+
+    `where` are extra WHERE clauses (bound parameters allowed) and `values`
+    maps extra output columns to aggregates, e.g.
+    {"hazardous": "SUM(a.is_potentially_hazardous_asteroid)"}. The grid spans
+    the range of x and y in `bounds_source` (default `source`); pointing it
+    at the bare indexed table makes the bounds index lookups, and keeps the
+    grid the same whatever `where` filters out. Log axes skip values <= 0.
+    """
+    x_bins, y_bins = bins
+    bounds_source = bounds_source or source
+    # Unary + keeps SQLite from answering "> 0" (nearly every row) through an index
+    conditions = [f"{x} IS NOT NULL", f"{y} IS NOT NULL"]
+    conditions += [f"+{column} > 0" for column, log in ((x, log_x), (y, log_y)) if log]
+    conditions += list(where)
+    tx = f"log10({x})" if log_x else x
+    ty = f"log10({y})" if log_y else y
+    extra = "".join(f",\n    {aggregate} AS {name}" for name, aggregate in (values or {}).items())
+    return f"""
+WITH bounds AS (
+    SELECT
+        {_bound("MIN", x, bounds_source, log_x)} AS lo_x,
+        {_bound("MAX", x, bounds_source, log_x)} AS hi_x,
+        {_bound("MIN", y, bounds_source, log_y)} AS lo_y,
+        {_bound("MAX", y, bounds_source, log_y)} AS hi_y
+)
+SELECT
+    {_cell(tx, "lo_x", "hi_x", x_bins)} AS bin_x,
+    {_cell(ty, "lo_y", "hi_y", y_bins)} AS bin_y,
+    ROUND(AVG({x}), 6) AS {x_name},
+    ROUND(AVG({y}), 6) AS {y_name},
+    COUNT(*) AS count{extra}
+FROM bounds, {source}
+WHERE {" AND ".join(conditions)}
+GROUP BY bin_x, bin_y
+ORDER BY bin_x, bin_y
+"""
+
+
+def velocity_distance_query(where=()):
+    """Approaches binned by miss distance (LD) x velocity (km/h), both on log axes."""
+    return density_query(
+        "c.miss_distance_lunar", "c.relative_velocity_kmph",
+        "asteroids a JOIN close_approach c ON a.id = c.neo_reference_id",
+        where=where, x_name="distance", y_name="velocity", log_x=True, log_y=True,
+        values={"hazardous": "SUM(a.is_potentially_hazardous_asteroid)",
+                "size": "ROUND(AVG(a.estimated_diameter_max_km), 6)"},
+        bounds_source="close_approach c",
+    )
+
+
+def lttb(x, y, n_out=MAX_POINTS):
+    """Indices of `n_out` points of the series (x ascending, no NaNs) picked by LTTB."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    # First and last points are kept; the n_out - 2 buckets in between split the rest evenly
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+    cum_x = np.concatenate(([0.0], np.cumsum(x)))
+    cum_y = np.concatenate(([0.0], np.cumsum(y)))
+    mean_x = (cum_x[ends] - cum_x[starts]) / (ends - starts)
+    mean_y = (cum_y[ends] - cum_y[starts]) / (ends - starts)
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        s, e = starts[i], ends[i]
+        # Triangle with the previously kept point and the next bucket's average
+        if i + 1 < n_out - 2:
+            next_x, next_y = mean_x[i + 1], mean_y[i + 1]
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs((x[a] - next_x) * (y[s:e] - y[a]) - (x[a] - x[s:e]) * (next_y - y[a]))
+        a = s + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample(df, x, y, n_out=MAX_POINTS, keep=()):
+    """`df` thinned to about `n_out` rows by LTTB over columns `x` (sortable) and `y`.
+
+    Rows whose index labels are in `keep` are always included.
+    """
+    df = df.dropna(subset=[x, y])
+    if len(df) <= n_out:
+        return df
+    df = df.sort_values(x, kind="stable")
+    keys = df[x]
+    if not pd.api.types.is_numeric_dtype(keys):
+        keys = pd.to_datetime(keys).astype("int64")  # dates as text
+    chosen = np.zeros(len(df), dtype=bool)
+    chosen[lttb(keys.to_numpy(), df[y].to_numpy(), n_out)] = True
+    chosen |= df.index.isin(keep)
+    return df[chosen]
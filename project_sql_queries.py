@@ -1,12 +1,18 @@
+# Per-asteroid and per-month/year queries read the trigger-maintained
+# summary tables (see aggregates.py) instead of re-aggregating close_approach.
+import re
+
+from plot_data import velocity_distance_query
+from trends import TRENDS_SELECT
+
 # Query 1: Count approaches per asteroid
 QUERY_1 = """
 SELECT 
     a.name,
-    COUNT(*) as approach_count
-FROM asteroids a
-JOIN close_approach c ON a.id = c.neo_reference_id
-GROUP BY a.id, a.name
-ORDER BY approach_count DESC
+    s.approach_count
+FROM asteroid_stats s
+JOIN asteroids a ON a.id = s.neo_reference_id
+ORDER BY s.approach_count DESC
 LIMIT 50
 """
 
@@ -14,11 +20,10 @@ LIMIT 50
 QUERY_2 = """
 SELECT 
     a.name,
-    ROUND(AVG(c.relative_velocity_kmph), 2) as avg_velocity
-FROM asteroids a
-JOIN close_approach c ON a.id = c.neo_reference_id
-GROUP BY a.id, a.name
-ORDER BY avg_velocity DESC
+    ROUND(s.avg_velocity, 2) as avg_velocity
+FROM asteroid_stats s
+JOIN asteroids a ON a.id = s.neo_reference_id
+ORDER BY s.avg_velocity DESC
 LIMIT 50
 """
 
@@ -26,11 +31,10 @@ LIMIT 50
 QUERY_3 = """
 SELECT 
     a.name,
-    MAX(c.relative_velocity_kmph) as max_velocity
-FROM asteroids a
-JOIN close_approach c ON a.id = c.neo_reference_id
-GROUP BY a.id, a.name
-ORDER BY max_velocity DESC
+    s.max_velocity
+FROM asteroid_stats s
+JOIN asteroids a ON a.id = s.neo_reference_id
+ORDER BY s.max_velocity DESC
 LIMIT 10
 """
 
@@ -39,22 +43,20 @@ QUERY_4 = """
 SELECT 
     a.name,
     a.is_potentially_hazardous_asteroid as hazardous,
-    COUNT(*) as approach_count
-FROM asteroids a
-JOIN close_approach c ON a.id = c.neo_reference_id
+    s.approach_count
+FROM asteroid_stats s
+JOIN asteroids a ON a.id = s.neo_reference_id
 WHERE a.is_potentially_hazardous_asteroid = 1
-GROUP BY a.id, a.name
-HAVING COUNT(*) > 3
-ORDER BY approach_count DESC
+AND s.approach_count > 3
+ORDER BY s.approach_count DESC
 """
 
 # Query 5: Month with most approaches
 QUERY_5 = """
 SELECT 
-    strftime('%Y-%m', close_approach_date) as month,
-    COUNT(*) as approach_count
-FROM close_approach
-GROUP BY strftime('%Y-%m', close_approach_date)
+    approach_month as month,
+    approach_count
+FROM monthly_approach_stats
 ORDER BY approach_count DESC
 """
 
@@ -81,21 +83,20 @@ ORDER BY estimated_diameter_max_km DESC
 LIMIT 50
 """
 
-# Query 8: Approaches getting closer over time
+# Query 8: Asteroids getting closer (falling miss-distance trend), by approach rate (see trends.py)
 QUERY_8 = """
 SELECT 
     a.name,
-    c.close_approach_date,
-    c.miss_distance_km
-FROM asteroids a
-JOIN close_approach c ON a.id = c.neo_reference_id
-WHERE a.id IN (
-    SELECT neo_reference_id
-    FROM close_approach
-    GROUP BY neo_reference_id
-    HAVING COUNT(*) > 1
-)
-ORDER BY a.name, c.close_approach_date
+    t.approach_count,
+    ROUND(t.approaches_per_year, 2) as approaches_per_year,
+    ROUND(t.cadence_days, 1) as cadence_days,
+    ROUND(t.slope_km_per_year) as trend_km_per_year,
+    ROUND(t.min_delta_km) as biggest_drop_km,
+    t.last_approach_date
+FROM asteroid_trends t
+JOIN asteroids a ON a.id = t.neo_reference_id
+WHERE t.slope_km_per_year < 0
+ORDER BY t.approaches_per_year DESC, t.neo_reference_id
 LIMIT 100
 """
 
@@ -103,12 +104,11 @@ LIMIT 100
 QUERY_9 = """
 SELECT 
     a.name,
-    c.close_approach_date,
-    MIN(c.miss_distance_km) as closest_distance
-FROM asteroids a
-JOIN close_approach c ON a.id = c.neo_reference_id
-GROUP BY a.id, a.name
-ORDER BY closest_distance ASC
+    s.closest_approach_date as close_approach_date,
+    s.min_miss_distance_km as closest_distance
+FROM asteroid_stats s
+JOIN asteroids a ON a.id = s.neo_reference_id
+ORDER BY s.min_miss_distance_km ASC
 LIMIT 50
 """
 
@@ -128,10 +128,9 @@ LIMIT 100
 # Query 11: Monthly approach count
 QUERY_11 = """
 SELECT 
-    strftime('%Y-%m', close_approach_date) as month,
-    COUNT(*) as count
-FROM close_approach
-GROUP BY strftime('%Y-%m', close_approach_date)
+    approach_month as month,
+    approach_count as count
+FROM monthly_approach_stats
 ORDER BY month
 """
 
@@ -189,10 +188,9 @@ LIMIT 50
 CUSTOM_1 = """
 -- Year-over-year trends
 SELECT 
-    strftime('%Y', close_approach_date) as year,
-    COUNT(*) as total_approaches
-FROM close_approach
-GROUP BY strftime('%Y', close_approach_date)
+    approach_year as year,
+    approach_count as total_approaches
+FROM yearly_approach_stats
 ORDER BY year
 """
 
@@ -200,8 +198,8 @@ ORDER BY year
 CUSTOM_2 = """
 -- Average miss distance by month
 SELECT 
-    strftime('%m', close_approach_date) as month_num,
-    CASE strftime('%m', close_approach_date)
+    substr(approach_month, 6, 2) as month_num,
+    CASE substr(approach_month, 6, 2)
         WHEN '01' THEN 'January' WHEN '02' THEN 'February'
         WHEN '03' THEN 'March' WHEN '04' THEN 'April'
         WHEN '05' THEN 'May' WHEN '06' THEN 'June'
@@ -209,9 +207,9 @@ SELECT
         WHEN '09' THEN 'September' WHEN '10' THEN 'October'
         WHEN '11' THEN 'November' WHEN '12' THEN 'December'
     END as month_name,
-    ROUND(AVG(miss_distance_lunar), 2) as avg_distance_LD
-FROM close_approach
-GROUP BY strftime('%m', close_approach_date)
+    ROUND(SUM(lunar_sum) / SUM(lunar_count), 2) as avg_distance_LD
+FROM monthly_approach_stats
+GROUP BY substr(approach_month, 6, 2)
 ORDER BY month_num
 """
 
@@ -230,17 +228,16 @@ HAVING COUNT(*) > 1
 ORDER BY close_calls DESC
 LIMIT 20
 """
-# Risk Score Analysis
+# Risk Score Analysis (scores are stored by risk.py; the leaderboard keeps the top 100)
 CUSTOM_RISK = """
 SELECT 
     a.name,
-    ROUND(a.estimated_diameter_max_km * c.relative_velocity_kmph / 
-          CASE WHEN c.miss_distance_lunar > 0 THEN c.miss_distance_lunar ELSE 1 END, 2) as risk_score,
+    ROUND(t.risk_score, 2) as risk_score,
     c.close_approach_date
-FROM asteroids a
-JOIN close_approach c ON a.id = c.neo_reference_id
-WHERE a.is_potentially_hazardous_asteroid = 1
-ORDER BY risk_score DESC
+FROM threat_leaderboard t
+JOIN close_approach c ON c.id = t.approach_id
+JOIN asteroids a ON a.id = t.neo_reference_id
+ORDER BY t.risk_score DESC
 LIMIT 20
 """
 # Size Categories
@@ -280,4 +277,215 @@ QUERIES = {
     "BONUS: Multiple Close Calls": CUSTOM_3,
     "BONUS: Risk Score Analysis": CUSTOM_RISK,
     "BONUS: Size Categories": CUSTOM_SIZE,
-}
\ No newline at end of file
+}
+
+# Inline queries of the dashboard's Overview, Analytics and Top Threats pages
+
+# Every approach, as density cells (see plot_data.py)
+VELOCITY_VS_DISTANCE = velocity_distance_query()
+# Every approach inside the Moon's orbit, in date order for LTTB downsampling
+LUNAR_APPROACHES = """
+SELECT 
+    a.name,
+    c.close_approach_date,
+    c.miss_distance_lunar as lunar_distance
+FROM asteroids a
+JOIN close_approach c ON a.id = c.neo_reference_id
+WHERE c.miss_distance_lunar < 1
+ORDER BY c.close_approach_date, c.miss_distance_lunar, c.id
+"""
+TOP_THREATS = """
+SELECT 
+    a.name,
+    a.estimated_diameter_max_km as diameter,
+    c.relative_velocity_kmph as velocity,
+    c.miss_distance_lunar as distance,
+    c.close_approach_date as next_approach,
+    ROUND(t.risk_score, 2) as threat_score
+FROM threat_leaderboard t
+JOIN close_approach c ON c.id = t.approach_id
+JOIN asteroids a ON a.id = t.neo_reference_id
+ORDER BY t.risk_score DESC
+LIMIT 10
+"""
+# One asteroid (id bound as a parameter) for the asteroid lookup; approaches use the natural-key index
+ASTEROID_DETAIL = """
+SELECT
+    a.name,
+    a.absolute_magnitude_h as magnitude,
+    a.estimated_diameter_min_km as diameter_min,
+    a.estimated_diameter_max_km as diameter_max,
+    a.is_potentially_hazardous_asteroid as hazardous,
+    t.approach_count,
+    t.cadence_days,
+    t.slope_km_per_year
+FROM asteroids a
+LEFT JOIN asteroid_trends t ON t.neo_reference_id = a.id
+WHERE a.id = ?
+"""
+ASTEROID_APPROACHES = """
+SELECT
+    close_approach_date,
+    relative_velocity_kmph as velocity,
+    miss_distance_km,
+    miss_distance_lunar as distance,
+    orbiting_body,
+    ROUND(risk_score, 2) as risk_score
+FROM close_approach
+WHERE neo_reference_id = ?
+ORDER BY close_approach_date
+"""
+# Closest approaches between two dates (bound as parameters); read through partitions.routed for those dates
+CLOSEST_IN_RANGE = """
+SELECT
+    a.name,
+    c.close_approach_date,
+    c.miss_distance_lunar as distance,
+    c.relative_velocity_kmph as velocity,
+    a.is_potentially_hazardous_asteroid as hazardous
+FROM close_approach c
+JOIN asteroids a ON a.id = c.neo_reference_id
+WHERE c.close_approach_date >= ? AND c.close_approach_date <= ?
+ORDER BY c.miss_distance_lunar, c.id
+LIMIT 20
+"""
+
+DASHBOARD_QUERIES = {
+    "Overview: Lunar Distance Analysis": LUNAR_APPROACHES,
+    "Analytics: Velocity vs Distance": VELOCITY_VS_DISTANCE,
+    "Top Threats": TOP_THREATS,
+}
+
+# Column types beyond result_types.COLUMN_TYPES: in these results 'hazardous' is the 0/1 flag
+QUERY_TYPES = {sql: {"hazardous": "flag"} for sql in (QUERY_4, QUERY_7, ASTEROID_DETAIL, CLOSEST_IN_RANGE)}
+
+# The summary-table entries above, computed straight from close_approach.
+# Used to compare plans against the un-aggregated schema and for
+# date-restricted runs where the all-time summaries do not apply.
+RAW_QUERIES = {
+    "1. Approach Count Per Asteroid": """
+SELECT 
+    a.name,
+    COUNT(*) as approach_count
+FROM asteroids a
+JOIN close_approach c ON a.id = c.neo_reference_id
+GROUP BY a.id, a.name
+ORDER BY approach_count DESC
+LIMIT 50
+""",
+    "2. Average Velocity Per Asteroid": """
+SELECT 
+    a.name,
+    ROUND(AVG(c.relative_velocity_kmph), 2) as avg_velocity
+FROM asteroids a
+JOIN close_approach c ON a.id = c.neo_reference_id
+GROUP BY a.id, a.name
+ORDER BY avg_velocity DESC
+LIMIT 50
+""",
+    "3. Top 10 Fastest Asteroids": """
+SELECT 
+    a.name,
+    MAX(c.relative_velocity_kmph) as max_velocity
+FROM asteroids a
+JOIN close_approach c ON a.id = c.neo_reference_id
+GROUP BY a.id, a.name
+ORDER BY max_velocity DESC
+LIMIT 10
+""",
+    "4. Hazardous with >3 Approaches": """
+SELECT 
+    a.name,
+    a.is_potentially_hazardous_asteroid as hazardous,
+    COUNT(*) as approach_count
+FROM asteroids a
+JOIN close_approach c ON a.id = c.neo_reference_id
+WHERE a.is_potentially_hazardous_asteroid = 1
+GROUP BY a.id, a.name, a.is_potentially_hazardous_asteroid
+HAVING COUNT(*) > 3
+ORDER BY approach_count DESC
+""",
+    "5. Month with Most Approaches": """
+SELECT 
+    approach_month as month,
+    COUNT(*) as approach_count
+FROM close_approach
+GROUP BY approach_month
+ORDER BY approach_count DESC
+""",
+    "8. Approaches Getting Closer": QUERY_8.replace(
+        "FROM asteroid_trends t", "FROM (" + TRENDS_SELECT.format(where="") + ") t"),
+    "9. Closest Approach Per Asteroid": """
+SELECT 
+    a.name,
+    c.close_approach_date,
+    c.miss_distance_km as closest_distance
+FROM (
+    SELECT neo_reference_id, close_approach_date, miss_distance_km,
+           ROW_NUMBER() OVER (PARTITION BY neo_reference_id ORDER BY miss_distance_km, id) as nearest
+    FROM close_approach
+) c
+JOIN asteroids a ON a.id = c.neo_reference_id
+WHERE c.nearest = 1
+ORDER BY closest_distance ASC
+LIMIT 50
+""",
+    "11. Monthly Approach Count": """
+SELECT 
+    approach_month as month,
+    COUNT(*) as count
+FROM close_approach
+GROUP BY approach_month
+ORDER BY month
+""",
+    "BONUS: Year-over-Year Trends": """
+SELECT 
+    approach_year as year,
+    COUNT(*) as total_approaches
+FROM close_approach
+GROUP BY approach_year
+ORDER BY year
+""",
+    "BONUS: Risk Score Analysis": """
+SELECT 
+    a.name,
+    ROUND(c.risk_score, 2) as risk_score,
+    c.close_approach_date
+FROM close_approach c
+JOIN asteroids a ON a.id = c.neo_reference_id
+WHERE a.is_potentially_hazardous_asteroid = 1 AND c.risk_score IS NOT NULL
+ORDER BY c.risk_score DESC
+LIMIT 20
+""",
+    "BONUS: Avg Distance by Month": """
+SELECT 
+    substr(approach_month, 6, 2) as month_num,
+    CASE substr(approach_month, 6, 2)
+        WHEN '01' THEN 'January' WHEN '02' THEN 'February'
+        WHEN '03' THEN 'March' WHEN '04' THEN 'April'
+        WHEN '05' THEN 'May' WHEN '06' THEN 'June'
+        WHEN '07' THEN 'July' WHEN '08' THEN 'August'
+        WHEN '09' THEN 'September' WHEN '10' THEN 'October'
+        WHEN '11' THEN 'November' WHEN '12' THEN 'December'
+    END as month_name,
+    ROUND(AVG(miss_distance_lunar), 2) as avg_distance_LD
+FROM close_approach
+GROUP BY substr(approach_month, 6, 2)
+ORDER BY month_num
+""",
+}
+
+
+_TRAILING_LIMIT = re.compile(r"\s+LIMIT\s+\d+\s*;?\s*$", re.IGNORECASE)
+
+
+def strip_limit(sql):
+    """`sql` without its trailing display LIMIT, if it has one."""
+    return _TRAILING_LIMIT.sub("\n", sql)
+
+
+# "Export all" variants of QUERIES: every row, not just the displayed top N.
+# threat_leaderboard only holds the top LEADERBOARD_SIZE approaches, so the
+# risk ranking is exported from close_approach.
+EXPORT_QUERIES = {name: strip_limit(sql) for name, sql in QUERIES.items()}
+EXPORT_QUERIES["BONUS: Risk Score Analysis"] = strip_limit(RAW_QUERIES["BONUS: Risk Score Analysis"])
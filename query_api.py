@@ -0,0 +1,350 @@
+"""
+Local HTTP API over the dashboard's queries.
+
+    GET /queries                 the catalog: name, slug and URL of every query
+    GET /queries/<slug>          one project_sql_queries.QUERIES entry (?all=1: without its display LIMIT)
+    GET /filters                 one Advanced Filters page: velocity_min, diameter_min, lunar_max,
+                                 hazardous, sort_by, page_size and the `after` cursor of the previous page
+    GET /health                  data version, cache and pool statistics
+    GET /metrics                 per-endpoint latency in Prometheus text format
+
+Results are JSON, or Arrow IPC streams with ?format=arrow (or an Accept
+header of application/vnd.apache.arrow.stream). Every result carries an
+ETag made from the data version and the request, so a client that sends
+If-None-Match gets 304 Not Modified until an ingest changes the data --
+without the query running. Bodies are gzip-compressed when the client
+accepts it and cached per data version, and concurrent identical requests
+share one execution.
+
+Usage:
+    python query_api.py --port 8080
+    curl -H "Accept-Encoding: gzip" localhost:8080/queries/3-top-10-fastest-asteroids
+    python query_api.py --load-test --duration 10 --concurrency 32    # requests per second
+"""
+import argparse
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import aiohttp
+import pandas as pd
+import pyarrow as pa
+from aiohttp import web
+
+import config
+from db_pool import Database
+from filter_query import HAZARD_OPTIONS, SORT_KEYS, ApproachFilter, display_frame
+from project_sql_queries import EXPORT_QUERIES, QUERIES
+from query_metrics import QueryMetrics
+
+JSON_TYPE = "application/json"
+ARROW_TYPE = "application/vnd.apache.arrow.stream"
+MIN_GZIP_BYTES = 1024
+MAX_PAGE_SIZE = 1000
+
+
+def slugify(name):
+    return re.sub(r"[^0-9a-z]+", "-", name.lower()).strip("-")
+
+
+SLUGS = {slugify(name): name for name in QUERIES}
+
+
+def encode_cursor(cursor):
+    return None if cursor is None else base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+
+def decode_cursor(text):
+    return tuple(json.loads(base64.urlsafe_b64decode(text.encode()))) if text else None
+
+
+class BodyCache:
+    """Encoded response bodies, bounded in bytes with LRU eviction, dropped when the data version moves."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        if version != self.version:
+            self.entries.clear()
+            self.bytes = 0
+            self.version = version
+        body = self.entries.get(key)
+        if body is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return body
+
+    def put(self, key, version, body):
+        if version != self.version or len(body[0]) > self.max_bytes:
+            return
+        self.entries[key] = body
+        self.bytes += len(body[0])
+        while self.bytes > self.max_bytes:
+            _, (evicted, _) = self.entries.popitem(last=False)
+            self.bytes -= len(evicted)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"entries": len(self.entries), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "data_version": self.version}
+
+
+def frame_body(df, fmt, meta):
+    """Serialize a result: JSON {..meta, columns, rows} or an Arrow IPC stream with `meta` in its schema."""
+    if fmt == "arrow":
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({k: json.dumps(v) for k, v in meta.items()})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    head = json.dumps({**meta, "columns": list(df.columns)})[:-1]
+    return (head + ', "rows": ' + df.to_json(orient="values", date_format="iso") + "}").encode()
+
+
+class QueryAPI:
+    def __init__(self, db_path=None, cache_bytes=None):
+        self.db = Database(db_path or config.DB_PATH)
+        self.cache = BodyCache(config.QUERY_CACHE_BYTES if cache_bytes is None else cache_bytes)
+        self.inflight = {}  # (request key, data version) -> Future of (body, headers)
+        self.metrics = QueryMetrics()
+        self.shared = 0  # requests that joined an execution already in flight
+        self.not_modified = 0
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/queries", self.catalog)
+        app.router.add_get("/queries/{slug}", self.query)
+        app.router.add_get("/filters", self.filters)
+        app.router.add_get("/health", self.health)
+        app.router.add_get("/metrics", self.prometheus)
+        app.on_cleanup.append(self._close)
+        return app
+
+    async def _close(self, app):
+        self.db.close()
+
+    def _read(self, sql, params):
+        with self.db.reader() as conn:
+            return pd.read_sql(sql, conn, params=params)
+
+    async def respond(self, request, key, produce):
+        """Answer `request` with the body `produce()` builds, honouring ETags, gzip, caching and single-flight.
+
+        `key` identifies the result independently of the data version; `produce()` runs in a thread
+        and returns (DataFrame, meta, extra headers).
+        """
+        fmt = "arrow" if request.query.get("format") == "arrow" or ARROW_TYPE in request.headers.get(
+            "Accept", "") else "json"
+        encoding = "gzip" if "gzip" in request.headers.get("Accept-Encoding", "") else None
+        version = await asyncio.to_thread(self.db.data_version)
+        digest = hashlib.sha1(repr((key, fmt, encoding)).encode()).hexdigest()[:16]
+        etag = f'"{version}-{digest}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept, Accept-Encoding"}
+        if etag in request.headers.get("If-None-Match", ""):
+            self.not_modified += 1
+            return web.Response(status=304, headers=headers)
+
+        cache_key = (key, fmt, encoding)
+        with self.metrics.track(f"{request.path} [{fmt}]") as sample:
+            cached = self.cache.get(cache_key, version)
+            sample["cache_hit"] = cached is not None
+            if cached is None:
+                future = self.inflight.get((cache_key, version))
+                if future is None:
+                    future = self.inflight[(cache_key, version)] = asyncio.get_running_loop().create_future()
+                    try:
+                        cached = await asyncio.to_thread(self._encode, produce, fmt, encoding, version)
+                        self.cache.put(cache_key, version, cached)
+                        future.set_result(cached)
+                    except Exception as e:
+                        future.set_exception(e)
+                        future.exception()  # mark retrieved: there may be no one else waiting
+                        raise
+                    finally:
+                        del self.inflight[(cache_key, version)]
+                else:
+                    self.shared += 1
+                    cached = await asyncio.shield(future)
+            body, extra = cached
+            sample["nbytes"] = len(body)
+        headers.update(extra)
+        headers["Content-Type"] = ARROW_TYPE if fmt == "arrow" else JSON_TYPE
+        return web.Response(body=body, headers=headers)
+
+    def _encode(self, produce, fmt, encoding, version):
+        df, meta, extra = produce()
+        body = frame_body(df, fmt, {**meta, "data_version": version, "row_count": len(df)})
+        extra = dict(extra)
+        if encoding and len(body) >= MIN_GZIP_BYTES:
+            body = gzip.compress(body, compresslevel=5)
+            extra["Content-Encoding"] = "gzip"
+        return body, extra
+
+    async def catalog(self, request):
+        base = f"{request.scheme}://{request.host}"
+        return web.json_response({"queries": [{"name": name, "slug": slug, "url": f"{base}/queries/{slug}"}
+                                              for slug, name in SLUGS.items()],
+                                  "filters": {"url": f"{base}/filters", "sort_by": list(SORT_KEYS),
+                                              "hazardous": list(HAZARD_OPTIONS)}})
+
+    async def query(self, request):
+        name = SLUGS.get(request.match_info["slug"])
+        if name is None:
+            raise web.HTTPNotFound(text=f"Unknown query {request.match_info['slug']!r}; see /queries")
+        unbounded = request.query.get("all") in ("1", "true", "yes")
+        sql = EXPORT_QUERIES[name] if unbounded else QUERIES[name]
+        return await self.respond(request, ("query", name, unbounded),
+                                  lambda: (self._read(sql, ()), {"query": name}, {}))
+
+    async def filters(self, request):
+        q = request.query
+        try:
+            approach_filter = ApproachFilter(
+                velocity_min=q.get("velocity_min", 0), diameter_min=q.get("diameter_min", 0.0),
+                lunar_max=q.get("lunar_max", 50.0), hazardous=q.get("hazardous", "All"),
+                sort_by=q.get("sort_by", "Velocity"))
+            page_size = min(int(q.get("page_size", 100)), MAX_PAGE_SIZE)
+            if page_size < 1:
+                raise ValueError(f"page_size must be at least 1, got {page_size}")
+            after = decode_cursor(q.get("after"))
+            if after is not None and (len(after) != len(SORT_KEYS[approach_filter.sort_by]) or not all(
+                    v is None or isinstance(v, (str, int, float)) for v in after)):
+                raise ValueError(f"Cursor does not match sort_by={approach_filter.sort_by}")
+        except (ValueError, TypeError) as e:
+            raise web.HTTPBadRequest(text=str(e))
+        sql, params = approach_filter.page_query(page_size, after)
+
+        def produce():
+            df = self._read(sql, params)
+            cursor = encode_cursor(approach_filter.next_cursor(df, page_size))
+            return display_frame(df), {"next": cursor}, {"X-Next-Cursor": cursor} if cursor else {}
+
+        return await self.respond(request, ("filters", sql, tuple(params)), produce)
+
+    async def health(self, request):
+        version = await asyncio.to_thread(self.db.data_version)
+        return web.json_response({"data_version": version, "body_cache": self.cache.stats(),
+                                  "shared_executions": self.shared, "not_modified": self.not_modified,
+                                  "pool": self.db.pool.metrics()})
+
+    async def prometheus(self, request):
+        return web.Response(text=self.metrics.to_prometheus("neo_api"), content_type="text/plain")
+
+
+def _load_paths(base):
+    """A request mix: every catalog query, plus Advanced Filters first pages over a few slider settings."""
+    paths = [f"/queries/{slug}" for slug in SLUGS]
+    for sort_by in SORT_KEYS:
+        for velocity_min in (0, 50000, 100000):
+            paths.append(f"/filters?sort_by={sort_by}&velocity_min={velocity_min}")
+    return [base + p for p in paths]
+
+
+async def load_test(url, duration=10.0, concurrency=32, revalidate=False, arrow=False):
+    """Hit `url` with `concurrency` clients for `duration` seconds. Returns a summary dict."""
+    urls = _load_paths(url.rstrip("/"))
+    statuses, latencies, received = Counter(), [], 0
+    etags = {}
+    deadline = time.perf_counter() + duration
+    headers = {"Accept-Encoding": "gzip"}
+    if arrow:
+        headers["Accept"] = ARROW_TYPE
+
+    async def client(session, rng):
+        nonlocal received
+        while time.perf_counter() < deadline:
+            target = rng.choice(urls)
+            request_headers = dict(headers)
+            if revalidate and target in etags:
+                request_headers["If-None-Match"] = etags[target]
+            started = time.perf_counter()
+            async with session.get(target, headers=request_headers, auto_decompress=False) as resp:
+                body = await resp.read()
+            latencies.append(time.perf_counter() - started)
+            statuses[resp.status] += 1
+            received += len(body)
+            if "ETag" in resp.headers:
+                etags[target] = resp.headers["ETag"]
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(session, random.Random(i)) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2) if latencies else None
+
+    return {"requests": len(latencies), "seconds": round(elapsed, 2),
+            "requests_per_second": round(len(latencies) / elapsed, 1),
+            "p50_ms": pct(0.5), "p95_ms": pct(0.95), "p99_ms": pct(0.99),
+            "statuses": dict(statuses), "megabytes_received": round(received / 2 ** 20, 2)}
+
+
+def _serve_in_thread(api, host, port):
+    """Start the API on its own event loop in a daemon thread; returns once it is listening."""
+    ready = threading.Event()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        runner = web.AppRunner(api.app(), access_log=None)
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, host, port).start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, name="neo-api", daemon=True).start()
+    ready.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the dashboard's queries as JSON / Arrow over HTTP")
+    parser.add_argument("--db", default=config.DB_PATH)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--load-test", action="store_true", help="measure sustained requests per second")
+    parser.add_argument("--url", help="load-test this running server instead of starting one")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--revalidate", action="store_true", help="load-test clients send If-None-Match")
+    parser.add_argument("--arrow", action="store_true", help="load-test clients ask for Arrow")
+    args = parser.parse_args(argv)
+
+    if not args.load_test:
+        web.run_app(QueryAPI(args.db).app(), host=args.host, port=args.port)
+        return 0
+
+    url = args.url
+    if not url:
+        api = QueryAPI(args.db)
+        _serve_in_thread(api, args.host, args.port)
+        url = f"http://{args.host}:{args.port}"
+    result = asyncio.run(load_test(url, args.duration, args.concurrency, args.revalidate, args.arrow))
+    print(json.dumps(result, indent=2))
+    if not args.url:
+        print(json.dumps({"body_cache": api.cache.stats(), "shared_executions": api.shared,
+                          "not_modified": api.not_modified}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
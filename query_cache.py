@@ -0,0 +1,113 @@
+"""
+Process-wide query result cache.
+
+Entries are keyed on normalized SQL + bound parameters + the database data
+version (see data_version.py), so a new ingest invalidates them exactly.
+Memory is bounded in bytes with LRU eviction, and concurrent misses for the
+same key are collapsed into a single execution.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+# String literals are kept verbatim; comments are dropped and whitespace collapsed
+_SQL_TOKENS = re.compile(r"('(?:[^']|'')*')|(--[^\n]*)|(\s+)")
+
+
+def normalize_sql(sql):
+    def replace(match):
+        if match.group(1):
+            return match.group(1)
+        return " "
+    return _SQL_TOKENS.sub(replace, sql).strip().rstrip(";").strip()
+
+
+def frame_bytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class QueryCache:
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (frame, size)
+        self.bytes = 0
+        self.version = None
+        self.inflight = {}  # key -> threading.Event
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def key(self, sql, params, version):
+        return normalize_sql(sql), tuple(params or ()), version
+
+    def _observe_version(self, version):
+        # Entries from an older data version can never be hit again; free them now
+        if self.version is not None and version > self.version:
+            for key in [k for k in self.entries if k[2] != version]:
+                _, size = self.entries.pop(key)
+                self.bytes -= size
+                self.invalidations += 1
+        if self.version is None or version > self.version:
+            self.version = version
+
+    def _store(self, key, frame):
+        size = frame_bytes(frame)
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (frame, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.bytes -= evicted
+            self.evictions += 1
+
+    def get_or_execute(self, sql, params, version, execute):
+        """Return (frame, hit). `execute()` runs the query on a miss; only one caller per key does."""
+        key = self.key(sql, params, version)
+        while True:
+            with self.lock:
+                self._observe_version(version)
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return self.entries[key][0], True
+                waiting = self.inflight.get(key)
+                if waiting is None:
+                    done = self.inflight[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Someone else is running this exact query; wait for their result
+            waiting.wait()
+
+        try:
+            frame = execute()
+            with self.lock:
+                if self.version == version:
+                    self._store(key, frame)
+            return frame, False
+        finally:
+            with self.lock:
+                del self.inflight[key]
+            done.set()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "data_version": self.version,
+            }
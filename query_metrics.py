@@ -0,0 +1,188 @@
+"""
+Per-query instrumentation for the dashboard's database calls.
+
+Every call records wall time, rows returned, DataFrame size, whether the
+result cache answered it and a digest of its query plan, under the query's
+name (the QUERIES key when the SQL is one of ours). Latencies go into fixed
+histogram buckets, so p50/p95/p99 cost the same memory after a million
+calls as after ten. The totals export as Prometheus text or JSON lines.
+"""
+import bisect
+import hashlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from project_sql_queries import DASHBOARD_QUERIES, QUERIES
+from query_cache import normalize_sql
+
+# Upper bounds of the latency buckets, in seconds (plus an implicit +Inf)
+BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+_NAMES = {normalize_sql(sql): name for name, sql in {**QUERIES, **DASHBOARD_QUERIES}.items()}
+
+
+def query_label(sql):
+    """QUERIES / DASHBOARD_QUERIES name for `sql`, else its first few words."""
+    normalized = normalize_sql(sql)
+    name = _NAMES.get(normalized)
+    if name is None:
+        name = normalized[:60] + ("..." if len(normalized) > 60 else "")
+    return name
+
+
+def plan_digest(lines):
+    return hashlib.sha1("\n".join(lines).encode()).hexdigest()[:12]
+
+
+class QueryStats:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.last_bytes = 0
+        self.max_bytes = 0
+        self.plan = None
+
+    def add(self, seconds, rows, nbytes, cache_hit, plan, error):
+        self.count += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        if error:
+            self.errors += 1
+            return
+        self.cache_hits += bool(cache_hit)
+        self.rows += rows or 0
+        if nbytes is not None:
+            self.last_bytes = nbytes
+            self.max_bytes = max(self.max_bytes, nbytes)
+        if plan:
+            self.plan = plan
+
+    def quantile(self, q):
+        """Latency at quantile `q`, interpolated within its bucket (seconds)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            if n and seen + n >= rank:
+                low = BUCKETS[i - 1] if i else 0.0
+                high = BUCKETS[i] if i < len(BUCKETS) else self.max_seconds
+                return min(low + (high - low) * (rank - seen) / n, self.max_seconds)
+            seen += n
+        return self.max_seconds
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "cache_hits": self.cache_hits,
+            "cache_hit_rate": self.cache_hits / self.count if self.count else 0.0,
+            "mean_ms": 1000 * self.seconds / self.count if self.count else 0.0,
+            "p50_ms": 1000 * self.quantile(0.50),
+            "p95_ms": 1000 * self.quantile(0.95),
+            "p99_ms": 1000 * self.quantile(0.99),
+            "max_ms": 1000 * self.max_seconds,
+            "rows": self.rows,
+            "last_bytes": self.last_bytes,
+            "max_bytes": self.max_bytes,
+            "plan": self.plan,
+        }
+
+
+class QueryMetrics:
+    """Thread-safe registry of QueryStats, one per query name."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queries = {}
+        self.plans = {}  # (backend, normalized SQL) -> plan digest
+        self.started = time.time()
+
+    @contextmanager
+    def track(self, name):
+        """Time the block; the caller fills in rows / nbytes / cache_hit / plan on the yielded dict."""
+        sample = {}
+        started = time.perf_counter()
+        try:
+            yield sample
+        except Exception:
+            self.record(name, time.perf_counter() - started, error=True)
+            raise
+        self.record(name, time.perf_counter() - started, **sample)
+
+    def record(self, name, seconds, rows=None, nbytes=None, cache_hit=False, plan=None, error=False):
+        with self.lock:
+            stats = self.queries.get(name)
+            if stats is None:
+                stats = self.queries[name] = QueryStats()
+            stats.add(seconds, rows, nbytes, cache_hit, plan, error)
+
+    def plan_digest(self, backend, sql, params=()):
+        """Digest of the backend's query plan for `sql`, computed once per backend and statement text."""
+        key = (backend.name, normalize_sql(sql))
+        digest = self.plans.get(key)
+        if digest is None:
+            try:
+                lines = backend.explain(sql, params)
+            except Exception as e:
+                lines = [f"ERROR: {e}"]
+            digest = self.plans[key] = plan_digest(lines)
+        return digest
+
+    def summaries(self):
+        with self.lock:
+            return {name: stats.summary() for name, stats in self.queries.items()}
+
+    def slowest(self, n=10, by="p95_ms"):
+        rows = [{"query": name, **summary} for name, summary in self.summaries().items()]
+        return sorted(rows, key=lambda row: row[by], reverse=True)[:n]
+
+    def reset(self):
+        with self.lock:
+            self.queries = {}
+            self.started = time.time()
+
+    def to_json_lines(self):
+        now = time.time()
+        return "".join(json.dumps({"ts": round(now, 3), "query": name, **summary}) + "\n"
+                       for name, summary in self.summaries().items())
+
+    def to_prometheus(self, prefix="neo_query"):
+        with self.lock:
+            items = [(name, stats.buckets[:], stats.count, stats.seconds, stats.errors,
+                      stats.cache_hits, stats.rows, stats.last_bytes)
+                     for name, stats in self.queries.items()]
+        lines = [
+            f"# HELP {prefix}_duration_seconds Wall time of dashboard database calls.",
+            f"# TYPE {prefix}_duration_seconds histogram",
+        ]
+        for name, buckets, count, seconds, *_ in items:
+            label = _label_value(name)
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ["+Inf"], buckets):
+                cumulative += n
+                lines.append(f'{prefix}_duration_seconds_bucket{{query="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_duration_seconds_sum{{query="{label}"}} {seconds}')
+            lines.append(f'{prefix}_duration_seconds_count{{query="{label}"}} {count}')
+        for metric, index, kind, text in (
+                ("errors_total", 4, "counter", "Calls that raised an error."),
+                ("cache_hits_total", 5, "counter", "Calls answered by the result cache."),
+                ("rows_total", 6, "counter", "Rows returned."),
+                ("result_bytes", 7, "gauge", "Size of the last result DataFrame.")):
+            lines.append(f"# HELP {prefix}_{metric} {text}")
+            lines.append(f"# TYPE {prefix}_{metric} {kind}")
+            for item in items:
+                lines.append(f'{prefix}_{metric}{{query="{_label_value(item[0])}"}} {item[index]}')
+        return "\n".join(lines) + "\n"
+
+
+def _label_value(text):
+    return text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
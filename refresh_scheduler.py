@@ -0,0 +1,176 @@
+"""
+Background refresh of nasa_neo.db from the NeoWs feed.
+
+Every `interval` seconds the scheduler pulls feed windows and applies them
+as one upsert transaction through neo_ingest.BulkLoader, which bumps the
+data version only when a row actually changed. Query caches, the column
+engine and the name index all key on that version, so the dashboard serves
+the new numbers on its next rerun without flushing anything or restarting.
+
+Sources:
+  - NeoWs, or a stand-in server at --base-url: the windows covering `days`
+    before and after today are re-read on every run, since recent and
+    upcoming approaches get revised
+  - a directory of recorded feed files (--fixtures): windows whose file is
+    new or changed since the last run
+
+Runs as a sidecar process, or inside the dashboard when
+NEO_REFRESH_INTERVAL is set.
+
+Usage:
+    python refresh_scheduler.py --interval 300                      # NeoWs every 5 minutes
+    python refresh_scheduler.py --fixtures feeds/ --interval 10
+    python refresh_scheduler.py --base-url http://localhost:8080/feed --once
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+import aiohttp
+
+import config
+from data_version import read_data_version
+from db_pool import connect_writer
+from neo_ingest import FEED_URL, BulkLoader, FixtureFeedSource, HttpFeedSource, feed_windows, ingest_windows
+
+# One transaction per run, however many windows it pulls
+BATCH_ROWS = 10 ** 9
+
+
+class RefreshScheduler:
+    def __init__(self, db_path=None, interval=300.0, fixtures=None, base_url=None, api_key=None,
+                 days=7, concurrency=4, timeout=600.0):
+        self.db_path = db_path or config.DB_PATH
+        self.interval = interval
+        self.fixtures = fixtures
+        self.base_url = base_url or FEED_URL
+        self.api_key = api_key or os.environ.get("NASA_API_KEY", "DEMO_KEY")
+        self.days = days
+        self.concurrency = concurrency
+        self.timeout = timeout  # per run; a stalled feed must not block every later run
+        self.seen = {}  # fixture window -> (size, mtime) already applied
+        self.runs = 0
+        self.last_result = None
+        self.last_error = None
+        self.thread = None
+        self.stopping = threading.Event()
+
+    @classmethod
+    def from_config(cls, db_path=None):
+        """The dashboard's in-process scheduler, or None when NEO_REFRESH_INTERVAL is 0."""
+        if config.REFRESH_INTERVAL <= 0:
+            return None
+        return cls(db_path, interval=config.REFRESH_INTERVAL, fixtures=config.REFRESH_FIXTURES,
+                   base_url=config.REFRESH_URL, days=config.REFRESH_DAYS, timeout=config.REFRESH_TIMEOUT)
+
+    def _windows(self):
+        if self.fixtures:
+            recorded = FixtureFeedSource(self.fixtures).recorded()
+            return sorted(w for w, stamp in recorded.items() if self.seen.get(w) != stamp), recorded
+        today = date.today()
+        return list(feed_windows(today - timedelta(days=self.days), today + timedelta(days=self.days))), {}
+
+    async def _pull(self, windows, loader):
+        if self.fixtures:
+            return await ingest_windows(windows, FixtureFeedSource(self.fixtures), loader, self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=120)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            source = HttpFeedSource(session, api_key=self.api_key, base_url=self.base_url)
+            return await ingest_windows(windows, source, loader, self.concurrency)
+
+    def run_once(self):
+        """Pull and apply one round of windows. Returns a summary dict."""
+        started = time.perf_counter()
+        windows, recorded = self._windows()
+        conn = connect_writer(self.db_path)
+        try:
+            before = read_data_version(conn)
+            loader = BulkLoader(conn, batch_rows=BATCH_ROWS)
+            if windows:
+                try:
+                    asyncio.run(asyncio.wait_for(self._pull(windows, loader), self.timeout))
+                except TimeoutError:
+                    # The run's transaction was never committed, so closing rolls it back
+                    raise TimeoutError(f"Refresh run took longer than {self.timeout:.0f}s") from None
+            after = read_data_version(conn)
+        finally:
+            conn.close()
+        for window in windows:
+            if window in recorded:
+                self.seen[window] = recorded[window]
+        self.runs += 1
+        self.last_result = {
+            "finished": time.time(),
+            "windows": len(windows),
+            "approaches": loader.written_approaches,
+            "changed": after != before,
+            "data_version": after,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+        return self.last_result
+
+    def _loop(self):
+        while not self.stopping.is_set():
+            try:
+                self.run_once()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+            self.stopping.wait(self.interval)
+
+    def start(self):
+        """Run in a daemon thread until stop()."""
+        if self.thread is None or not self.thread.is_alive():
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self._loop, name="neo-refresh", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def status(self):
+        return {"running": bool(self.thread and self.thread.is_alive()), "interval": self.interval,
+                "source": self.fixtures or self.base_url, "runs": self.runs,
+                "last_result": self.last_result, "last_error": self.last_error}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep nasa_neo.db up to date from the NeoWs feed")
+    parser.add_argument("--db", default=config.DB_PATH)
+    parser.add_argument("--interval", type=float, default=300.0, help="seconds between runs")
+    parser.add_argument("--fixtures", help="apply new or changed feed_<start>_<end>.json files from this directory")
+    parser.add_argument("--base-url", default=FEED_URL, help="feed endpoint (point at a stand-in server for tests)")
+    parser.add_argument("--api-key", default=os.environ.get("NASA_API_KEY", "DEMO_KEY"))
+    parser.add_argument("--days", type=int, default=7, help="days before and after today to re-read")
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds a run may take before it is abandoned")
+    parser.add_argument("--once", action="store_true", help="run once and exit")
+    args = parser.parse_args(argv)
+
+    scheduler = RefreshScheduler(args.db, args.interval, args.fixtures, args.base_url, args.api_key, args.days,
+                                 timeout=args.timeout)
+    while True:
+        try:
+            result = scheduler.run_once()
+            scheduler.last_error = None
+            print(f"{time.strftime('%H:%M:%S')}  {result['windows']} windows, {result['approaches']:,} approach rows, "
+                  f"data version {result['data_version']}{' (changed)' if result['changed'] else ''}, "
+                  f"{result['seconds']:.2f}s", flush=True)
+        except Exception as e:
+            # Same as the in-process loop: report it and try again next interval
+            scheduler.last_error = f"{type(e).__name__}: {e}"
+            print(f"{time.strftime('%H:%M:%S')}  run failed: {scheduler.last_error}", file=sys.stderr, flush=True)
+        if args.once:
+            return 1 if scheduler.last_error else 0
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+"""
+Streaming export of query results to CSV, gzip-compressed CSV or Parquet.
+
+Rows come from a backend cursor (backends.py) in chunks and are written as
+they arrive, so memory holds one chunk whatever the size of the result.
+Files are written under a temporary name and renamed once complete. The
+"export all" variants of QUERIES, without their display LIMIT, are in
+project_sql_queries.EXPORT_QUERIES.
+
+Usage:
+    python result_export.py --list
+    python result_export.py "10. High Velocity (>50k km/h)" --all --format csv.gz --out fast.csv.gz
+"""
+import argparse
+import csv
+import gzip
+import os
+import re
+import sys
+import tempfile
+
+import config
+
+# format -> (file extension, MIME type)
+FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "csv.gz": (".csv.gz", "application/gzip"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+SNIFF_ROWS = 100000  # Parquet: rows held back while a column has only NULLs, to type it from real values
+
+
+def _write_csv(columns, chunks, f, progress):
+    writer = csv.writer(f)
+    writer.writerow(columns)
+    rows = 0
+    for chunk in chunks:
+        writer.writerows(chunk)
+        rows += len(chunk)
+        if progress:
+            progress(rows)
+    return rows
+
+
+class _ParquetSink:
+    """Parquet writer whose column types follow the data instead of failing on a later chunk.
+
+    A column that is all NULL so far is typed from its first values (rows are held back up to
+    SNIFF_ROWS for that). When a chunk needs a wider type (integers, then reals -> float64; mixed
+    kinds -> text) the rows already written are re-typed once and the export carries on."""
+
+    def __init__(self, columns, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa, self.pq = pa, pq
+        self.columns = columns
+        self.path = path
+        self.types = [pa.null()] * len(columns)
+        self.pending = []
+        self.writer = None
+
+    def _infer(self, values):
+        try:
+            return self.pa.array(values).type
+        except (self.pa.ArrowInvalid, self.pa.ArrowTypeError):
+            return self.pa.string()  # e.g. text and numbers in one SQLite column
+
+    def _array(self, values, t):
+        """`values` as an array of type `t`, or None when they don't all fit it."""
+        pa = self.pa
+        if t == pa.string():
+            return pa.array([None if x is None else str(x) for x in values], type=t)
+        try:
+            return pa.array(values).cast(t)  # a safe cast: 1.5 never becomes 1 in an integer column
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            return None
+
+    def _widen(self, current, values):
+        pa, new = self.pa, self._infer(values)
+        if current == pa.null():
+            return new
+        if all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in (current, new)):
+            return pa.float64()
+        return pa.string()
+
+    def _schema(self):
+        return self.pa.schema(list(zip(self.columns, self.types)))
+
+    def _retype(self):
+        # Rewrite what is on disk with the wider schema, then keep appending to the new file
+        self.writer.close()
+        written = self.path + ".retype"
+        os.replace(self.path, written)
+        try:
+            schema = self._schema()
+            self.writer = self.pq.ParquetWriter(self.path, schema, compression="zstd")
+            for batch in self.pq.ParquetFile(written).iter_batches():
+                self.writer.write_table(self.pa.Table.from_batches([batch]).cast(schema))
+        finally:
+            os.remove(written)
+
+    def _write(self, chunk):
+        arrays, types = [], list(self.types)
+        for i, values in enumerate(zip(*chunk)):
+            array = self._array(values, types[i])
+            if array is None:
+                types[i] = self._widen(types[i], values)
+                array = self._array(values, types[i])
+            arrays.append(array)
+        if types != self.types:
+            self.types = types
+            self._retype()
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, names=self.columns))
+
+    def add(self, chunk):
+        if self.writer is None:
+            self.pending.append(chunk)
+            for i, values in enumerate(zip(*chunk)):
+                if self.types[i] == self.pa.null():
+                    self.types[i] = self._infer(values)
+            if self.pa.null() in self.types and sum(map(len, self.pending)) < SNIFF_ROWS:
+                return
+            self.writer = self.pq.ParquetWriter(self.path, self._schema(), compression="zstd")
+            chunks, self.pending = self.pending, []
+            for chunk in chunks:
+                self._write(chunk)
+        else:
+            self._write(chunk)
+
+    def finish(self):
+        if self.writer is None:
+            # Fewer than SNIFF_ROWS rows: columns still all NULL are written as null columns
+            self.writer = self.pq.ParquetWriter(self.path, self._schema(), compression="zstd")
+            chunks, self.pending = self.pending, []
+            for chunk in chunks:
+                self._write(chunk)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _write_parquet(columns, chunks, path, progress):
+    sink = _ParquetSink(columns, path)
+    rows = 0
+    try:
+        for chunk in chunks:
+            sink.add(chunk)
+            rows += len(chunk)
+            if progress:
+                progress(rows)
+        sink.finish()
+    finally:
+        sink.close()
+    return rows
+
+
+def export_rows(columns, chunks, path, fmt="csv", progress=None):
+    """Write `columns` + the row lists from `chunks` to `path`. Returns the row count.
+
+    `progress(rows_so_far)` is called after every chunk.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt} (expected one of {', '.join(FORMATS)})")
+    # Sessions exporting the same query share `path`: each writes its own temp file and swaps it in
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        if fmt == "csv":
+            with open(tmp, "w", newline="", encoding="utf-8") as f:
+                rows = _write_csv(columns, chunks, f, progress)
+        elif fmt == "csv.gz":
+            with gzip.open(tmp, "wt", newline="", encoding="utf-8", compresslevel=6) as f:
+                rows = _write_csv(columns, chunks, f, progress)
+        else:
+            rows = _write_parquet(columns, chunks, tmp, progress)
+        os.chmod(tmp, 0o644)  # mkstemp creates it owner-only
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return rows
+
+
+def export_query(backend, sql, path, fmt="csv", params=(), progress=None):
+    """Stream the result of `sql` on `backend` into `path`. Returns the row count."""
+    with backend.stream(sql, params) as (columns, chunks):
+        return export_rows(columns, chunks, path, fmt, progress)
+
+
+def export_path(name, fmt, backend_name, data_version, unbounded=False, out_dir=None):
+    """Where the dashboard keeps the export of query `name`; one file per data version."""
+    slug = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+    suffix = "-all" if unbounded else ""
+    return os.path.join(out_dir or config.EXPORT_DIR,
+                        f"{slug}{suffix}.{backend_name}-v{data_version}{FORMATS[fmt][0]}")
+
+
+def remove_stale_exports(backend_name, data_version, out_dir=None):
+    """Delete exports taken from `backend_name` at any other data version."""
+    out_dir = out_dir or config.EXPORT_DIR
+    if not os.path.isdir(out_dir):
+        return
+    prefix, current = f".{backend_name}-v", f".{backend_name}-v{data_version}."
+    for name in os.listdir(out_dir):
+        if prefix in name and current not in name:
+            try:
+                os.remove(os.path.join(out_dir, name))
+            except OSError:
+                pass  # another session got there first
+
+
+def main(argv=None):
+    from backends import BACKENDS, make_backend
+    from db_pool import Database
+    from project_sql_queries import EXPORT_QUERIES, QUERIES
+
+    parser = argparse.ArgumentParser(description="Export a query result without loading it into memory")
+    parser.add_argument("query", nargs="?", help="QUERIES name")
+    parser.add_argument("--list", action="store_true", help="list the query names")
+    parser.add_argument("--all", action="store_true", help="every row, without the display LIMIT")
+    parser.add_argument("--format", choices=list(FORMATS), default="csv")
+    parser.add_argument("--out", help="output file (default: exports/<query>...)")
+    parser.add_argument("--db", default=config.DB_PATH)
+    parser.add_argument("--backend", choices=BACKENDS, default="sqlite")
+    args = parser.parse_args(argv)
+
+    if args.list or not args.query:
+        print("\n".join(QUERIES))
+        return 0
+    if args.query not in QUERIES:
+        print(f"Unknown query: {args.query} (see --list)")
+        return 1
+    db = Database(args.db)
+    try:
+        backend = make_backend(args.backend, db)
+        path = args.out or export_path(args.query, args.format, backend.name, backend.data_version(), args.all)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        sql = (EXPORT_QUERIES if args.all else QUERIES)[args.query]
+        rows = export_query(backend, sql, path, args.format,
+                            progress=lambda n: print(f"\r  {n:,} rows", end="", flush=True))
+    finally:
+        db.close()
+    print(f"\r{rows:,} rows written to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
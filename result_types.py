@@ -0,0 +1,207 @@
+"""
+Typed, chunked loading of query results.
+
+pd.read_sql fetches the whole result as Python tuples, then leaves names,
+flags and dates as object columns and every measurement as float64.
+read_frame fetches CHUNK_ROWS rows at a time and converts each chunk's
+columns straight to compact arrays, so at most one chunk of Python objects
+is alive. Text goes to Arrow arrays, each column's chunks are joined once
+and the frame is built over those arrays without another copy:
+
+    "category"        text (names, 'Yes'/'No' flags) -> Categorical, or
+                      Arrow-backed strings when most values are distinct
+    "flag"            0/1 integer hazard flags       -> Categorical
+    "datetime"        'YYYY-MM-DD' text              -> datetime64
+    ("float32", d)    floats -> float32 when every value survives to `d`
+                      decimals, float64 otherwise
+
+COLUMN_TYPES gives the type of a column by name; project_sql_queries.QUERY_TYPES
+overrides it per query. A type only applies to a column holding its kind of
+values, so a 'hazardous' count stays an integer where the name usually means
+a 'Yes'/'No' flag. Other columns are inferred as read_sql does.
+
+Usage:
+    python result_types.py nasa_neo.db   # read_sql vs typed: memory, peak memory, load and Arrow time
+"""
+import argparse
+import sqlite3
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import config
+from filter_query import ApproachFilter
+from project_sql_queries import EXPORT_QUERIES, LUNAR_APPROACHES, QUERY_TYPES
+
+CHUNK_ROWS = 50000
+CATEGORY_SHARE = 0.5  # text with more distinct values than this share of rows stays plain strings
+
+COLUMN_TYPES = {
+    "name": "category",
+    "hazardous": "category",
+    "category": "category",
+    "size_category": "category",
+    "month_name": "category",
+    "orbiting_body": "category",
+    "close_approach_date": "datetime",
+    "date": "datetime",
+    "last_approach_date": "datetime",
+    "next_approach": "datetime",
+    "velocity": ("float32", 2),
+    "avg_velocity": ("float32", 2),
+    "max_velocity": ("float32", 2),
+    "distance": ("float32", 4),
+    "distance_LD": ("float32", 4),
+    "lunar_distance": ("float32", 4),
+    "closest_LD": ("float32", 4),
+    "avg_distance_LD": ("float32", 4),
+    "AU_distance": ("float32", 6),
+    "diameter": ("float32", 4),
+    "max_diameter": ("float32", 4),
+    "diameter_min": ("float32", 4),
+    "diameter_max": ("float32", 4),
+    "size": ("float32", 4),
+    "magnitude": ("float32", 2),
+    "risk_score": ("float32", 2),
+    "threat_score": ("float32", 2),
+}
+
+
+def column_types(sql):
+    """Column name -> type for the result of `sql`."""
+    return {**COLUMN_TYPES, **QUERY_TYPES.get(sql, {})}
+
+
+def _applies(kind, values):
+    sample = next((v for v in values if v is not None), None)
+    if sample is None:
+        return True
+    if kind in ("category", "datetime"):
+        return isinstance(sample, str)
+    if kind == "flag":
+        return set(values) <= {0, 1, None}
+    return isinstance(sample, float)
+
+
+class _Column:
+    """One result column, converted chunk by chunk."""
+
+    def __init__(self, spec):
+        self.kind, self.decimals = spec if isinstance(spec, tuple) else (spec, None)
+        self.parts = []
+        self.fits = True  # every float so far survives float32
+        self.distinct = False
+
+    def add(self, values):
+        if not self.parts and self.kind and not _applies(self.kind, values):
+            self.kind = None
+        if self.kind in ("category", "datetime"):
+            self.parts.append(pa.array(values, type=pa.string()))
+            if self.kind == "category" and len(self.parts) == 1:
+                # Judged on the first chunk: mostly distinct text isn't worth a dictionary
+                self.distinct = pc.count_distinct(self.parts[0]).as_py() > CATEGORY_SHARE * len(values)
+        elif self.kind == "flag":
+            self.parts.append(pa.array(values, type=pa.int8()))
+        elif self.kind == "float32":
+            array = np.array(values, dtype=np.float64)  # None -> NaN
+            error = np.abs(array.astype(np.float32) - array)
+            self.fits = self.fits and not (error > 0.5 * 10.0 ** -self.decimals).any()
+            self.parts.append(array)
+        else:
+            self.parts.append(values.copy())  # not a view that would keep the whole chunk alive
+
+    def finish(self):
+        if self.kind in ("category", "flag", "datetime"):
+            chunks = pa.chunked_array(self.parts, type=pa.int8() if self.kind == "flag" else pa.string())
+            if self.kind == "datetime":
+                return chunks.cast(pa.timestamp("ns")).to_numpy()
+            if self.kind == "category" and self.distinct:
+                return pd.arrays.ArrowStringArray(chunks)
+            encoded = chunks.combine_chunks().dictionary_encode()
+            return pd.Categorical.from_codes(pc.fill_null(encoded.indices, -1).to_numpy(),
+                                             pd.Index(encoded.dictionary.to_pylist()))
+        if self.kind == "float32":
+            array = np.concatenate(self.parts) if self.parts else np.array([], dtype=np.float64)
+            return array.astype(np.float32) if self.fits else array
+        array = np.concatenate(self.parts) if self.parts else np.array([], dtype=object)
+        return pd.Series(array).infer_objects()  # int64 / float64 / object, as read_sql infers
+
+
+def read_frame(cursor, types, chunk_rows=CHUNK_ROWS):
+    """DataFrame of an executed DB-API cursor's rows, typed by `types` (column name -> type)."""
+    names = [d[0] for d in cursor.description]
+    columns = [_Column(types.get(name)) for name in names]
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            break
+        # One 2-D object array per chunk, then a column at a time
+        block = np.empty((len(rows), len(names)), dtype=object)
+        block[:] = rows
+        del rows
+        for i, column in enumerate(columns):
+            column.add(block[:, i])
+    # One array per column and copy=False: no copy into 2-D blocks
+    frame = pd.DataFrame({i: column.finish() for i, column in enumerate(columns)}, copy=False)
+    frame.columns = names
+    return frame
+
+
+def apply_types(df, types):
+    """The same conversions over a DataFrame already read (e.g. from DuckDB)."""
+    arrays = {}
+    for i, name in enumerate(df.columns):
+        column = _Column(types.get(name))
+        if column.kind:
+            values = df[name].astype(object)
+            column.add(values.where(values.notna(), None).to_numpy())
+            arrays[i] = column.finish()
+        else:
+            arrays[i] = df[name]
+    frame = pd.DataFrame(arrays, copy=False)
+    frame.columns = df.columns
+    return frame
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare read_sql with typed, chunked result loading")
+    parser.add_argument("db", nargs="?", default=config.DB_PATH)
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    filters_sql, filters_params = ApproachFilter(lunar_max=100).page_query(page_size=10 ** 9)
+    cases = {"Advanced Filters, every match": (filters_sql, filters_params),
+             "Overview: lunar approaches": (LUNAR_APPROACHES, ())}
+    for name in ("6. Fastest Ever Approach", "9. Closest Approach Per Asteroid", "12. Highest Brightness"):
+        cases[name + ", every row"] = (EXPORT_QUERIES[name], ())
+
+    def measure(load):
+        started = time.perf_counter()
+        df = load()
+        seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        pa.Table.from_pandas(df)  # what st.dataframe and shared frames do with every result
+        arrow = time.perf_counter() - started
+        del df
+        tracemalloc.start()
+        df = load()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return len(df), df.memory_usage(deep=True).sum() / 2 ** 20, peak / 2 ** 20, seconds, arrow
+
+    print(f"{'read_sql / typed':<44} {'rows':>9}  {'frame MB':>13}  {'peak MB':>13}  {'load s':>11}  {'to Arrow s':>11}")
+    for name, (sql, params) in cases.items():
+        plain = measure(lambda: pd.read_sql(sql, conn, params=params))
+        typed = measure(lambda: read_frame(conn.execute(sql, params), column_types(sql)))
+        print(f"{name:<44} {plain[0]:>9,}  {plain[1]:>6.1f}/{typed[1]:<6.1f}  {plain[2]:>6.1f}/{typed[2]:<6.1f}  "
+              f"{plain[3]:>5.2f}/{typed[3]:<5.2f}  {plain[4]:>5.2f}/{typed[4]:<5.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
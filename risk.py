@@ -0,0 +1,209 @@
+"""
+Stored threat score and the top-K threat leaderboard.
+
+risk_score = diameter * velocity / miss distance (LD) is computed once per
+approach by triggers when rows are inserted or their inputs change, and
+stored in an indexed close_approach column. threat_leaderboard holds the
+LEADERBOARD_SIZE highest-scoring approaches of hazardous asteroids and is
+maintained incrementally by the same triggers, so the Risk Score query and
+the Top Threats page read a few rows instead of scoring every approach.
+
+Usage:
+    python risk.py nasa_neo.db            # check stored scores and the leaderboard
+    python risk.py nasa_neo.db --rebuild  # recompute both from scratch
+"""
+import argparse
+import math
+import sqlite3
+import sys
+
+import config
+
+LEADERBOARD_SIZE = 100
+
+
+def risk_score_sql(diameter, velocity, lunar):
+    """The threat score formula as an SQL expression; every score in the database comes from here."""
+    return f"{diameter} * {velocity} / CASE WHEN {lunar} > 0 THEN {lunar} ELSE 1 END"
+
+
+_DIAMETER = "(SELECT estimated_diameter_max_km FROM asteroids WHERE id = {ref}.neo_reference_id)"
+_IS_HAZARDOUS = "(SELECT is_potentially_hazardous_asteroid FROM asteroids WHERE id = {ref}.neo_reference_id) = 1"
+
+_SCORE_ROW = (
+    "UPDATE close_approach SET risk_score = "
+    + risk_score_sql(_DIAMETER.format(ref="new"), "new.relative_velocity_kmph", "new.miss_distance_lunar")
+    + " WHERE id = new.id;"
+)
+
+_SCORE_ALL = "UPDATE close_approach SET risk_score = " + risk_score_sql(
+    _DIAMETER.format(ref="close_approach"), "relative_velocity_kmph", "miss_distance_lunar")
+
+LEADERBOARD_SELECT = f"""
+SELECT c.id, c.neo_reference_id, c.risk_score
+FROM close_approach c
+JOIN asteroids a ON a.id = c.neo_reference_id
+WHERE a.is_potentially_hazardous_asteroid = 1 AND c.risk_score IS NOT NULL
+ORDER BY c.risk_score DESC
+LIMIT {LEADERBOARD_SIZE}
+"""
+
+# Drop the lowest entries beyond LEADERBOARD_SIZE
+_TRIM = f"""
+    DELETE FROM threat_leaderboard WHERE approach_id IN (
+        SELECT approach_id FROM threat_leaderboard
+        ORDER BY risk_score, approach_id DESC
+        LIMIT max(0, (SELECT COUNT(*) FROM threat_leaderboard) - {LEADERBOARD_SIZE})
+    );
+"""
+
+# Top up from ix_close_approach_risk after entries left; every approach outside
+# the board scores no higher than the lowest entry, so the next best are the
+# highest-scoring ones not on it.
+_REFILL = f"""
+    INSERT INTO threat_leaderboard (approach_id, neo_reference_id, risk_score)
+    SELECT c.id, c.neo_reference_id, c.risk_score
+    FROM close_approach c
+    JOIN asteroids a ON a.id = c.neo_reference_id
+    WHERE a.is_potentially_hazardous_asteroid = 1 AND c.risk_score IS NOT NULL
+      AND c.id NOT IN (SELECT approach_id FROM threat_leaderboard)
+    ORDER BY c.risk_score DESC
+    LIMIT max(0, {LEADERBOARD_SIZE} - (SELECT COUNT(*) FROM threat_leaderboard));
+"""
+
+MIGRATION = [
+    "ALTER TABLE close_approach ADD COLUMN risk_score REAL",
+    _SCORE_ALL,
+    "CREATE INDEX ix_close_approach_risk ON close_approach (risk_score, neo_reference_id)",
+    """
+    CREATE TABLE threat_leaderboard (
+        approach_id INTEGER PRIMARY KEY,
+        neo_reference_id INTEGER NOT NULL,
+        risk_score REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX ix_threat_leaderboard_score ON threat_leaderboard (risk_score)",
+    "CREATE INDEX ix_threat_leaderboard_asteroid ON threat_leaderboard (neo_reference_id)",
+    "INSERT INTO threat_leaderboard (approach_id, neo_reference_id, risk_score) " + LEADERBOARD_SELECT,
+    # Score new approaches and approaches whose inputs changed
+    f"""
+    CREATE TRIGGER trg_close_approach_risk_insert AFTER INSERT ON close_approach
+    BEGIN
+        {_SCORE_ROW}
+    END
+    """,
+    f"""
+    CREATE TRIGGER trg_close_approach_risk_update
+    AFTER UPDATE OF neo_reference_id, relative_velocity_kmph, miss_distance_lunar ON close_approach
+    BEGIN
+        {_SCORE_ROW}
+    END
+    """,
+    f"""
+    CREATE TRIGGER trg_asteroids_risk_insert AFTER INSERT ON asteroids
+    BEGIN
+        {_SCORE_ALL} WHERE neo_reference_id = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER trg_asteroids_risk_update AFTER UPDATE OF estimated_diameter_max_km ON asteroids
+    BEGIN
+        {_SCORE_ALL} WHERE neo_reference_id = new.id;
+    END
+    """,
+    # Keep the leaderboard in step with every score change
+    f"""
+    CREATE TRIGGER trg_close_approach_leaderboard_update
+    AFTER UPDATE OF risk_score, neo_reference_id ON close_approach
+    BEGIN
+        DELETE FROM threat_leaderboard WHERE approach_id = old.id;
+        INSERT INTO threat_leaderboard (approach_id, neo_reference_id, risk_score)
+        SELECT new.id, new.neo_reference_id, new.risk_score
+        WHERE new.risk_score IS NOT NULL
+          AND {_IS_HAZARDOUS.format(ref="new")}
+          AND ((SELECT COUNT(*) FROM threat_leaderboard) < {LEADERBOARD_SIZE}
+               OR new.risk_score > (SELECT MIN(risk_score) FROM threat_leaderboard));
+        {_TRIM}
+        {_REFILL}
+    END
+    """,
+    f"""
+    CREATE TRIGGER trg_close_approach_leaderboard_delete AFTER DELETE ON close_approach
+    BEGIN
+        DELETE FROM threat_leaderboard WHERE approach_id = old.id;
+        {_REFILL}
+    END
+    """,
+    f"""
+    CREATE TRIGGER trg_asteroids_leaderboard_hazard
+    AFTER UPDATE OF is_potentially_hazardous_asteroid ON asteroids
+    BEGIN
+        DELETE FROM threat_leaderboard WHERE neo_reference_id = new.id;
+        INSERT INTO threat_leaderboard (approach_id, neo_reference_id, risk_score)
+        SELECT id, neo_reference_id, risk_score FROM close_approach
+        WHERE new.is_potentially_hazardous_asteroid = 1
+          AND neo_reference_id = new.id AND risk_score IS NOT NULL;
+        {_TRIM}
+        {_REFILL}
+    END
+    """,
+]
+
+
+def check_risk(conn, rel_tol=1e-9):
+    """Compare stored scores and the leaderboard with a fresh computation. Returns a list of problems."""
+    problems = []
+    expected = risk_score_sql("a.estimated_diameter_max_km", "c.relative_velocity_kmph", "c.miss_distance_lunar")
+    for approach_id, have, want in conn.execute(f"""
+            SELECT c.id, c.risk_score, {expected}
+            FROM close_approach c LEFT JOIN asteroids a ON a.id = c.neo_reference_id"""):
+        if have is None or want is None:
+            if have is not want:
+                problems.append(f"close_approach: id={approach_id} has risk_score {have}, expected {want}")
+        elif not math.isclose(have, want, rel_tol=rel_tol, abs_tol=1e-9):
+            problems.append(f"close_approach: id={approach_id} has risk_score {have}, expected {want}")
+
+    want = [row[2] for row in conn.execute(LEADERBOARD_SELECT)]
+    have = [row[0] for row in conn.execute("SELECT risk_score FROM threat_leaderboard ORDER BY risk_score DESC")]
+    if have != want:
+        problems.append(f"threat_leaderboard: {len(have)} scores {have[:3]}..., expected {len(want)} {want[:3]}...")
+    stale = conn.execute("""
+        SELECT COUNT(*) FROM threat_leaderboard t
+        LEFT JOIN close_approach c ON c.id = t.approach_id
+        WHERE c.id IS NULL OR c.risk_score IS NOT t.risk_score OR c.neo_reference_id != t.neo_reference_id
+    """).fetchone()[0]
+    if stale:
+        problems.append(f"threat_leaderboard: {stale} entries do not match close_approach")
+    return problems
+
+
+def rebuild_risk(conn):
+    """Recompute every stored score and the leaderboard in one transaction."""
+    with conn:
+        conn.execute(_SCORE_ALL)
+        conn.execute("DELETE FROM threat_leaderboard")
+        conn.execute("INSERT INTO threat_leaderboard (approach_id, neo_reference_id, risk_score) "
+                     + LEADERBOARD_SELECT)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check or rebuild stored risk scores and the threat leaderboard")
+    parser.add_argument("db", nargs="?", default=config.DB_PATH)
+    parser.add_argument("--rebuild", action="store_true", help="rebuild from scratch instead of only checking")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    if args.rebuild:
+        rebuild_risk(conn)
+        print("Risk scores and leaderboard rebuilt")
+    problems = check_risk(conn)
+    for problem in problems[:50]:
+        print(problem)
+    if len(problems) > 50:
+        print(f"... and {len(problems) - 50} more")
+    print("Risk scores are consistent" if not problems else f"{len(problems)} inconsistencies found")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+"""
+Versioned schema migrations for nasa_neo.db.
+
+Each migration runs inside a single transaction and is recorded in the
+schema_version table, so an existing database can be upgraded in place
+and re-running the tool is a no-op.
+
+Usage:
+    python schema_migrations.py nasa_neo.db            # upgrade in place
+    python schema_migrations.py nasa_neo.db --status   # show applied versions
+    python schema_migrations.py nasa_neo.db --report   # upgrade + EXPLAIN QUERY PLAN before/after
+"""
+import argparse
+import re
+import sqlite3
+import sys
+from datetime import datetime, timezone
+
+import aggregates
+import config
+import data_version
+import overview_snapshot
+import partitions
+import risk
+import sketches
+import trends
+
+# Migration 1: primary keys, natural key, stored year/month and covering indexes.
+# close_approach had exact duplicate rows (same asteroid, date and body); these
+# are dropped so the natural key can be enforced and ingestion can upsert.
+MIGRATION_1 = [
+    # Original (pre-migration) layout, so a brand new database file can be upgraded too
+    """
+    CREATE TABLE IF NOT EXISTS asteroids (
+        id INTEGER,
+        name TEXT,
+        absolute_magnitude_h REAL,
+        estimated_diameter_min_km REAL,
+        estimated_diameter_max_km REAL,
+        is_potentially_hazardous_asteroid INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS close_approach (
+        neo_reference_id INTEGER,
+        close_approach_date TEXT,
+        relative_velocity_kmph REAL,
+        astronomical REAL,
+        miss_distance_km REAL,
+        miss_distance_lunar REAL,
+        orbiting_body TEXT
+    )
+    """,
+    """
+    CREATE TABLE asteroids_new (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        absolute_magnitude_h REAL,
+        estimated_diameter_min_km REAL,
+        estimated_diameter_max_km REAL,
+        is_potentially_hazardous_asteroid INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    INSERT OR IGNORE INTO asteroids_new
+    SELECT id, name, absolute_magnitude_h, estimated_diameter_min_km,
+           estimated_diameter_max_km, COALESCE(is_potentially_hazardous_asteroid, 0)
+    FROM asteroids
+    ORDER BY rowid
+    """,
+    "DROP TABLE asteroids",
+    "ALTER TABLE asteroids_new RENAME TO asteroids",
+    """
+    CREATE TABLE close_approach_new (
+        id INTEGER PRIMARY KEY,
+        neo_reference_id INTEGER NOT NULL REFERENCES asteroids(id),
+        close_approach_date TEXT NOT NULL,
+        relative_velocity_kmph REAL,
+        astronomical REAL,
+        miss_distance_km REAL,
+        miss_distance_lunar REAL,
+        orbiting_body TEXT NOT NULL DEFAULT 'Earth',
+        approach_year TEXT GENERATED ALWAYS AS (substr(close_approach_date, 1, 4)) STORED,
+        approach_month TEXT GENERATED ALWAYS AS (substr(close_approach_date, 1, 7)) STORED,
+        UNIQUE (neo_reference_id, close_approach_date, orbiting_body)
+    )
+    """,
+    """
+    INSERT OR IGNORE INTO close_approach_new (
+        neo_reference_id, close_approach_date, relative_velocity_kmph,
+        astronomical, miss_distance_km, miss_distance_lunar, orbiting_body
+    )
+    SELECT neo_reference_id, close_approach_date, relative_velocity_kmph,
+           astronomical, miss_distance_km, miss_distance_lunar,
+           COALESCE(orbiting_body, 'Earth')
+    FROM close_approach
+    ORDER BY rowid
+    """,
+    "DROP TABLE close_approach",
+    "ALTER TABLE close_approach_new RENAME TO close_approach",
+    # Filters + sorts on a single measurement, covering the columns the queries return
+    """CREATE INDEX ix_close_approach_velocity
+       ON close_approach (relative_velocity_kmph, neo_reference_id, close_approach_date)""",
+    """CREATE INDEX ix_close_approach_lunar
+       ON close_approach (miss_distance_lunar, neo_reference_id, close_approach_date)""",
+    """CREATE INDEX ix_close_approach_au
+       ON close_approach (astronomical, neo_reference_id, close_approach_date)""",
+    # Monthly / yearly grouping
+    "CREATE INDEX ix_close_approach_month ON close_approach (approach_month, miss_distance_lunar)",
+    "CREATE INDEX ix_close_approach_year ON close_approach (approach_year)",
+    # Asteroid sorts
+    "CREATE INDEX ix_asteroids_diameter ON asteroids (estimated_diameter_max_km)",
+    "CREATE INDEX ix_asteroids_magnitude ON asteroids (absolute_magnitude_h)",
+    """CREATE INDEX ix_asteroids_hazard_diameter
+       ON asteroids (is_potentially_hazardous_asteroid, estimated_diameter_max_km)""",
+]
+
+# (version, description, steps) - steps are SQL strings or callables taking the connection
+MIGRATIONS = [
+    (1, "primary keys, natural key, stored year/month, covering indexes", MIGRATION_1),
+    (2, "trigger-maintained per-asteroid and per-month/year summary tables", aggregates.MIGRATION),
+    (3, "data version stamp for exact cache invalidation", data_version.MIGRATION),
+    (4, "stored, indexed risk score and trigger-maintained threat leaderboard", risk.MIGRATION),
+    (5, "per-asteroid distance trends, refreshed incrementally from a dirty list", trends.MIGRATION),
+    (6, "registry of frozen per-year approach partitions, marked stale by triggers", partitions.MIGRATION),
+    (7, "overview snapshot written at ingest for the dashboard's first paint", overview_snapshot.MIGRATION),
+    (8, "per-month quantile and distinct-count sketches, refreshed from a dirty list", sketches.MIGRATION),
+]
+
+
+def _ensure_version_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    """)
+
+
+def current_version(conn):
+    _ensure_version_table(conn)
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def pending_migrations(conn):
+    version = current_version(conn)
+    return [m for m in MIGRATIONS if m[0] > version]
+
+
+def migrate(conn, target=None, verbose=False):
+    """Apply every pending migration up to `target` (default: latest). Returns applied versions."""
+    applied = []
+    old_isolation = conn.isolation_level
+    conn.isolation_level = None  # explicit transaction control
+    try:
+        conn.execute("PRAGMA foreign_keys = OFF")
+        for version, description, steps in pending_migrations(conn):
+            if target is not None and version > target:
+                break
+            if verbose:
+                print(f"Applying migration {version}: {description}")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process may have migrated while we waited for the lock
+                if current_version(conn) >= version:
+                    conn.execute("COMMIT")
+                    continue
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute(
+                    "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                    (version, description, datetime.now(timezone.utc).isoformat(timespec="seconds")),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            applied.append(version)
+        if applied:
+            conn.execute("ANALYZE")
+    finally:
+        conn.isolation_level = old_isolation
+    return applied
+
+
+# Stored columns added by migrations 1 and 4 and the expressions they replace
+LEGACY_EXPRESSIONS = {
+    "approach_month": "strftime('%Y-%m', close_approach_date)",
+    "approach_year": "strftime('%Y', close_approach_date)",
+    "risk_score": "(" + risk.risk_score_sql(
+        "a.estimated_diameter_max_km", "c.relative_velocity_kmph", "c.miss_distance_lunar") + ")",
+}
+
+# Tables added by migrations whose queries have an equivalent in RAW_QUERIES
+SUMMARY_TABLES = ["asteroid_stats", "monthly_approach_stats", "yearly_approach_stats", "threat_leaderboard",
+                  "asteroid_trends"]
+
+
+def legacy_sql(sql, columns):
+    """Rewrite stored-column references (not output aliases) for a database that does not have them yet."""
+    for column, expression in LEGACY_EXPRESSIONS.items():
+        if column not in columns:
+            sql = re.sub(rf"(?<!as )\b(\w+\.)?{column}\b", expression, sql)
+    return sql
+
+
+def explain_plans(conn, queries):
+    """EXPLAIN QUERY PLAN for each named query -> {name: [plan lines]} (errors are reported inline)."""
+    plans = {}
+    for name, sql in queries.items():
+        try:
+            rows = conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+            plans[name] = [row[-1] for row in rows]
+        except sqlite3.Error as e:
+            plans[name] = [f"ERROR: {e}"]
+    return plans
+
+
+def print_plan_report(before, after):
+    for name in after:
+        print("=" * 80)
+        print(name)
+        print("  before:")
+        for line in before.get(name, ["(not available)"]):
+            print(f"    {line}")
+        print("  after:")
+        for line in after[name]:
+            print(f"    {line}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Upgrade nasa_neo.db to the latest schema")
+    parser.add_argument("db", nargs="?", default=config.DB_PATH)
+    parser.add_argument("--status", action="store_true", help="show applied and pending migrations")
+    parser.add_argument("--report", action="store_true",
+                        help="print EXPLAIN QUERY PLAN for every QUERIES entry before and after")
+    parser.add_argument("--target", type=int, default=None, help="migrate up to this version only")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    if args.status:
+        current_version(conn)
+        for version, description, applied_at in conn.execute(
+                "SELECT version, description, applied_at FROM schema_version ORDER BY version"):
+            print(f"  [x] {version}: {description} ({applied_at})")
+        for version, description, _ in pending_migrations(conn):
+            print(f"  [ ] {version}: {description}")
+        return 0
+
+    from project_sql_queries import QUERIES, RAW_QUERIES
+    before = None
+    if args.report:
+        # The old schema has no summary tables or stored year/month columns,
+        # so plan the equivalent aggregations and expressions
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(close_approach)")}
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        legacy = {}
+        for name, sql in QUERIES.items():
+            if name in RAW_QUERIES and any(re.search(rf"\b{t}\b", sql) for t in SUMMARY_TABLES if t not in tables):
+                sql = RAW_QUERIES[name]
+            legacy[name] = legacy_sql(sql, columns)
+        before = explain_plans(conn, legacy)
+    applied = migrate(conn, target=args.target, verbose=True)
+    print(f"Schema at version {current_version(conn)} ({len(applied)} migration(s) applied)")
+    if args.report:
+        print_plan_report(before, explain_plans(conn, QUERIES))
+    conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
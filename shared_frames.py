@@ -0,0 +1,203 @@
+"""
+Query results shared through memory-mapped Arrow files.
+
+A result published here is written once, as an Arrow IPC file named after
+its SQL and the data version, into a shared-memory directory (/dev/shm by
+default). Every process that needs it -- several dashboard servers, the
+query API -- maps the same file, and every session gets a DataFrame over
+the mapping: numeric columns are read-only views of the mapped pages and
+text columns stay Arrow-backed, so a session's copy costs a few hundred
+bytes of column headers whatever the size of the result.
+
+Arrow reference-counts the mapped buffers: a mapping stays open while any
+frame still uses it and is closed by the last one. The first request for
+a newer data version unlinks every file of an older one, including results
+nobody asks for again; frames that still map them keep working (the pages
+are freed when they close), and new readers only see the new files.
+
+Usage:
+    python shared_frames.py nasa_neo.db --sessions 50   # per-session memory: shared vs private frames
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+import pyarrow as pa
+
+import config
+from data_version import read_data_version
+from project_sql_queries import LUNAR_APPROACHES, QUERIES
+from query_cache import normalize_sql
+
+SUFFIX = ".arrow"
+_STRINGS = {pa.string(): pd.StringDtype("pyarrow"), pa.large_string(): pd.StringDtype("pyarrow")}
+
+
+def default_dir():
+    if config.SHARED_FRAMES_DIR:
+        return config.SHARED_FRAMES_DIR
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "neo_frames")
+
+
+def frame_key(sql, params=()):
+    return hashlib.sha1(repr((normalize_sql(sql), tuple(params or ()))).encode()).hexdigest()[:20]
+
+
+def view_frame(table):
+    """DataFrame over an Arrow table without copying: numeric columns without nulls become read-only
+    views of its buffers, text columns stay Arrow-backed."""
+    return table.to_pandas(split_blocks=True, types_mapper=_STRINGS.get)
+
+
+class SharedFrames:
+    def __init__(self, directory=None):
+        self.directory = directory or default_dir()
+        os.makedirs(self.directory, exist_ok=True)
+        self.frames = {}  # key -> (data version, DataFrame over the mapping)
+        self.inflight = {}  # (key, data version) -> threading.Event
+        self.lock = threading.Lock()
+        self.newest = 0  # newest data version seen
+        self.published = 0
+        self.mapped = 0
+        self.hits = 0
+
+    def path(self, key, version):
+        return os.path.join(self.directory, f"{key}-v{version}{SUFFIX}")
+
+    def _map(self, path):
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+        # read_all keeps the mapping alive through its buffers even after the file object closes
+        return view_frame(table)
+
+    def _publish(self, path, frame):
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f, pa.ipc.new_file(f, table.schema) as writer:
+                writer.write_table(table)
+            os.chmod(tmp, 0o644)  # readable by the other processes sharing it
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _remove_stale(self, key, version):
+        for name in os.listdir(self.directory):
+            if name.startswith(key + "-v") and name.endswith(SUFFIX) and name != f"{key}-v{version}{SUFFIX}":
+                try:
+                    os.unlink(os.path.join(self.directory, name))
+                except OSError:
+                    pass  # already gone, or still mapped on a platform that can't unlink it
+
+    def get_or_publish(self, sql, params, version, execute):
+        """(DataFrame over the shared result, hit). `execute()` runs the query when no process has published
+        this version yet; only one thread per process does."""
+        key = frame_key(sql, params)
+        with self.lock:
+            newer, self.newest = version > self.newest, max(self.newest, version)
+        if newer:
+            self.cleanup(version)
+        while True:
+            with self.lock:
+                current = self.frames.get(key)
+                if current is not None and current[0] == version:
+                    self.hits += 1
+                    return current[1].copy(deep=False), True
+                waiting = self.inflight.get((key, version))
+                if waiting is None:
+                    done = self.inflight[(key, version)] = threading.Event()
+                    break
+            waiting.wait()
+
+        try:
+            path = self.path(key, version)
+            hit = os.path.exists(path)
+            if not hit:
+                self._publish(path, execute())
+                self.published += 1
+                self._remove_stale(key, version)
+            frame = self._map(path)
+            with self.lock:
+                self.mapped += 1
+                current = self.frames.get(key)
+                if current is None or current[0] <= version:
+                    self.frames[key] = (version, frame)  # the old frame is unmapped when its last user goes
+            return frame.copy(deep=False), hit
+        finally:
+            with self.lock:
+                del self.inflight[(key, version)]
+            done.set()
+
+    def cleanup(self, version):
+        """Unlink every published file of an older data version and drop this process's frames of one.
+        Runs the first time get_or_publish sees a newer version, so results that are never asked for
+        again don't stay in shared memory."""
+        with self.lock:
+            for key, (frame_version, _) in list(self.frames.items()):
+                if frame_version < version:
+                    del self.frames[key]  # unmapped once the sessions still using it let go
+        removed = 0
+        for name in os.listdir(self.directory):
+            stem, _, tail = name.rpartition("-v")
+            if stem and name.endswith(SUFFIX) and tail[:-len(SUFFIX)].isdigit() and int(tail[:-len(SUFFIX)]) < version:
+                try:
+                    os.unlink(os.path.join(self.directory, name))
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def stats(self):
+        with self.lock:
+            files = [n for n in os.listdir(self.directory) if n.endswith(SUFFIX)]
+            return {"directory": self.directory, "frames": len(self.frames), "files": len(files),
+                    "file_bytes": sum(os.path.getsize(os.path.join(self.directory, n)) for n in files),
+                    "published": self.published, "mapped": self.mapped, "hits": self.hits}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare per-session memory of shared and private result frames")
+    parser.add_argument("db", nargs="?", default=config.DB_PATH)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--dir", help="shared-memory directory (default: /dev/shm/neo_frames)")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    version = read_data_version(conn)
+    queries = [QUERIES["13. Hazardous vs Non-Hazardous"], QUERIES["11. Monthly Approach Count"],
+               QUERIES["3. Top 10 Fastest Asteroids"], QUERIES["BONUS: Size Categories"], LUNAR_APPROACHES]
+    shared = SharedFrames(args.dir)
+    started = time.perf_counter()
+    results = {sql: pd.read_sql(sql, conn) for sql in queries}
+    print(f"Ran the {len(queries)} Overview queries in {time.perf_counter() - started:.2f}s, "
+          f"{sum(int(df.memory_usage(deep=True).sum()) for df in results.values()) / 2 ** 20:.1f} MB as DataFrames")
+    for sql in queries:
+        shared.get_or_publish(sql, (), version, lambda: results[sql])
+
+    def per_session(load):
+        tracemalloc.start()
+        held = [[load(sql) for sql in queries] for _ in range(args.sessions)]
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del held
+        return used / args.sessions
+
+    private = per_session(lambda sql: results[sql].copy(deep=True))
+    mapped = per_session(lambda sql: shared.get_or_publish(sql, (), version, None)[0])
+    print(f"{args.sessions} sessions: {private / 2 ** 20:.2f} MB per session with private copies, "
+          f"{mapped / 1024:.1f} KB with shared frames")
+    print(shared.stats())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
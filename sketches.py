@@ -0,0 +1,405 @@
+"""
+Mergeable distribution sketches of close approaches.
+
+approach_sketches holds one row per month and hazard class with:
+    velocity_sketch    relative velocity quantile sketch
+    miss_lunar_sketch  lunar miss distance quantile sketch
+    asteroid_hll       HyperLogLog of the asteroids that approached
+
+The quantile sketches count values in logarithmic buckets, each 2% wide
+(the DDSketch layout), so every quantile they return is within 1% of the
+true value at that rank. The HyperLogLog has 4096 registers, about 1.6%
+standard error on distinct counts. Both merge exactly -- bucket counts add,
+registers take the maximum -- so any range of months is answered from its
+month rows with the same error bound as a single month, without touching
+close_approach.
+
+Triggers mark the months whose approaches (or whose asteroids' hazard
+flags) change in approach_sketches_dirty; refresh_sketches recomputes just
+those months inside the writer's transaction (neo_ingest.BulkLoader does
+this on every flush).
+
+Usage:
+    python sketches.py nasa_neo.db            # check sketches against exact percentiles
+    python sketches.py nasa_neo.db --refresh  # recompute the dirty months
+    python sketches.py nasa_neo.db --rebuild  # recompute every month
+"""
+import argparse
+import math
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+import config
+from data_version import bump_data_version
+
+RELATIVE_ACCURACY = 0.01
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+MIN_VALUE = 1e-9  # smaller values (and zero) share the lowest bucket
+
+HLL_BITS = 12
+_REGISTERS = 1 << HLL_BITS
+
+PERCENTILES = [0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+
+SKETCH_ROWS = """
+SELECT
+    c.approach_month,
+    COALESCE(a.is_potentially_hazardous_asteroid, 0) AS hazardous,
+    c.neo_reference_id,
+    c.relative_velocity_kmph,
+    c.miss_distance_lunar
+FROM close_approach c
+LEFT JOIN asteroids a ON a.id = c.neo_reference_id{where}
+ORDER BY c.approach_month, hazardous
+"""
+
+_DIRTY = "\nWHERE c.approach_month IN (SELECT approach_month FROM approach_sketches_dirty)"
+
+_MARK = "INSERT OR IGNORE INTO approach_sketches_dirty (approach_month) VALUES ({ref}.approach_month);"
+
+
+def _fill(conn):
+    _write(conn, SKETCH_ROWS.format(where=""))
+
+
+MIGRATION = [
+    """
+    CREATE TABLE approach_sketches (
+        approach_month TEXT NOT NULL,
+        is_potentially_hazardous_asteroid INTEGER NOT NULL,
+        approach_count INTEGER NOT NULL,
+        velocity_sketch BLOB NOT NULL,
+        miss_lunar_sketch BLOB NOT NULL,
+        asteroid_hll BLOB NOT NULL,
+        PRIMARY KEY (approach_month, is_potentially_hazardous_asteroid)
+    ) WITHOUT ROWID
+    """,
+    "CREATE TABLE approach_sketches_dirty (approach_month TEXT PRIMARY KEY)",
+    f"""
+    CREATE TRIGGER trg_close_approach_sketches_insert AFTER INSERT ON close_approach
+    BEGIN
+        {_MARK.format(ref="new")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER trg_close_approach_sketches_delete AFTER DELETE ON close_approach
+    BEGIN
+        {_MARK.format(ref="old")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER trg_close_approach_sketches_update
+    AFTER UPDATE OF neo_reference_id, close_approach_date, relative_velocity_kmph, miss_distance_lunar
+    ON close_approach
+    BEGIN
+        {_MARK.format(ref="old")}
+        {_MARK.format(ref="new")}
+    END
+    """,
+    """
+    CREATE TRIGGER trg_asteroids_sketches_hazard
+    AFTER UPDATE OF is_potentially_hazardous_asteroid ON asteroids
+    WHEN old.is_potentially_hazardous_asteroid IS NOT new.is_potentially_hazardous_asteroid
+    BEGIN
+        INSERT OR IGNORE INTO approach_sketches_dirty (approach_month)
+        SELECT DISTINCT approach_month FROM close_approach WHERE neo_reference_id = new.id;
+    END
+    """,
+    _fill,
+]
+
+
+class QuantileSketch:
+    """Counts of values in logarithmic buckets: bucket k holds (gamma^(k-1), gamma^k]."""
+
+    def __init__(self, offset=0, counts=None):
+        self.offset = offset
+        self.counts = np.zeros(0, dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+
+    @classmethod
+    def from_values(cls, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return cls()
+        keys = np.ceil(np.log(np.maximum(values, MIN_VALUE)) / _LOG_GAMMA).astype(np.int64)
+        offset = int(keys.min())
+        return cls(offset, np.bincount(keys - offset))
+
+    @classmethod
+    def from_bytes(cls, blob):
+        data = np.frombuffer(blob, dtype="<i4")
+        return cls(int(data[0]), data[1:]) if len(data) else cls()
+
+    def to_bytes(self):
+        if not len(self.counts):
+            return b""
+        return np.concatenate([[self.offset], self.counts]).astype("<i4").tobytes()
+
+    @classmethod
+    def merge_bytes(cls, blobs):
+        """One sketch of every value in the serialized sketches `blobs`."""
+        blobs = [b for b in blobs if b]
+        if not blobs:
+            return cls()
+        data = np.frombuffer(b"".join(blobs), dtype="<i4").astype(np.int64)
+        lengths = np.array([len(b) // 4 for b in blobs])
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        # Bucket key of every count: its sketch's offset plus its position after the header
+        keys = np.arange(len(data)) - np.repeat(starts + 1 - data[starts], lengths)
+        counts = np.ones(len(data), dtype=bool)
+        counts[starts] = False
+        offset = int(keys[counts].min())
+        return cls(offset, np.bincount(keys[counts] - offset, weights=data[counts]).astype(np.int64))
+
+    def count(self):
+        return int(self.counts.sum())
+
+    def bucket_values(self):
+        """Representative value of every bucket: within RELATIVE_ACCURACY of anything in it."""
+        keys = np.arange(self.offset, self.offset + len(self.counts))
+        return 2 * _GAMMA ** keys / (_GAMMA + 1)
+
+    def quantiles(self, qs):
+        """Values at ranks floor(q * (n - 1)) of the sorted data, for each q; NaN when empty."""
+        n = self.count()
+        if n == 0:
+            return np.full(len(qs), np.nan)
+        ranks = np.floor(np.asarray(qs, dtype=np.float64) * (n - 1))
+        return self.bucket_values()[np.searchsorted(np.cumsum(self.counts), ranks, side="right")]
+
+
+def _hash64(values):
+    """splitmix64 finaliser: well-mixed 64-bit hashes of integer ids."""
+    x = np.asarray(values, dtype=np.int64).view(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+class HyperLogLog:
+    def __init__(self, registers=None):
+        self.registers = np.zeros(_REGISTERS, dtype=np.uint8) if registers is None else registers
+
+    @classmethod
+    def from_ids(cls, ids):
+        hashes = _hash64(np.unique(np.asarray(ids, dtype=np.int64)))
+        index = (hashes >> np.uint64(64 - HLL_BITS)).astype(np.intp)
+        rest = (hashes & np.uint64((1 << (64 - HLL_BITS)) - 1)).astype(np.float64)  # exact below 2^53
+        rank = (64 - HLL_BITS + 1 - np.frexp(rest)[1]).astype(np.uint8)  # leading zeros + 1
+        registers = np.zeros(_REGISTERS, dtype=np.uint8)
+        np.maximum.at(registers, index, rank)
+        return cls(registers)
+
+    @classmethod
+    def from_bytes(cls, blob):
+        data = np.frombuffer(blob, dtype=np.uint8)
+        if len(data) == _REGISTERS:
+            return cls(data.copy())
+        # Sparse: little-endian uint16 register numbers, then their values
+        used = len(data) // 3
+        registers = np.zeros(_REGISTERS, dtype=np.uint8)
+        registers[np.frombuffer(blob[:used * 2], dtype="<u2")] = data[used * 2:]
+        return cls(registers)
+
+    def to_bytes(self):
+        used = np.flatnonzero(self.registers)
+        if len(used) * 3 >= _REGISTERS:
+            return self.registers.tobytes()
+        return used.astype("<u2").tobytes() + self.registers[used].tobytes()
+
+    @classmethod
+    def merge_bytes(cls, blobs):
+        """The union of the serialized HyperLogLogs `blobs`."""
+        dense = [b for b in blobs if len(b) == _REGISTERS]
+        sparse = [b for b in blobs if len(b) != _REGISTERS]
+        registers = np.zeros(_REGISTERS, dtype=np.uint8)
+        if dense:
+            registers = np.frombuffer(b"".join(dense), dtype=np.uint8).reshape(-1, _REGISTERS).max(axis=0)
+        if sparse:
+            used = [len(b) // 3 for b in sparse]
+            index = np.concatenate([np.frombuffer(b[:n * 2], dtype="<u2") for b, n in zip(sparse, used)])
+            rank = np.frombuffer(b"".join(b[n * 2:] for b, n in zip(sparse, used)), dtype=np.uint8)
+            np.maximum.at(registers, index.astype(np.intp), rank)
+        return cls(registers)
+
+    def estimate(self):
+        m = _REGISTERS
+        raw = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)  # linear counting for small sets
+        return float(raw)
+
+
+def _write(conn, select, params=()):
+    """Compute and insert the sketch rows of every (month, hazard class) that `select` returns."""
+    rows = conn.execute(select, params).fetchall()
+    if not rows:
+        return 0
+    months = np.array([r[0] for r in rows], dtype=object)
+    hazardous = np.array([r[1] for r in rows], dtype=np.int64)
+    ids = np.array([r[2] for r in rows], dtype=np.int64)
+    velocity = np.array([r[3] for r in rows], dtype=np.float64)
+    lunar = np.array([r[4] for r in rows], dtype=np.float64)
+    # Rows arrive grouped by (month, hazard class)
+    starts = np.flatnonzero(np.concatenate([[True], (months[1:] != months[:-1]) | (hazardous[1:] != hazardous[:-1])]))
+    ends = np.append(starts[1:], len(rows))
+    conn.executemany(
+        "INSERT INTO approach_sketches VALUES (?, ?, ?, ?, ?, ?)",
+        ((months[s], int(hazardous[s]), int(e - s),
+          QuantileSketch.from_values(velocity[s:e]).to_bytes(),
+          QuantileSketch.from_values(lunar[s:e]).to_bytes(),
+          HyperLogLog.from_ids(ids[s:e]).to_bytes()) for s, e in zip(starts, ends)))
+    return len(starts)
+
+
+def refresh_sketches(conn):
+    """Recompute the sketches of months marked dirty; call inside the writer's transaction.
+
+    Returns the number of months refreshed.
+    """
+    dirty = conn.execute("SELECT COUNT(*) FROM approach_sketches_dirty").fetchone()[0]
+    if dirty:
+        conn.execute("DELETE FROM approach_sketches WHERE approach_month IN "
+                     "(SELECT approach_month FROM approach_sketches_dirty)")
+        _write(conn, SKETCH_ROWS.format(where=_DIRTY))
+        conn.execute("DELETE FROM approach_sketches_dirty")
+    return dirty
+
+
+def rebuild_sketches(conn):
+    """Recompute every month in one transaction."""
+    with conn:
+        conn.execute("DELETE FROM approach_sketches")
+        conn.execute("DELETE FROM approach_sketches_dirty")
+        _fill(conn)
+
+
+def load_sketches(conn, since=None, until=None):
+    """{hazardous: (approach count, velocity sketch, miss distance sketch, asteroid HLL)} merged over the
+    months from `since` to `until` ('YYYY-MM', inclusive; None for open-ended)."""
+    rows = conn.execute(
+        "SELECT is_potentially_hazardous_asteroid, approach_count, velocity_sketch, miss_lunar_sketch, "
+        "asteroid_hll FROM approach_sketches WHERE approach_month >= ? AND approach_month <= ?",
+        (since or "", until or "9999-99")).fetchall()
+    merged = {}
+    for hazardous in sorted({r[0] for r in rows}):
+        mine = [r for r in rows if r[0] == hazardous]
+        merged[hazardous] = (
+            sum(r[1] for r in mine),
+            QuantileSketch.merge_bytes([r[2] for r in mine]),
+            QuantileSketch.merge_bytes([r[3] for r in mine]),
+            HyperLogLog.merge_bytes([r[4] for r in mine]),
+        )
+    return merged
+
+
+def monthly_quantiles(conn, column, qs, since=None, until=None):
+    """[(month, hazardous, count, quantiles)] of one sketch column, month by month."""
+    if column not in ("velocity_sketch", "miss_lunar_sketch"):
+        raise ValueError(f"unknown sketch column {column!r}")
+    rows = conn.execute(
+        f"SELECT approach_month, is_potentially_hazardous_asteroid, approach_count, {column} "
+        "FROM approach_sketches WHERE approach_month >= ? AND approach_month <= ? ORDER BY 1, 2",
+        (since or "", until or "9999-99")).fetchall()
+    return [(month, hazardous, count, QuantileSketch.from_bytes(blob).quantiles(qs))
+            for month, hazardous, count, blob in rows]
+
+
+def sketch_months(conn):
+    return [r[0] for r in conn.execute("SELECT DISTINCT approach_month FROM approach_sketches ORDER BY 1")]
+
+
+def check_sketches(conn, ranges=None):
+    """Compare merged sketches with exact percentiles and distinct counts over some month ranges.
+
+    Returns (problems, timings) where timings is [(range, sketch ms, exact ms)].
+    """
+    problems, timings = [], []
+    dirty = conn.execute("SELECT COUNT(*) FROM approach_sketches_dirty").fetchone()[0]
+    if dirty:
+        problems.append(f"approach_sketches: {dirty} months waiting for refresh_sketches")
+    months = sketch_months(conn)
+    if not months:
+        return problems, timings
+    if ranges is None:
+        ranges = [(None, None), (months[0], months[0]), (months[len(months) // 2], months[-1]),
+                  (months[len(months) // 4], months[len(months) // 4 + 11])]
+    for since, until in ranges:
+        started = time.perf_counter()
+        merged = load_sketches(conn, since, until)
+        for _, velocity, lunar, hll in merged.values():
+            velocity.quantiles(PERCENTILES), lunar.quantiles(PERCENTILES), hll.estimate()
+        sketch_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        rows = conn.execute(
+            "SELECT COALESCE(a.is_potentially_hazardous_asteroid, 0), c.neo_reference_id, "
+            "c.relative_velocity_kmph, c.miss_distance_lunar FROM close_approach c "
+            "LEFT JOIN asteroids a ON a.id = c.neo_reference_id "
+            "WHERE c.approach_month >= ? AND c.approach_month <= ?",
+            (since or "", until or "9999-99")).fetchall()
+        exact = np.array(rows, dtype=np.float64).reshape(-1, 4)
+        label = f"{since or 'start'}..{until or 'end'}"
+        for hazardous in sorted(set(exact[:, 0].astype(int)) | set(merged)):
+            mine = exact[exact[:, 0] == hazardous]
+            if hazardous not in merged:
+                problems.append(f"{label} hazardous={hazardous}: no sketch")
+                continue
+            count, velocity, lunar, hll = merged[hazardous]
+            if count != len(mine):
+                problems.append(f"{label} hazardous={hazardous}: {count} approaches sketched, {len(mine)} in table")
+            for name, sketch, column in (("velocity", velocity, mine[:, 2]), ("miss distance", lunar, mine[:, 3])):
+                column = column[~np.isnan(column)]
+                if not len(column):
+                    continue
+                want = np.quantile(column, PERCENTILES, method="lower")
+                got = sketch.quantiles(PERCENTILES)
+                error = np.abs(got - want) / np.maximum(np.abs(want), MIN_VALUE)
+                if error.max() > RELATIVE_ACCURACY * (1 + 1e-9) and want[error.argmax()] > MIN_VALUE:
+                    problems.append(f"{label} hazardous={hazardous}: {name} p{PERCENTILES[error.argmax()] * 100:g} "
+                                    f"is {got[error.argmax()]:.6g}, exact {want[error.argmax()]:.6g}")
+            distinct = len(np.unique(mine[:, 1]))
+            if distinct and abs(hll.estimate() - distinct) / distinct > 5 * 1.04 / math.sqrt(_REGISTERS):
+                problems.append(f"{label} hazardous={hazardous}: ~{hll.estimate():.0f} asteroids, "
+                                f"exact {distinct}")
+        timings.append((label, sketch_ms, (time.perf_counter() - started) * 1000))
+    return problems, timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check, refresh or rebuild the approach distribution sketches")
+    parser.add_argument("db", nargs="?", default=config.DB_PATH)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--refresh", action="store_true", help="recompute the months marked dirty")
+    group.add_argument("--rebuild", action="store_true", help="recompute every month")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    if args.refresh:
+        with conn:
+            refreshed = refresh_sketches(conn)
+            if refreshed:
+                bump_data_version(conn)
+        print(f"{refreshed} months refreshed")
+    elif args.rebuild:
+        started = time.perf_counter()
+        rebuild_sketches(conn)
+        print(f"Sketches rebuilt in {time.perf_counter() - started:.1f}s")
+    problems, timings = check_sketches(conn)
+    for label, sketch_ms, exact_ms in timings:
+        print(f"{label:<20} sketches {sketch_ms:8.1f} ms   exact {exact_ms:8.1f} ms")
+    for problem in problems[:50]:
+        print(problem)
+    if len(problems) > 50:
+        print(f"... and {len(problems) - 50} more")
+    print("Sketches are within their error bounds" if not problems else f"{len(problems)} problems found")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Deterministic synthetic NEO database generator.
+
+Builds a database with the same layout as nasa_neo.db and distributions
+fitted to the shipped data (approaches per asteroid, absolute magnitude and
+the diameters derived from it, hazard ratio, velocity and miss distance), at
+any size. The same --rows and --seed always give the same rows, so benchmark
+runs on different commits are comparable.
+
+The rows are bulk loaded into the original (pre-migration) tables and then
+upgraded with schema_migrations, the same path a real database takes.
+
+Usage:
+    python synthetic_data.py synthetic_1M.db --rows 1M [--seed 42]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from schema_migrations import MIGRATION_1, migrate
+
+# Fitted to nasa_neo.db (7,380 asteroids, 8,551 approaches, 2024-01-01..2025-04-16)
+APPROACH_REPEAT_P = 0.855        # approaches per asteroid ~ geometric: 85% once, 13% twice, ...
+MAGNITUDE_MEAN, MAGNITUDE_STD = 24.6, 2.5
+MAGNITUDE_RANGE = (13.8, 33.2)
+HAZARD_H_LIMIT = 22.0             # PHAs are H <= 22 (plus a MOID cut the feed doesn't carry)
+HAZARD_P_BRIGHT, HAZARD_P_FAINT = 0.31, 0.0013
+NUMBERED_P_BRIGHT, NUMBERED_P_FAINT = 0.24, 0.01
+VELOCITY_LOG_MEAN, VELOCITY_LOG_STD = 10.555, 0.568
+HAZARD_VELOCITY_FACTOR = 1.45
+VELOCITY_RANGE = (1000.0, 250000.0)
+# Miss distance (LD) at every 5th percentile; sampled by interpolating the inverse CDF
+LUNAR_PERCENTILES = [
+    0.02, 2.35, 5.26, 8.97, 13.24, 18.96, 24.77, 33.06, 41.94, 51.01, 60.0,
+    69.04, 78.64, 94.36, 109.75, 124.21, 137.59, 152.28, 166.45, 180.44, 194.48,
+]
+APPROACHES_PER_DAY = 18.1
+KM_PER_AU = 149597870.7
+LD_PER_AU = 389.1724
+FIRST_ID = 2000001
+START_DATE = date(2024, 1, 1)
+CHUNK_ASTEROIDS = 200000
+
+LETTERS = "ABCDEFGHJKLMNOPQRSTUVWXY"    # half-month letters (no I, no Z)
+LETTERS_2 = "ABCDEFGHJKLMNOPQRSTUVWXYZ"  # order-in-half-month letters (no I)
+NAMES = ["Alinda", "Toro", "Bacchus", "Hathor", "Vishnu", "Apollo", "Icarus", "Geographos",
+         "Eros", "Phaethon", "Nereus", "Ganymed", "Orpheus", "Khufu", "Hermes", "Cuno"]
+
+
+def parse_count(text):
+    """'10k' / '1M' / '50M' / '12345' -> int."""
+    text = str(text).strip().upper()
+    scale = {"K": 1000, "M": 1000000, "G": 1000000000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def span_days(rows):
+    """Date range covered: the shipped approach rate, capped at two centuries."""
+    return int(min(max(rows / APPROACHES_PER_DAY, 472), 200 * 365))
+
+
+def designation(index):
+    """Unique provisional designation for asteroid number `index`, e.g. '2003 QB12'."""
+    year = 1990 + index % 36
+    index //= 36
+    half_month = LETTERS[index % 24]
+    index //= 24
+    order = LETTERS_2[index % 25]
+    cycle = index // 25
+    return f"{year} {half_month}{order}{cycle or ''}"
+
+
+def generate_chunk(seed, chunk, first_index, n_asteroids, days):
+    """Asteroid and approach rows for one chunk; each chunk has its own RNG stream."""
+    rng = np.random.default_rng([seed, chunk])
+    index = np.arange(first_index, first_index + n_asteroids)
+
+    h = np.clip(rng.normal(MAGNITUDE_MEAN, MAGNITUDE_STD, n_asteroids), *MAGNITUDE_RANGE).round(2)
+    bright = h <= HAZARD_H_LIMIT
+    hazardous = rng.random(n_asteroids) < np.where(bright, HAZARD_P_BRIGHT, HAZARD_P_FAINT)
+    numbered = rng.random(n_asteroids) < np.where(bright, NUMBERED_P_BRIGHT, NUMBERED_P_FAINT)
+    # NeoWs diameter range: albedo 0.25 (min) to 0.05 (max)
+    d_min = 1329.0 / np.sqrt(0.25) * 10 ** (-h / 5)
+    d_max = 1329.0 / np.sqrt(0.05) * 10 ** (-h / 5)
+
+    asteroids = []
+    for i, idx in enumerate(index.tolist()):
+        name = f"({designation(idx)})"
+        if numbered[i]:
+            name = f"{idx + 1} {NAMES[idx % len(NAMES)]} {name}"
+        asteroids.append((FIRST_ID + idx, name, float(h[i]), float(d_min[i]), float(d_max[i]), int(hazardous[i])))
+
+    counts = rng.geometric(APPROACH_REPEAT_P, n_asteroids)
+    total = int(counts.sum())
+    owner = np.repeat(np.arange(n_asteroids), counts)
+    # Position of each approach within its asteroid, so repeat visits get later dates
+    nth = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    first_day = rng.integers(0, days, n_asteroids)
+    gap = rng.integers(30, max(31, min(1500, days // 2)), n_asteroids)
+    day = first_day[owner] + nth * gap[owner]
+
+    velocity = np.exp(rng.normal(VELOCITY_LOG_MEAN, VELOCITY_LOG_STD, total))
+    velocity = np.clip(velocity * np.where(hazardous[owner], HAZARD_VELOCITY_FACTOR, 1.0), *VELOCITY_RANGE)
+    lunar = np.interp(rng.random(total), np.linspace(0, 1, len(LUNAR_PERCENTILES)), LUNAR_PERCENTILES)
+    au = lunar / LD_PER_AU
+
+    ids = (FIRST_ID + index[owner]).tolist()
+    dates = [(START_DATE + timedelta(days=d)).isoformat() for d in day.tolist()]
+    approaches = list(zip(ids, dates, velocity.tolist(), au.tolist(), (au * KM_PER_AU).tolist(),
+                          lunar.tolist(), ["Earth"] * total))
+    return asteroids, approaches
+
+
+def generate(path, rows, seed=42, verbose=False):
+    """Write a fully migrated database with exactly `rows` close approaches."""
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    for statement in MIGRATION_1[:2]:
+        conn.execute(statement)
+
+    days = span_days(rows)
+    chunk_asteroids = min(CHUNK_ASTEROIDS, rows)
+    started = time.perf_counter()
+    written = n_asteroids = chunk = 0
+    conn.execute("BEGIN")
+    while written < rows:
+        asteroids, approaches = generate_chunk(seed, chunk, n_asteroids, chunk_asteroids, days)
+        approaches = approaches[:rows - written]
+        last_owner = approaches[-1][0]
+        asteroids = [a for a in asteroids if a[0] <= last_owner]
+        conn.executemany("INSERT INTO asteroids VALUES (?, ?, ?, ?, ?, ?)", asteroids)
+        conn.executemany("INSERT INTO close_approach VALUES (?, ?, ?, ?, ?, ?, ?)", approaches)
+        written += len(approaches)
+        n_asteroids += len(asteroids)
+        chunk += 1
+        if verbose:
+            print(f"  {written:,} approaches / {n_asteroids:,} asteroids ({time.perf_counter() - started:.0f}s)")
+    conn.execute("COMMIT")
+
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    migrate(conn, verbose=verbose)
+    conn.close()
+    if verbose:
+        print(f"Wrote {path}: {n_asteroids:,} asteroids, {written:,} approaches "
+              f"in {time.perf_counter() - started:.0f}s")
+    return n_asteroids, written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic nasa_neo-style database")
+    parser.add_argument("db", help="output path (must not exist)")
+    parser.add_argument("--rows", default="10k", help="close approaches to generate, e.g. 10k, 1M, 50M")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+    try:
+        generate(args.db, parse_count(args.rows), args.seed, verbose=True)
+    except FileExistsError as e:
+        print(f"Refusing to overwrite {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,31 @@
+import calendar
+import logging
+import os
+import time
+script_started = time.perf_counter()  # render timings in the Performance panel
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import streamlit as st
-import sqlite3
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from project_sql_queries import QUERIES
+from project_sql_queries import (ASTEROID_APPROACHES, ASTEROID_DETAIL, CLOSEST_IN_RANGE, EXPORT_QUERIES,
+                                 LUNAR_APPROACHES, QUERIES, TOP_THREATS, VELOCITY_VS_DISTANCE)
+import config
+from db_pool import Database
+from backends import make_backend
+from parquet_snapshot import latest_snapshot
+from query_cache import QueryCache, frame_bytes
+from query_metrics import QueryMetrics, query_label
+from filter_query import ApproachFilter, display_frame
+from column_engine import ApproachColumns, sql_resolver
+from plot_data import MAX_POINTS, downsample
+from result_export import FORMATS, export_path, export_query, remove_stale_exports
+from name_search import NameIndex
+from overview_snapshot import CURRENT_SNAPSHOT
+from sketches import PERCENTILES, RELATIVE_ACCURACY, load_sketches, monthly_quantiles, sketch_months
+from refresh_scheduler import RefreshScheduler
+from shared_frames import SharedFrames
+from admission import AdmissionController, Ticket
+from result_types import column_types
 
 # Page config
 st.set_page_config(
@@ -47,17 +69,168 @@ COLORS = {
     'info': '#3b82f6'
 }
 
-# Database connection
+# Database connections: read-only pool for sessions, one writer (migrations on startup)
 @st.cache_resource
 def get_db():
-    return sqlite3.connect(r"C:\Users\praty\OneDrive\Desktop\Personal projects\Mini project1 - NASA NEOT\nasa_neo.db", check_same_thread=False)
+    return Database(config.DB_PATH)
+
+# Query backend: the live SQLite database or the latest Parquet snapshot (see backends.py)
+@st.cache_resource
+def get_backend(name):
+    return make_backend(name, get_db())
+
+def current_backend():
+    return get_backend(st.session_state.get("backend", config.BACKEND))
+
+# One result cache per backend for every session in this process, keyed on the data version
+@st.cache_resource
+def get_query_cache(backend_name):
+    return QueryCache(max_bytes=config.QUERY_CACHE_BYTES)
+
+# Columnar engine for Advanced Filters, rebuilt when the data version changes
+@st.cache_resource(max_entries=1)
+def get_column_engine(version):
+    with get_db().reader() as conn:
+        return ApproachColumns.from_connection(conn, data_version=version)
+
+# Asteroid name index for the sidebar lookup, rebuilt when the data version changes
+@st.cache_resource(max_entries=1)
+def get_name_index(version):
+    with get_db().reader() as conn:
+        return NameIndex.from_connection(conn)
+
+# Overview results published once as memory-mapped Arrow files, when NEO_SHARED_FRAMES is set
+@st.cache_resource
+def get_shared_frames():
+    return SharedFrames()
+
+# Background feed refresh for this process, when NEO_REFRESH_INTERVAL is set (see refresh_scheduler.py)
+@st.cache_resource
+def get_scheduler():
+    scheduler = RefreshScheduler.from_config()
+    return scheduler.start() if scheduler else None
+
+# Latency / rows / bytes / cache hits / plan digest of every database call
+@st.cache_resource
+def get_metrics():
+    return QueryMetrics()
+
+# Concurrency caps, queueing and time budgets for every query that misses the cache (see admission.py)
+@st.cache_resource
+def get_admission():
+    return AdmissionController()
+
+# Logged once per process when Streamlit's run state can't be read (see superseded)
+@st.cache_resource
+def warn_no_cancellation():
+    logging.getLogger(__name__).warning(
+        "Can't read ScriptRunContext.script_requests._state; superseded runs' queries will only stop at their time budget")
+
+def superseded(ctx):
+    # Streamlit has asked this run to stop (tab closed) or rerun (widget changed, page switched).
+    # This is the only read of Streamlit's private run state: ctx.script_requests._state, a ScriptRequestType
+    # of CONTINUE / STOP / RERUN (checked against streamlit 1.28.0). If a release renames it, nothing is
+    # treated as superseded and queries still stop at their time budget.
+    state = getattr(getattr(ctx, "script_requests", None), "_state", None)
+    if state is None:
+        if ctx is not None:
+            warn_no_cancellation()
+        return False
+    return getattr(state, "name", None) in ("STOP", "RERUN")
+
+# Show datetime64 result columns as plain dates
+def date_columns(df):
+    return {c: st.column_config.DateColumn(format="YYYY-MM-DD") for c in df.columns
+            if pd.api.types.is_datetime64_any_dtype(df[c])}
 
-def run_query(query):
+def execute(backend, query, params=(), sample=None, status=None, label="", dates=None):
+    ctx = get_script_run_ctx()
+    ticket = Ticket(ctx.session_id if ctx else None, label, cancelled=lambda: superseded(ctx))
+
+    def on_wait(position, queued):
+        if status is not None:
+            status.caption(f"⏳ Queued behind other queries: {position} of {queued}")
+
+    with get_admission().admit(ticket, on_wait):
+        # Categoricals, datetime64 dates and float32 where it's exact enough (see result_types.py)
+        df = backend.read(query, params, ticket, column_types(query), dates)
+    if sample is not None:
+        sample["plan"] = get_metrics().plan_digest(backend, query, params)
+        sample["nbytes"] = frame_bytes(df)
+    return df
+
+# `dates` = (since, until) when the query only reads approaches between them: frozen years come from
+# their partition files instead of the live table (see partitions.py)
+def read_cached(query, params=(), name=None, backend=None, shared=False, status=None, dates=None):
+    backend = get_backend(backend) if backend else current_backend()
+    label = name or query_label(query)
+    if backend.name != "sqlite":
+        label += f" [{backend.name}]"
+    # Shared frames are read-only views over one mapped file, not a copy per process
+    cache = get_shared_frames().get_or_publish if shared and config.SHARED_FRAMES and backend.name == "sqlite" \
+        else get_query_cache(backend.name).get_or_execute
+    with get_metrics().track(label) as sample:
+        df, sample["cache_hit"] = cache(
+            query, params, backend.data_version(), lambda: execute(backend, query, params, sample, status, label, dates))
+        sample["rows"] = len(df)
+    # Shallow copy so pages can add columns without touching the shared entry
+    return df.copy(deep=False)
+
+def run_query(query, params=(), name=None, backend=None, shared=False, status=None, dates=None):
     try:
-        return pd.read_sql(query, get_db()), None
+        return read_cached(query, params, name, backend, shared, status, dates), None
     except Exception as e:
         return None, str(e)
 
+# Percentiles and distinct asteroids per hazard class over a month range, merged from approach_sketches
+SKETCH_METRICS = {"Relative velocity (km/h)": ("velocity_sketch", 1), "Miss distance (lunar)": ("miss_lunar_sketch", 2)}
+
+def distribution_summary(since, until, metric):
+    column, position = SKETCH_METRICS[metric]
+    with get_metrics().track("Sketches: merged percentiles") as sample, get_db().reader() as conn:
+        merged = load_sketches(conn, since, until)
+        monthly = monthly_quantiles(conn, column, [0.5, 0.95], since, until)
+        sample["rows"] = len(monthly)
+    summary = pd.DataFrame([
+        {"class": "Hazardous" if hazardous else "Non-hazardous", "approaches": parts[0],
+         "asteroids (approx.)": round(parts[3].estimate()),
+         **{f"p{q * 100:g}": value for q, value in zip(PERCENTILES, parts[position].quantiles(PERCENTILES))}}
+        for hazardous, parts in merged.items()])
+    trend = pd.DataFrame([{"month": month, "class": "Hazardous" if hazardous else "Non-hazardous",
+                           "p50": values[0], "p95": values[1]} for month, hazardous, _, values in monthly])
+    histograms = {("Hazardous" if hazardous else "Non-hazardous"): parts[position] for hazardous, parts in merged.items()}
+    return summary, trend, histograms
+
+# First and last day of a range of 'YYYY-MM' months
+def month_dates(since, until):
+    year, month = map(int, until.split("-"))
+    return f"{since}-01", f"{until}-{calendar.monthrange(year, month)[1]:02d}"
+
+# Independent queries on parallel pool connections; yields (key, (df, error)) as each one finishes
+def run_queries(queries, shared=False, slots=None):
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(max_workers=min(len(queries), config.READ_POOL_SIZE),
+                            initializer=add_script_run_ctx, initargs=(None, ctx)) as pool:
+        futures = {pool.submit(run_query, query, shared=shared, status=(slots or {}).get(key)): key
+                   for key, query in queries.items()}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+# Density cells from plot_data.velocity_distance_query as a scatter: one marker per cell
+def density_figure(cells, title=None):
+    cells = cells.assign(hazardous_share=cells['hazardous'] / cells['count'])
+    fig = px.scatter(cells, x='distance', y='velocity',
+                   size='count', color='hazardous_share', size_max=30,
+                   hover_data={'count': True, 'size': ':.3f', 'hazardous_share': ':.0%'},
+                   color_continuous_scale='Reds', range_color=[0, 1],
+                   log_x=True, log_y=True,
+                   labels={'distance': 'Miss Distance (LD)',
+                          'velocity': 'Velocity (km/h)',
+                          'size': 'Avg Diameter (km)',
+                          'hazardous_share': 'Hazardous'})
+    fig.update_layout(title=title)
+    return fig
+
 # Header
 col1, col2 = st.columns([1, 4])
 with col1:
@@ -68,21 +241,28 @@ with col2:
 st.markdown("**Advanced Intelligence System for Asteroid Monitoring**")
 st.markdown("---")
 
-# Get stats with trends
-@st.cache_data(ttl=600)
+# Get stats with trends: the overview snapshot written at ingest, or live queries if it is out of date
 def get_stats():
-    conn = get_db()
-    total_asteroids = pd.read_sql("SELECT COUNT(*) as c FROM asteroids", conn)['c'][0]
-    total_approaches = pd.read_sql("SELECT COUNT(*) as c FROM close_approach", conn)['c'][0]
-    hazardous = pd.read_sql("SELECT COUNT(*) as c FROM asteroids WHERE is_potentially_hazardous_asteroid=1", conn)['c'][0]
+    if current_backend().name == "sqlite":
+        snapshot = read_cached(CURRENT_SNAPSHOT, name="Overview: snapshot")
+        if len(snapshot) > 0:
+            row = snapshot.iloc[0]
+            most_dangerous = pd.DataFrame({'name': [row['largest_hazardous_name']],
+                                           'estimated_diameter_max_km': [row['largest_hazardous_km']]})
+            return row['total_asteroids'], row['total_approaches'], row['hazardous'], most_dangerous.dropna()
+
+    total_asteroids = read_cached("SELECT COUNT(*) as c FROM asteroids", name="Overview: asteroids")['c'][0]
+    total_approaches = read_cached("SELECT COUNT(*) as c FROM close_approach", name="Overview: approaches")['c'][0]
+    hazardous = read_cached("SELECT COUNT(*) as c FROM asteroids WHERE is_potentially_hazardous_asteroid=1",
+                            name="Overview: hazardous")['c'][0]
     
     # Get most dangerous
-    most_dangerous = pd.read_sql("""
+    most_dangerous = read_cached("""
         SELECT name, estimated_diameter_max_km 
         FROM asteroids 
         WHERE is_potentially_hazardous_asteroid=1 
         ORDER BY estimated_diameter_max_km DESC LIMIT 1
-    """, conn)
+    """, name="Overview: most dangerous")
     
     return total_asteroids, total_approaches, hazardous, most_dangerous
 
@@ -107,6 +287,11 @@ if len(stats[3]) > 0:
     """, unsafe_allow_html=True)
 
 st.markdown("---")
+get_metrics().record("Render: first paint", time.perf_counter() - script_started)
+
+# Plotly is the slowest import (about half a second cold), so it loads once the header is on screen
+import plotly.express as px
+import plotly.graph_objects as go
 
 # Sidebar with filters
 st.sidebar.title("🎯 Navigation")
@@ -120,45 +305,131 @@ st.sidebar.markdown("---")
 st.sidebar.subheader("🔧 Global Filters")
 show_hazardous_only = st.sidebar.checkbox("Show Only Hazardous", value=False)
 
+def show_asteroid(match):
+    st.session_state.asteroid = match
+
+def close_asteroid():
+    st.session_state.pop("asteroid", None)
+
+st.sidebar.markdown("---")
+st.sidebar.subheader("🔎 Find Asteroid")
+name_query = st.sidebar.text_input("Name, number or designation", placeholder="e.g. Bennu or 2001 XY10")
+if name_query:
+    matches = get_name_index(get_db().data_version()).search(name_query)
+    if matches:
+        ids = {name: asteroid_id for asteroid_id, name in matches}
+        name = st.sidebar.selectbox("Matches", list(ids))
+        st.sidebar.button("Show details", on_click=show_asteroid, args=((ids[name], name),))
+    else:
+        st.sidebar.caption("No matching asteroid")
+
+snapshot_path, snapshot = latest_snapshot()
+if snapshot_path:
+    st.sidebar.selectbox("🗄️ Query Backend", ["sqlite", "parquet"], key="backend",
+                         index=["sqlite", "parquet"].index(config.BACKEND),
+                         help="Parquet reads the latest snapshot with DuckDB (see backends.py)")
+    if st.session_state.backend == "parquet" and snapshot["data_version"] != get_db().data_version():
+        st.sidebar.caption(f"Snapshot is from data version {snapshot['data_version']}; "
+                           f"the database is at {get_db().data_version()}")
+
+# Data freshness: written by neo_ingest.py, refresh_scheduler.py or the in-process scheduler alike
+scheduler = get_scheduler()
+with get_db().reader() as conn:
+    version, updated_at = conn.execute("SELECT version, updated_at FROM data_version WHERE id = 1").fetchone()
+st.sidebar.caption(f"📡 Data version {version}, updated {updated_at} UTC")
+if scheduler:
+    status = scheduler.status()
+    if status["last_error"]:
+        st.sidebar.caption(f"⚠️ Feed refresh failed: {status['last_error']}")
+    elif status["last_result"]:
+        st.sidebar.caption(f"Feed checked every {scheduler.interval:g}s, last at "
+                           f"{time.strftime('%H:%M:%S', time.localtime(status['last_result']['finished']))}")
+    st.sidebar.button("🔄 Show latest data", help="Reruns the page; cached results are keyed on the data version")
+
+if config.ADMIN_PANEL:
+    with st.sidebar.expander("🛠️ Performance"):
+        metrics = get_metrics()
+        ranked = metrics.slowest(None)
+        slowest = [row for row in ranked if not row["query"].startswith("Render:")]
+        if slowest:
+            st.caption("Slowest queries (by p95)")
+            st.dataframe(pd.DataFrame(slowest[:10])[["query", "count", "p50_ms", "p95_ms", "p99_ms",
+                                                "cache_hit_rate", "max_bytes", "plan"]],
+                         hide_index=True, use_container_width=True)
+        renders = [row for row in ranked if row["query"].startswith("Render:")]
+        if renders:
+            st.caption("Render timings: time to first paint, and full reruns per page")
+            st.dataframe(pd.DataFrame(renders)[["query", "count", "p50_ms", "p95_ms", "p99_ms"]],
+                         hide_index=True, use_container_width=True)
+        st.caption("Result cache")
+        st.json(get_query_cache(current_backend().name).stats())
+        if config.SHARED_FRAMES:
+            st.caption("Shared result frames")
+            st.json(get_shared_frames().stats())
+        st.caption("Admission control")
+        st.json(get_admission().stats())
+        st.caption("Database pool")
+        st.json(get_db().pool.metrics())
+        st.download_button("Prometheus metrics", metrics.to_prometheus(),
+                           file_name="neo_metrics.prom", mime="text/plain")
+        st.download_button("JSON lines", metrics.to_json_lines(),
+                           file_name="neo_metrics.jsonl", mime="application/jsonl")
+        st.button("Reset metrics", on_click=metrics.reset)
+
+# Asteroid picked in the sidebar lookup, shown above whichever page is open
+if "asteroid" in st.session_state:
+    asteroid_id, asteroid_name = st.session_state.asteroid
+    detail, error = run_query(ASTEROID_DETAIL, (asteroid_id,), name="Asteroid: detail")
+    approaches, _ = run_query(ASTEROID_APPROACHES, (asteroid_id,), name="Asteroid: approaches")
+    with st.expander(f"🪨 {asteroid_name}", expanded=True):
+        if detail is None or detail.empty:
+            st.info(error or "This asteroid is no longer in the database")
+        else:
+            row = detail.iloc[0]
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("💎 Diameter", f"{row['diameter_min']:.3f}-{row['diameter_max']:.3f} km")
+            col2.metric("✨ Magnitude (H)", f"{row['magnitude']:.2f}" if pd.notna(row['magnitude']) else "n/a")
+            col3.metric("⚠️ Hazardous", "Yes" if row['hazardous'] else "No")
+            col4.metric("📊 Approaches", f"{len(approaches) if approaches is not None else 0:,}")
+            if pd.notna(row['cadence_days']):
+                st.caption(f"One approach every {row['cadence_days']:,.0f} days on average; "
+                           f"miss distance trend {row['slope_km_per_year']:+,.0f} km/year")
+            if approaches is not None and not approaches.empty:
+                fig = px.line(approaches, x='close_approach_date', y='distance', markers=True,
+                            labels={'close_approach_date': 'Approach Date', 'distance': 'Miss Distance (LD)'})
+                fig.update_layout(height=300, margin=dict(t=10, b=10))
+                st.plotly_chart(fig, use_container_width=True)
+                st.dataframe(approaches, hide_index=True, use_container_width=True,
+                             column_config=date_columns(approaches))
+        st.button("Close", on_click=close_asteroid, key="close_asteroid")
+
 # PAGE 1: OVERVIEW - ENHANCED
 if page == "📊 Overview":
     st.header("📊 Database Overview")
-    
-    # Row 1: Two main charts
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.subheader("🎯 Hazard Classification")
-        df, _ = run_query(QUERIES["13. Hazardous vs Non-Hazardous"])
-        if df is not None:
-            # Donut chart instead of pie
-            fig = px.pie(df, values='count', names='category',
-                        color='category', hole=0.4,
-                        color_discrete_map={'Hazardous': COLORS['danger'], 
-                                          'Non-Hazardous': COLORS['safe']})
-            fig.update_traces(textposition='inside', textinfo='percent+label',
-                            textfont_size=14)
-            st.plotly_chart(fig, use_container_width=True)
-    
-    with col2:
-        st.subheader("📈 Monthly Activity Trends")
-        df, _ = run_query(QUERIES["11. Monthly Approach Count"])
-        if df is not None:
-            # Area chart with better styling
-            fig = px.area(df, x='month', y='count',
-                         color_discrete_sequence=[COLORS['primary']])
-            fig.update_traces(fill='tozeroy')
-            fig.update_layout(
-                xaxis_title="Month",
-                yaxis_title="Approach Count",
-                hovermode='x unified'
-            )
-            st.plotly_chart(fig, use_container_width=True)
-    
-    # Row 2: Top 10 Fastest with improved visualization
-    st.subheader("⚡ Top 10 Fastest Asteroids")
-    df, _ = run_query(QUERIES["3. Top 10 Fastest Asteroids"])
-    if df is not None:
+
+    def hazard_chart(df):
+        # Donut chart instead of pie
+        fig = px.pie(df, values='count', names='category',
+                    color='category', hole=0.4,
+                    color_discrete_map={'Hazardous': COLORS['danger'], 
+                                      'Non-Hazardous': COLORS['safe']})
+        fig.update_traces(textposition='inside', textinfo='percent+label',
+                        textfont_size=14)
+        return fig, None
+
+    def monthly_chart(df):
+        # Area chart with better styling
+        fig = px.area(df, x='month', y='count',
+                     color_discrete_sequence=[COLORS['primary']])
+        fig.update_traces(fill='tozeroy')
+        fig.update_layout(
+            xaxis_title="Month",
+            yaxis_title="Approach Count",
+            hovermode='x unified'
+        )
+        return fig, None
+
+    def fastest_chart(df):
         # Horizontal bar chart for better readability
         fig = px.bar(df, y='name', x='max_velocity', orientation='h',
                      color='max_velocity', color_continuous_scale='Plasma',
@@ -172,33 +443,77 @@ if page == "📊 Overview":
         )
         fig.add_vline(x=50000, line_dash="dash", line_color="red",
                      annotation_text="High Speed Threshold (50k km/h)")
-        st.plotly_chart(fig, use_container_width=True)
-    
-    # Row 3: Size distribution
+        return fig, None
+
+    def size_chart(df):
+        fig = px.bar(df, x='size_category', y='count',
+                    color='count', color_continuous_scale='Viridis',
+                    text='count')
+        fig.update_traces(textposition='outside')
+        fig.update_layout(showlegend=False)
+        return fig, None
+
+    def lunar_chart(df):
+        if len(df) == 0:
+            return None, None
+        total = len(df)
+        # LTTB keeps the shape of the series; the 50 closest approaches always stay in
+        closest = df.nsmallest(50, 'lunar_distance').index
+        df = downsample(df, 'close_approach_date', 'lunar_distance', MAX_POINTS, keep=closest)
+        fig = px.scatter(df, x='close_approach_date', y='lunar_distance',
+                       hover_name='name', size='lunar_distance',
+                       color='lunar_distance', 
+                       color_continuous_scale='Reds_r')
+        fig.add_hline(y=1, line_dash="dash", 
+                     annotation_text="Moon's Distance (1 LD)")
+        fig.update_layout(yaxis_title="Distance (Lunar Distance)")
+        if total > len(df):
+            return fig, f"{len(df):,} of {total:,} approaches shown (LTTB downsampled)"
+        return fig, None
+
+    # Layout first, one placeholder per chart; the queries run concurrently and each
+    # chart is drawn as soon as its own data arrives, so a slow one holds up nothing else
+    slots, notes = {}, {}
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("🎯 Hazard Classification")
+        slots['hazard'] = st.empty()
+    with col2:
+        st.subheader("📈 Monthly Activity Trends")
+        slots['monthly'] = st.empty()
+    st.subheader("⚡ Top 10 Fastest Asteroids")
+    slots['fastest'] = st.empty()
     col1, col2 = st.columns(2)
     with col1:
         st.subheader("📏 Size Distribution")
-        df, _ = run_query(QUERIES["BONUS: Size Categories"])
-        if df is not None:
-            fig = px.bar(df, x='size_category', y='count',
-                        color='count', color_continuous_scale='Viridis',
-                        text='count')
-            fig.update_traces(textposition='outside')
-            fig.update_layout(showlegend=False)
-            st.plotly_chart(fig, use_container_width=True)
-    
+        slots['sizes'] = st.empty()
     with col2:
         st.subheader("🌙 Lunar Distance Analysis")
-        df, _ = run_query(QUERIES["14. Closer Than Moon (<1 LD)"])
-        if df is not None and len(df) > 0:
-            fig = px.scatter(df, x='close_approach_date', y='lunar_distance',
-                           hover_name='name', size='lunar_distance',
-                           color='lunar_distance', 
-                           color_continuous_scale='Reds_r')
-            fig.add_hline(y=1, line_dash="dash", 
-                         annotation_text="Moon's Distance (1 LD)")
-            fig.update_layout(yaxis_title="Distance (Lunar Distance)")
-            st.plotly_chart(fig, use_container_width=True)
+        slots['lunar'] = st.empty()
+        notes['lunar'] = st.empty()
+    for slot in slots.values():
+        slot.caption("Loading…")
+
+    charts = {'hazard': hazard_chart, 'monthly': monthly_chart, 'fastest': fastest_chart,
+              'sizes': size_chart, 'lunar': lunar_chart}
+    overview_queries = {
+        'hazard': QUERIES["13. Hazardous vs Non-Hazardous"],
+        'monthly': QUERIES["11. Monthly Approach Count"],
+        'fastest': QUERIES["3. Top 10 Fastest Asteroids"],
+        'sizes': QUERIES["BONUS: Size Categories"],
+        'lunar': LUNAR_APPROACHES,
+    }
+    for key, (df, error) in run_queries(overview_queries, shared=True, slots=slots):
+        if df is None:
+            slots[key].error(f"Query failed: {error}")
+            continue
+        fig, note = charts[key](df)
+        if fig is None:
+            slots[key].empty()
+        else:
+            slots[key].plotly_chart(fig, use_container_width=True)
+        if note:
+            notes[key].caption(note)
 
 # PAGE 2: SQL QUERIES - ENHANCED
 elif page == "🔍 SQL Queries":
@@ -213,9 +528,46 @@ elif page == "🔍 SQL Queries":
     with st.expander("📝 View SQL Code", expanded=False):
         st.code(QUERIES[query_name], language='sql')
     
+    # Exports stream from a cursor to a file, so their size doesn't depend on memory
+    with st.expander("📥 Export Results", expanded=False):
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            export_format = st.selectbox("Format", list(FORMATS))
+        with col2:
+            export_all = st.checkbox("All rows (without the display LIMIT)", value=False)
+        with col3:
+            prepare = st.button("📦 Prepare Export")
+        if prepare:
+            backend = current_backend()
+            version = backend.data_version()
+            remove_stale_exports(backend.name, version)
+            path = export_path(query_name, export_format, backend.name, version, export_all)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                progress = st.empty()
+                sql = (EXPORT_QUERIES if export_all else QUERIES)[query_name]
+                try:
+                    with get_metrics().track(f"Export: {query_name}") as sample:
+                        sample["rows"] = export_query(backend, sql, path, export_format,
+                                                      progress=lambda n: progress.caption(f"{n:,} rows written..."))
+                except Exception as e:
+                    st.error(f"❌ Export failed: {e}")
+                progress.empty()
+            if os.path.exists(path):
+                size = os.path.getsize(path)
+                if size <= config.EXPORT_DOWNLOAD_BYTES:
+                    with open(path, "rb") as f:
+                        st.download_button(f"⬇️ Download ({size / 2 ** 20:,.1f} MB)", f.read(),
+                                           os.path.basename(path), FORMATS[export_format][1])
+                else:
+                    st.info(f"{size / 2 ** 20:,.0f} MB written to `{path}` on the server, "
+                            "too large to send through the browser")
+    
     if st.button("▶️ Execute Query", type="primary"):
+        status = st.empty()
         with st.spinner('Executing query...'):
-            df, error = run_query(QUERIES[query_name])
+            df, error = run_query(QUERIES[query_name], status=status)
+        status.empty()
         
         if error:
             st.error(f"❌ Error: {error}")
@@ -223,18 +575,7 @@ elif page == "🔍 SQL Queries":
             st.success(f"✅ Query returned {len(df)} rows")
             
             # Show data
-            st.dataframe(df, use_container_width=True, height=400)
-            
-            # Download options
-            col1, col2 = st.columns([1, 4])
-            with col1:
-                csv = df.to_csv(index=False)
-                st.download_button(
-                    "📥 Download CSV",
-                    csv,
-                    f"results_{query_name}.csv",
-                    "text/csv"
-                )
+            st.dataframe(df, use_container_width=True, height=400, column_config=date_columns(df))
             
             # Smart auto-visualization
             if auto_viz and len(df) > 0:
@@ -281,52 +622,56 @@ elif page == "🎛️ Advanced Filters":
     with col3:
         sort_by = st.selectbox("Sort By", 
                               ["Velocity", "Distance", "Diameter"])
-        limit = st.number_input("Max Results", min_value=10, max_value=1000, 
+        limit = st.number_input("Results per Page", min_value=10, max_value=1000, 
                                value=100, step=10)
+        use_engine = st.checkbox("⚡ In-memory engine", value=False,
+                                help="Answer filters from column arrays loaded once per data version")
     
-    hazard_filter = ""
-    if hazardous == "Hazardous Only":
-        hazard_filter = "AND a.is_potentially_hazardous_asteroid = 1"
-    elif hazardous == "Non-Hazardous Only":
-        hazard_filter = "AND a.is_potentially_hazardous_asteroid = 0"
-    
-    sort_mapping = {
-        "Velocity": "c.relative_velocity_kmph",
-        "Distance": "c.miss_distance_lunar",
-        "Diameter": "a.estimated_diameter_max_km"
-    }
-    
-    query = f"""
-    SELECT 
-        a.name,
-        c.close_approach_date as date,
-        c.relative_velocity_kmph as velocity,
-        c.miss_distance_lunar as distance_LD,
-        a.estimated_diameter_max_km as diameter,
-        CASE WHEN a.is_potentially_hazardous_asteroid = 1 THEN 'Yes' ELSE 'No' END as hazardous
-    FROM asteroids a
-    JOIN close_approach c ON a.id = c.neo_reference_id
-    WHERE c.relative_velocity_kmph >= {velocity_min}
-    AND a.estimated_diameter_max_km >= {diameter_min}
-    AND c.miss_distance_lunar <= {lunar_max}
-    {hazard_filter}
-    ORDER BY {sort_mapping[sort_by]} DESC
-    LIMIT {limit}
-    """
+    # Bound parameters + keyset pagination (see filter_query.py)
+    approach_filter = ApproachFilter(velocity_min, diameter_min, lunar_max, hazardous, sort_by)
+    filter_key = (velocity_min, diameter_min, lunar_max, hazardous, sort_by, limit, use_engine)
     
     col1, col2 = st.columns([1, 4])
     with col1:
         apply_filter = st.button("🔍 Apply Filters", type="primary", use_container_width=True)
     with col2:
-        if st.button("🔄 Reset Filters"):
-            st.rerun()
+        st.button("🔄 Reset Filters", on_click=lambda: st.session_state.pop("filter_pages", None))
     
     if apply_filter:
+        # Stack of page cursors; the last entry is where the current page starts
+        st.session_state.filter_pages = [None]
+        st.session_state.filter_key = filter_key
+    
+    pages = st.session_state.get("filter_pages")
+    if pages and st.session_state.get("filter_key") == filter_key:
+        queue_status = st.empty()
         with st.spinner("Searching database..."):
-            df, error = run_query(query)
+            if use_engine:
+                # Same rows and order as the SQL path; cursors are row ranks instead of key tuples
+                engine = get_column_engine(get_db().data_version())
+                with get_metrics().track(f"Advanced Filters: engine ({sort_by})") as sample:
+                    with get_db().reader() as conn:
+                        df, next_cursor = engine.page(approach_filter, limit, pages[-1], sql_resolver(conn))
+                    sample["rows"] = len(df)
+                df, error = df.drop(columns="approach_id"), None
+            else:
+                query, params = approach_filter.page_query(limit, pages[-1])
+                # Keyset pages need the live database's indexes, whatever the backend
+                df, error = run_query(query, params, name=f"Advanced Filters: SQL ({sort_by})", backend="sqlite",
+                                      status=queue_status)
+                next_cursor = approach_filter.next_cursor(df, limit)
         
-        if df is not None and len(df) > 0:
-            st.success(f"✅ Found {len(df)} matching asteroids")
+        if error:
+            st.error(f"❌ Error: {error}")
+        elif len(df) > 0:
+            df = display_frame(df)
+            st.success(f"✅ Page {len(pages)}: {len(df)} matching asteroids")
+            
+            # Callbacks run before the rerun, so the new page renders straight away
+            col1, col2, _ = st.columns([1, 1, 4])
+            col1.button("⬅️ Previous Page", disabled=len(pages) == 1, on_click=pages.pop)
+            col2.button("Next Page ➡️", disabled=next_cursor is None,
+                        on_click=pages.append, args=(next_cursor,))
             
             # Summary stats
             col1, col2, col3 = st.columns(3)
@@ -334,30 +679,23 @@ elif page == "🎛️ Advanced Filters":
             col2.metric("Avg Distance", f"{df['distance_LD'].mean():.2f} LD")
             col3.metric("Hazardous Count", df[df['hazardous']=='Yes'].shape[0])
             
-            st.dataframe(df, use_container_width=True, height=400)
+            st.dataframe(df, use_container_width=True, height=400, column_config=date_columns(df))
             
-            # Visualization
+            # Visualization of every match, binned so its size doesn't grow with the result
             st.subheader("📊 Results Visualization")
-            fig = px.scatter(df, x='distance_LD', y='velocity',
-                           size='diameter', color='hazardous',
-                           hover_name='name',
-                           color_discrete_map={'Yes': COLORS['danger'], 
-                                             'No': COLORS['safe']})
-            fig.update_layout(
-                xaxis_title="Miss Distance (Lunar Distance)",
-                yaxis_title="Velocity (km/h)",
-                title="Asteroid Characteristics"
-            )
-            st.plotly_chart(fig, use_container_width=True)
-        elif df is not None:
+            query, params = approach_filter.density_query()
+            bins, _ = run_query(query, params, name="Advanced Filters: density", backend="sqlite")
+            if bins is not None and len(bins) > 0:
+                st.plotly_chart(density_figure(bins, "All Matching Approaches"), use_container_width=True)
+        else:
             st.warning("⚠️ No asteroids match your criteria. Try adjusting the filters.")
 
 # PAGE 4: ANALYTICS - ENHANCED
 elif page == "📈 Analytics":
     st.header("📈 Advanced Analytics Dashboard")
     
-    tab1, tab2, tab3, tab4 = st.tabs(["🎯 Risk Analysis", "📅 Trends", 
-                                       "📏 Size Distribution", "🔥 Comparisons"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["🎯 Risk Analysis", "📅 Trends", 
+                                       "📏 Size Distribution", "🔥 Comparisons", "📐 Distributions"])
     
     with tab1:
         st.subheader("🎯 Top Risk Score Analysis")
@@ -380,7 +718,7 @@ elif page == "📈 Analytics":
             fig.update_layout(xaxis_title="Asteroid", yaxis_title="Risk Score")
             st.plotly_chart(fig, use_container_width=True)
             
-            st.dataframe(df.head(15), use_container_width=True)
+            st.dataframe(df.head(15), use_container_width=True, column_config=date_columns(df))
     
     with tab2:
         st.subheader("📅 Year-over-Year Activity Trends")
@@ -434,27 +772,49 @@ elif page == "📈 Analytics":
     
     with tab4:
         st.subheader("🔥 Velocity vs Distance Analysis")
-        df, _ = run_query("""
-            SELECT 
-                a.name,
-                c.relative_velocity_kmph as velocity,
-                c.miss_distance_lunar as distance,
-                a.estimated_diameter_max_km as size,
-                a.is_potentially_hazardous_asteroid as hazardous
-            FROM asteroids a
-            JOIN close_approach c ON a.id = c.neo_reference_id
-            LIMIT 500
-        """)
+        df, _ = run_query(VELOCITY_VS_DISTANCE)
         
-        if df is not None:
-            fig = px.scatter(df, x='distance', y='velocity',
-                           size='size', color='hazardous',
-                           hover_name='name',
-                           color_continuous_scale='Reds',
-                           labels={'distance': 'Miss Distance (LD)',
-                                  'velocity': 'Velocity (km/h)',
-                                  'hazardous': 'Hazard Level'})
-            st.plotly_chart(fig, use_container_width=True)
+        if df is not None and len(df) > 0:
+            st.plotly_chart(density_figure(df), use_container_width=True)
+            st.caption(f"All {df['count'].sum():,} approaches in {len(df):,} cells; "
+                       "marker size is the number of approaches, colour the hazardous share")
+
+    with tab5:
+        st.subheader("📐 Velocity and Miss-Distance Percentiles")
+        with get_db().reader() as conn:
+            months = sketch_months(conn)
+        if months:
+            since, until = st.select_slider("Months", options=months, value=(months[0], months[-1]))
+            metric = st.radio("Measure", list(SKETCH_METRICS), horizontal=True)
+            started = time.perf_counter()
+            summary, trend, histograms = distribution_summary(since, until, metric)
+            elapsed = (time.perf_counter() - started) * 1000
+            st.dataframe(summary, hide_index=True, use_container_width=True)
+            st.caption(f"Merged from the monthly sketches in {elapsed:.0f} ms: percentiles within "
+                       f"{RELATIVE_ACCURACY:.0%} of the exact values, asteroid counts within about 2%")
+
+            col1, col2 = st.columns(2)
+            with col1:
+                fig = px.line(trend, x='month', y=['p50', 'p95'], line_dash='class',
+                              color_discrete_sequence=[COLORS['primary'], COLORS['danger']])
+                fig.update_layout(xaxis_title="Month", yaxis_title=metric, legend_title="")
+                st.plotly_chart(fig, use_container_width=True)
+            with col2:
+                fig = go.Figure()
+                for name, sketch in histograms.items():
+                    fig.add_trace(go.Scatter(x=sketch.bucket_values(), y=sketch.counts, mode='lines', name=name,
+                                             line=dict(color=COLORS['danger' if name == "Hazardous" else 'safe'])))
+                fig.update_xaxes(type='log')
+                fig.update_layout(xaxis_title=metric, yaxis_title="Approaches (per 2% bucket)")
+                st.plotly_chart(fig, use_container_width=True)
+
+            st.markdown(f"**Closest approaches, {since} to {until}**")
+            dates = month_dates(since, until)
+            closest, _ = run_query(CLOSEST_IN_RANGE, dates, name="Analytics: closest in months", dates=dates)
+            if closest is not None:
+                st.dataframe(closest, hide_index=True, use_container_width=True, column_config=date_columns(closest))
+        else:
+            st.info("No approach sketches yet; run `python sketches.py --rebuild`")
 
 # PAGE 5: TOP THREATS - NEW
 elif page == "🏆 Top Threats":
@@ -462,21 +822,7 @@ elif page == "🏆 Top Threats":
     st.warning("⚠️ These asteroids pose the highest potential risk based on size, velocity, and proximity")
     
     # Get top 10 most dangerous
-    df, _ = run_query("""
-        SELECT 
-            a.name,
-            a.estimated_diameter_max_km as diameter,
-            c.relative_velocity_kmph as velocity,
-            c.miss_distance_lunar as distance,
-            c.close_approach_date as next_approach,
-            ROUND(a.estimated_diameter_max_km * c.relative_velocity_kmph / 
-                  CASE WHEN c.miss_distance_lunar > 0 THEN c.miss_distance_lunar ELSE 1 END, 2) as threat_score
-        FROM asteroids a
-        JOIN close_approach c ON a.id = c.neo_reference_id
-        WHERE a.is_potentially_hazardous_asteroid = 1
-        ORDER BY threat_score DESC
-        LIMIT 10
-    """)
+    df, _ = run_query(TOP_THREATS)
     
     if df is not None:
         for idx, row in df.iterrows():
@@ -485,8 +831,9 @@ elif page == "🏆 Top Threats":
                 col1.metric("💎 Diameter", f"{row['diameter']:.3f} km")
                 col2.metric("⚡ Velocity", f"{row['velocity']:,.0f} km/h")
                 col3.metric("📏 Distance", f"{row['distance']:.2f} LD")
-                col4.metric("📅 Next Approach", row['next_approach'])
+                col4.metric("📅 Next Approach", f"{row['next_approach']:%Y-%m-%d}" if pd.notna(row['next_approach']) else None)
 
 # Footer
 st.markdown("---")
-st.markdown("**Data Source:** NASA NeoWs API | **Dashboard:** Built with Streamlit & Plotly")
\ No newline at end of file
+st.markdown("**Data Source:** NASA NeoWs API | **Dashboard:** Built with Streamlit & Plotly")
+get_metrics().record(f"Render: {page}", time.perf_counter() - script_started)
\ No newline at end of file
@@ -0,0 +1,27 @@
+from backends import SQLiteBackend
+from db_pool import Database, connect_writer
+from partitions import freeze_year, frozen_partitions
+from project_sql_queries import CLOSEST_IN_RANGE
+
+
+def test_date_bounded_read_uses_frozen_partition(neo_db, tmp_path):
+    conn = connect_writer(neo_db)
+    try:
+        freeze_year(conn, 2024, directory=str(tmp_path / "partitions"))
+        assert "2024" in frozen_partitions(conn)
+    finally:
+        conn.close()
+
+    db = Database(neo_db, pool_size=1)  # the check below gets the connection the reads used
+    try:
+        backend = SQLiteBackend(db)
+        dates = ("2024-11-01", "2025-02-28")  # the frozen year and the live one
+        routed = backend.read(CLOSEST_IN_RANGE, dates, dates=dates)
+        assert routed.equals(backend.read(CLOSEST_IN_RANGE, dates))
+        assert len(routed) == 20
+        with db.reader() as reader:
+            # the pooled connection goes back without the TEMP view or attached partitions
+            assert reader.execute("SELECT COUNT(*) FROM sqlite_temp_master").fetchone()[0] == 0
+            assert not [row for row in reader.execute("PRAGMA database_list") if row[1].startswith("part_")]
+    finally:
+        db.close()
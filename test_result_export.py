@@ -0,0 +1,32 @@
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import result_export
+from result_export import export_rows
+
+
+def export(tmp_path, chunks):
+    path = os.path.join(tmp_path, "out.parquet")
+    rows = export_rows(["id", "value", "note"], iter(chunks), path, "parquet")
+    assert os.listdir(tmp_path) == ["out.parquet"]
+    return rows, pq.read_table(path)
+
+
+def test_parquet_types_widen_for_later_chunks(tmp_path):
+    first = [[i, None, "x"] for i in range(100)]  # integers, an all-NULL column, text
+    rows, table = export(tmp_path, [first, [[1.5, 2, "y"]]])
+    assert rows == table.num_rows == 101
+    assert table.schema.types == [pa.float64(), pa.int64(), pa.string()]
+    assert table.column("id").to_pylist()[-2:] == [99.0, 1.5]
+
+
+def test_parquet_retypes_rows_already_written(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_export, "SNIFF_ROWS", 10)  # write before 'value' has shown a type
+    first = [[i, None, "x"] for i in range(100)]
+    rows, table = export(tmp_path, [first, [[1, 2, "y"]], [[2, "text", 3]]])
+    assert rows == table.num_rows == 102
+    assert table.schema.types == [pa.int64(), pa.string(), pa.string()]
+    assert table.column("value").to_pylist()[-3:] == [None, "2", "text"]
+    assert table.column("note").to_pylist()[-1] == "3"
@@ -0,0 +1,18 @@
+import os
+
+import pandas as pd
+
+from shared_frames import SharedFrames, frame_key
+
+
+def test_newer_version_removes_results_not_asked_for_again(tmp_path):
+    shared = SharedFrames(str(tmp_path))
+    frame = pd.DataFrame({"n": [1, 2, 3]})
+    for sql in ("SELECT 1", "SELECT 2"):
+        shared.get_or_publish(sql, (), 1, lambda: frame)
+    assert len(os.listdir(tmp_path)) == 2
+
+    df, hit = shared.get_or_publish("SELECT 1", (), 2, lambda: frame)  # SELECT 2 is never read again
+    assert not hit and df["n"].tolist() == [1, 2, 3]
+    assert os.listdir(tmp_path) == [os.path.basename(shared.path(frame_key("SELECT 1"), 2))]
+    assert [version for version, _ in shared.frames.values()] == [2]
@@ -0,0 +1,185 @@
+"""
+Per-asteroid miss-distance trends.
+
+asteroid_trends holds, for every asteroid with two or more approaches:
+    cadence_days         mean days between consecutive approaches
+    approaches_per_year  approach rate over its observed span
+    slope_km_per_year    least-squares slope of miss distance over time
+                         (negative: getting closer)
+    min_delta_km         largest drop in miss distance between consecutive
+                         approaches (negative when any approach came closer)
+    last_delta_km        change at its latest approach
+
+All of it comes from one ordered pass over close_approach (window functions
+for the consecutive deltas, running sums for the regression). Triggers only
+mark the asteroids whose approaches change in asteroid_trends_dirty;
+refresh_trends recomputes just those, inside the writer's transaction
+(neo_ingest.BulkLoader does this on every flush).
+
+Usage:
+    python trends.py nasa_neo.db            # check trends against a full recomputation
+    python trends.py nasa_neo.db --refresh  # recompute the dirty asteroids
+    python trends.py nasa_neo.db --rebuild  # recompute everything
+"""
+import argparse
+import math
+import sqlite3
+import sys
+
+import config
+from data_version import bump_data_version
+
+# Time is measured in Julian years since J2000, which keeps the regression sums well conditioned
+TRENDS_SELECT = """
+WITH ordered AS (
+    SELECT
+        neo_reference_id,
+        close_approach_date,
+        (julianday(close_approach_date) - 2451545.0) / 365.25 AS t,
+        miss_distance_km AS d,
+        miss_distance_km - LAG(miss_distance_km) OVER w AS delta,
+        LEAD(id) OVER w AS next_id
+    FROM close_approach
+    WHERE miss_distance_km IS NOT NULL{where}
+    WINDOW w AS (PARTITION BY neo_reference_id ORDER BY close_approach_date, id)
+)
+SELECT
+    neo_reference_id,
+    COUNT(*) AS approach_count,
+    MIN(close_approach_date) AS first_approach_date,
+    MAX(close_approach_date) AS last_approach_date,
+    (MAX(t) - MIN(t)) * 365.25 / (COUNT(*) - 1) AS cadence_days,
+    (COUNT(*) - 1) / NULLIF(MAX(t) - MIN(t), 0) AS approaches_per_year,
+    (COUNT(*) * SUM(t * d) - SUM(t) * SUM(d))
+        / NULLIF(COUNT(*) * SUM(t * t) - SUM(t) * SUM(t), 0) AS slope_km_per_year,
+    MIN(delta) AS min_delta_km,
+    MAX(CASE WHEN next_id IS NULL THEN delta END) AS last_delta_km
+FROM ordered
+GROUP BY neo_reference_id
+HAVING COUNT(*) > 1
+"""
+
+TRENDS_COLUMNS = """(
+    neo_reference_id, approach_count, first_approach_date, last_approach_date,
+    cadence_days, approaches_per_year, slope_km_per_year, min_delta_km, last_delta_km
+)"""
+
+_DIRTY = "\n      AND neo_reference_id IN (SELECT neo_reference_id FROM asteroid_trends_dirty)"
+
+_MARK = "INSERT OR IGNORE INTO asteroid_trends_dirty (neo_reference_id) VALUES ({ref}.neo_reference_id);"
+
+MIGRATION = [
+    """
+    CREATE TABLE asteroid_trends (
+        neo_reference_id INTEGER PRIMARY KEY,
+        approach_count INTEGER NOT NULL,
+        first_approach_date TEXT NOT NULL,
+        last_approach_date TEXT NOT NULL,
+        cadence_days REAL,
+        approaches_per_year REAL,
+        slope_km_per_year REAL,
+        min_delta_km REAL,
+        last_delta_km REAL
+    )
+    """,
+    "CREATE INDEX ix_asteroid_trends_rate ON asteroid_trends (approaches_per_year)",
+    "CREATE TABLE asteroid_trends_dirty (neo_reference_id INTEGER PRIMARY KEY)",
+    f"""
+    CREATE TRIGGER trg_close_approach_trends_insert AFTER INSERT ON close_approach
+    BEGIN
+        {_MARK.format(ref="new")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER trg_close_approach_trends_delete AFTER DELETE ON close_approach
+    BEGIN
+        {_MARK.format(ref="old")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER trg_close_approach_trends_update
+    AFTER UPDATE OF neo_reference_id, close_approach_date, miss_distance_km ON close_approach
+    BEGIN
+        {_MARK.format(ref="old")}
+        {_MARK.format(ref="new")}
+    END
+    """,
+    f"INSERT INTO asteroid_trends {TRENDS_COLUMNS} " + TRENDS_SELECT.format(where=""),
+]
+
+
+def refresh_trends(conn):
+    """Recompute the trends of asteroids marked dirty; call inside the writer's transaction.
+
+    Returns the number of asteroids refreshed.
+    """
+    dirty = conn.execute("SELECT COUNT(*) FROM asteroid_trends_dirty").fetchone()[0]
+    if dirty:
+        conn.execute("DELETE FROM asteroid_trends WHERE neo_reference_id IN "
+                     "(SELECT neo_reference_id FROM asteroid_trends_dirty)")
+        conn.execute(f"INSERT INTO asteroid_trends {TRENDS_COLUMNS} " + TRENDS_SELECT.format(where=_DIRTY))
+        conn.execute("DELETE FROM asteroid_trends_dirty")
+    return dirty
+
+
+def check_trends(conn, rel_tol=1e-6):
+    """Compare asteroid_trends with a full recomputation. Returns a list of problems."""
+    problems = []
+    dirty = conn.execute("SELECT COUNT(*) FROM asteroid_trends_dirty").fetchone()[0]
+    if dirty:
+        problems.append(f"asteroid_trends: {dirty} asteroids waiting for refresh_trends")
+    want = {row[0]: row for row in conn.execute(TRENDS_SELECT.format(where=""))}
+    have = {row[0]: row for row in conn.execute("SELECT * FROM asteroid_trends")}
+    for key in want.keys() - have.keys():
+        problems.append(f"asteroid_trends: missing {key}")
+    for key in have.keys() - want.keys():
+        problems.append(f"asteroid_trends: unexpected {key}")
+    for key in want.keys() & have.keys():
+        for a, b in zip(want[key], have[key]):
+            if isinstance(a, float) and isinstance(b, float):
+                if not math.isclose(a, b, rel_tol=rel_tol, abs_tol=1e-6):
+                    problems.append(f"asteroid_trends: {key} has {have[key]}, expected {want[key]}")
+                    break
+            elif a != b:
+                problems.append(f"asteroid_trends: {key} has {have[key]}, expected {want[key]}")
+                break
+    return problems
+
+
+def rebuild_trends(conn):
+    """Recompute every trend row in one transaction."""
+    with conn:
+        conn.execute("DELETE FROM asteroid_trends")
+        conn.execute("DELETE FROM asteroid_trends_dirty")
+        conn.execute(f"INSERT INTO asteroid_trends {TRENDS_COLUMNS} " + TRENDS_SELECT.format(where=""))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check, refresh or rebuild the per-asteroid trend table")
+    parser.add_argument("db", nargs="?", default=config.DB_PATH)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--refresh", action="store_true", help="recompute the asteroids marked dirty")
+    group.add_argument("--rebuild", action="store_true", help="recompute every asteroid")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    if args.refresh:
+        with conn:
+            refreshed = refresh_trends(conn)
+            if refreshed:
+                bump_data_version(conn)
+        print(f"{refreshed} asteroids refreshed")
+    elif args.rebuild:
+        rebuild_trends(conn)
+        print("Trends rebuilt")
+    problems = check_trends(conn)
+    for problem in problems[:50]:
+        print(problem)
+    if len(problems) > 50:
+        print(f"... and {len(problems) - 50} more")
+    print("Trends are consistent" if not problems else f"{len(problems)} inconsistencies found")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())